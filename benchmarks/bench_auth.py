@@ -0,0 +1,71 @@
+"""
+Benchmark de la verificación de API keys frente al número de claves del almacén (ApiKeyStore):
+el coste de cada búsqueda debe mantenerse constante al pasar de unas pocas a cientos de miles de claves.
+
+    python benchmarks/bench_auth.py
+    python benchmarks/bench_auth.py --sizes 1 1000 100000 --lookups 50000 --output results/auth.json
+"""
+import argparse
+import random
+import time
+
+from common import percentile, print_table, write_results
+
+from core.api_keys import ApiKeyStore, hash_api_key
+
+
+class StaticKeySource:
+    """ Origen en memoria: la huella no cambia, el benchmark mide solo la búsqueda """
+    def __init__(self, keys):
+        self.keys = keys
+
+    def fingerprint(self):
+        return len(self.keys)
+
+    def load(self):
+        return self.keys
+
+
+def run(size: int, lookups: int) -> dict:
+    keys = [f"key-{i:08d}-{random.getrandbits(64):016x}" for i in range(size)]
+    start = time.perf_counter()
+    store = ApiKeyStore(StaticKeySource({hash_api_key(key): f"client-{i}" for i, key in enumerate(keys)}))
+    store.get()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    valid = [random.choice(keys) for _ in range(lookups)]
+    invalid = [f"invalid-{i}" for i in range(lookups)]
+    latencies = {}
+    for name, sample in (("valid", valid), ("invalid", invalid)):
+        values = []
+        for key in sample:
+            t = time.perf_counter_ns()
+            store.lookup(key)
+            values.append(time.perf_counter_ns() - t)
+        latencies[name] = values
+    us = lambda ns: round(ns / 1000, 3)
+    return {
+        "keys": size,
+        "build_ms": round(build_ms, 1),
+        "valid_p50_us": us(percentile(latencies["valid"], 50)),
+        "valid_p99_us": us(percentile(latencies["valid"], 99)),
+        "invalid_p50_us": us(percentile(latencies["invalid"], 50)),
+        "invalid_p99_us": us(percentile(latencies["invalid"], 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del almacén de API keys")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1000, 10000, 100000])
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    rows = [run(size, args.lookups) for size in args.sizes]
+    print_table(rows, ["keys", "build_ms", "valid_p50_us", "valid_p99_us", "invalid_p50_us", "invalid_p99_us"])
+    if args.output:
+        write_results(args.output, "auth", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
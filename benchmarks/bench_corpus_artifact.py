@@ -0,0 +1,90 @@
+"""
+Arranque de un worker con el corpus JSON frente al artefacto precompilado (core.corpus_artifact).
+Para cada tamaño de corpus mide lo que hace cada worker al cargar el corpus y construir su matcher BK-tree:
+tiempo hasta el primer mensaje y memoria propia del proceso (tracemalloc; las páginas del mmap son de la caché
+del sistema y se comparten entre workers), y el tiempo por mensaje con la caché de tokens vacía. Verifica que
+ambos caminos devuelven la misma palabra.
+
+    python benchmarks/bench_corpus_artifact.py
+    python benchmarks/bench_corpus_artifact.py --sizes 14 10000 100000 --output results/corpus_artifact.json
+"""
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from common import print_table, write_results
+from datagen import make_corpus, make_messages, write_corpus
+
+from core.corpus import CorpusStore
+from core.corpus_artifact import compile_corpus
+from services.message_service import ARTIFACT_MATCHER_ENGINES, BKTreeMatcher
+
+THRESHOLD = 80
+
+
+def start_worker(corpus_path: Path, artifact_path) -> tuple:
+    """ Carga del corpus y construcción del matcher como en el arranque de un worker;
+        devuelve (matcher, milisegundos, KiB reservados por el proceso) """
+    tracemalloc.start()
+    start = time.perf_counter()
+    snapshot = CorpusStore(str(corpus_path), reload_interval=3600, artifact_path=artifact_path).get()
+    if snapshot.artifact is not None:
+        matcher = ARTIFACT_MATCHER_ENGINES["bktree"](snapshot.artifact, THRESHOLD)
+    else:
+        matcher = BKTreeMatcher(snapshot.words, THRESHOLD)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return matcher, elapsed * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque con el corpus JSON frente al artefacto precompilado")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[14, 1000, 10000, 50000])
+    parser.add_argument("--messages", type=int, default=200, help="Mensajes por tamaño de corpus")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            rng = random.Random(args.seed)
+            corpus = make_corpus(size, rng)
+            messages = make_messages(args.messages, corpus, rng)
+            corpus_path = Path(workdir) / f"corpus-{size}.json"
+            write_corpus(corpus_path, corpus)
+            start = time.perf_counter()
+            stats = compile_corpus(str(corpus_path))
+            compile_ms = (time.perf_counter() - start) * 1000
+
+            reference = None
+            # sin artefacto ("" desactiva su búsqueda) y con el artefacto compilado
+            for source, artifact_path in (("json", ""), ("artifact", stats["path"])):
+                matcher, startup_ms, heap_kib = start_worker(corpus_path, artifact_path)
+                start = time.perf_counter()
+                found = [matcher.find(tokens) for tokens in messages]
+                elapsed = time.perf_counter() - start
+                assert reference is None or found == reference, f"{source} difiere en corpus={size}"
+                reference = found
+                rows.append({
+                    "source": source,
+                    "corpus_size": size,
+                    "startup_ms": round(startup_ms, 2),
+                    "heap_kib": round(heap_kib, 1),
+                    "per_message_us": round(elapsed / len(messages) * 1e6, 1),
+                    "artifact_kib": round(stats["bytes"] / 1024, 1),
+                    "compile_ms": round(compile_ms, 1),
+                })
+
+    print_table(rows, ["source", "corpus_size", "startup_ms", "heap_kib", "per_message_us", "artifact_kib",
+                       "compile_ms"])
+    if args.output:
+        write_results(args.output, "corpus_artifact", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Coste de los message_id duplicados con y sin el filtro Bloom de IDs (ID_FILTER_ENABLED), y con la ingesta
+idempotente (INSERT ... ON CONFLICT, --policies).
+Sobre una base con --stored mensajes, guarda --messages mensajes de los que --duplicate-ratio reutilizan un ID
+ya guardado (reintentos de las pasarelas), con save_message (una sesión por mensaje, como un POST) y save_batch
+(lotes de --batch-size). Con filtro informa también sus contadores: IDs descartados sin consulta, falsos
+positivos y viajes a la base de datos evitados. Los casos con política (ignore, reject o replace) usan
+upsert_message/upsert_batch sin filtro.
+
+    python benchmarks/bench_id_filter.py
+    python benchmarks/bench_id_filter.py --stored 200000 --duplicate-ratio 0 0.1 0.5 --output results/id_filter.json
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from common import percentile, print_table, write_results
+from datagen import make_requests, populate, write_corpus
+
+from sqlalchemy.orm import sessionmaker
+
+from core.bloom import build_message_id_filter
+from core.database import create_db_engine, init_db
+from core.exceptions import DatabaseException
+from models import archive_model, message_model, session_stats_model  # noqa: F401 (registra las tablas)
+from schemas.message_schema import BatchItemResultSchema
+from services.message_service import MessageProcessingService, MessageStorageService
+
+
+def make_messages(service: MessageProcessingService, args, ratio: float, rng: random.Random) -> list:
+    """ Mensajes procesados; una fracción ratio reutiliza IDs de la base (seed-...) """
+    requests = make_requests(args.messages, [], rng, banned_ratio=0, prefix="new")
+    for request in requests:
+        if rng.random() < ratio:
+            request.message_id = f"seed-{rng.randrange(args.stored):09d}"
+    return [service.process_message(request) for request in requests]
+
+
+def run_case(SessionLocal, messages: list, mode: str, batch_size: int, id_filter, policy=None) -> tuple:
+    """ Guarda los mensajes; devuelve (latencias por operación, duplicados rechazados o ya existentes, segundos) """
+    latencies, duplicates = [], 0
+    started = time.perf_counter()
+    if mode == "single":
+        for message in messages:
+            start = time.perf_counter()
+            with SessionLocal() as db:
+                storage = MessageStorageService(db, id_filter=id_filter)
+                try:
+                    if policy is None:
+                        storage.save_message(message)
+                    elif not storage.upsert_message(message, policy):
+                        duplicates += 1
+                except DatabaseException:
+                    duplicates += 1
+            latencies.append(time.perf_counter() - start)
+    else:
+        for offset in range(0, len(messages), batch_size):
+            batch = [
+                BatchItemResultSchema(message_id=m.data.message_id, status="accepted", data=m.data)
+                for m in messages[offset:offset + batch_size]
+            ]
+            start = time.perf_counter()
+            with SessionLocal() as db:
+                storage = MessageStorageService(db, id_filter=id_filter)
+                results = storage.save_batch(batch) if policy is None else storage.upsert_batch(batch, policy)
+            latencies.append(time.perf_counter() - start)
+            duplicates += sum(result.status == "rejected" or result.created is False for result in results)
+    return latencies, duplicates, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste de los message_id duplicados con y sin filtro Bloom")
+    parser.add_argument("--stored", type=int, default=50_000, help="Mensajes ya guardados en la base")
+    parser.add_argument("--messages", type=int, default=2_000, help="Mensajes a guardar por caso")
+    parser.add_argument("--duplicate-ratio", type=float, nargs="+", default=[0.0, 0.2, 0.5])
+    parser.add_argument("--modes", nargs="+", default=["single", "batch"], choices=["single", "batch"])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--policies", nargs="*", default=["ignore"], choices=["reject", "ignore", "replace"],
+                        help="Políticas de la ingesta idempotente a medir")
+    parser.add_argument("--fp-rate", type=float, default=0.01, help="Tasa de falsos positivos del filtro")
+    parser.add_argument("--profile", default="performance", help="Perfil de PRAGMA de SQLite")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = Path(workdir) / "corpus.json"
+        write_corpus(corpus, ["palabraprohibida"])
+        os.environ["CORPUS_FILE_PATH"] = str(corpus)
+        service = MessageProcessingService()
+
+        template = Path(workdir) / "template.db"
+        engine = create_db_engine(f"sqlite:///{template}", profile=args.profile)
+        init_db(engine)
+        populate(sessionmaker(bind=engine), 100, args.stored // 100, random.Random(args.seed))
+        engine.dispose()
+
+        for ratio in args.duplicate_ratio:
+            messages = make_messages(service, args, ratio, random.Random(args.seed))
+            for mode in args.modes:
+                cases = [(None, False), (None, True)] + [(policy, False) for policy in args.policies]
+                for policy, use_filter in cases:
+                    path = Path(workdir) / "case.db"
+                    shutil.copyfile(template, path)
+                    engine = create_db_engine(f"sqlite:///{path}", profile=args.profile)
+                    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                    id_filter, build_ms = None, 0.0
+                    if use_filter:
+                        start = time.perf_counter()
+                        id_filter = build_message_id_filter(SessionLocal, capacity=2 * args.stored,
+                                                            fp_rate=args.fp_rate)
+                        build_ms = (time.perf_counter() - start) * 1000
+                    latencies, duplicates, elapsed = run_case(SessionLocal, messages, mode, args.batch_size,
+                                                              id_filter, policy)
+                    engine.dispose()
+                    stats = id_filter.stats() if id_filter is not None else {}
+                    ms = lambda seconds: round(seconds * 1000, 3)
+                    rows.append({
+                        "case": f"mode={mode},policy={policy},filter={use_filter},duplicates={ratio},"
+                                f"stored={args.stored}",
+                        "mode": mode,
+                        "policy": policy or "-",
+                        "filter": use_filter,
+                        "duplicate_ratio": ratio,
+                        "duplicates": duplicates,
+                        "msgs_per_s": round(len(messages) / elapsed, 1),
+                        "p50_ms": ms(percentile(latencies, 50)),
+                        "p99_ms": ms(percentile(latencies, 99)),
+                        "filter_kib": round(stats.get("bytes", 0) / 1024, 1),
+                        "build_ms": round(build_ms, 1),
+                        "definitely_new": stats.get("definitely_new", 0),
+                        "false_positives": stats.get("false_positives", 0),
+                        "round_trips_saved": stats.get("round_trips_saved", 0),
+                    })
+
+    print_table(rows, ["mode", "policy", "filter", "duplicate_ratio", "duplicates", "msgs_per_s", "p50_ms", "p99_ms",
+                       "filter_kib", "build_ms", "definitely_new", "false_positives", "round_trips_saved"])
+    if args.output:
+        write_results(args.output, "id_filter", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
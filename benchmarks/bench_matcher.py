@@ -0,0 +1,77 @@
+"""
+Benchmark de los motores de búsqueda de palabras prohibidas.
+Mide el tiempo por mensaje de cada motor a medida que crece el corpus (14 -> 50k palabras)
+y verifica que todos devuelven la misma palabra que el recorrido lineal.
+
+    python benchmarks/bench_matcher.py
+    python benchmarks/bench_matcher.py --sizes 14 1000 50000 --messages 200 --output results/matcher.json
+"""
+import argparse
+import random
+import time
+
+from common import print_table, write_results
+from datagen import make_corpus, make_messages
+
+from services.message_service import MATCHER_ENGINES
+
+THRESHOLD = 80
+
+
+def run_engine(engine_name: str, corpus: list, messages: list) -> dict:
+    build_start = time.perf_counter()
+    matcher = MATCHER_ENGINES[engine_name](corpus, THRESHOLD)
+    build_seconds = time.perf_counter() - build_start
+
+    start = time.perf_counter()
+    found = [matcher.find(tokens) for tokens in messages]
+    elapsed = time.perf_counter() - start
+    return {
+        "engine": engine_name,
+        "corpus_size": len(corpus),
+        "messages": len(messages),
+        "build_ms": round(build_seconds * 1000, 2),
+        "per_message_us": round(elapsed / len(messages) * 1e6, 1),
+        "found": found,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de motores de palabras prohibidas")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[14, 100, 1000, 10000, 50000])
+    parser.add_argument("--engines", nargs="+", default=list(MATCHER_ENGINES))
+    parser.add_argument("--messages", type=int, default=200, help="Mensajes por tamaño de corpus")
+    parser.add_argument("--linear-budget", type=int, default=2_000_000,
+                        help="Máximo de comparaciones (mensajes x corpus) para el motor lineal")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        corpus = make_corpus(size, rng)
+        messages = make_messages(args.messages, corpus, rng)
+        reference = None
+        for engine_name in args.engines:
+            sample = messages
+            if engine_name == "linear":
+                # el motor lineal se limita para que los corpus grandes terminen en tiempo razonable
+                sample = messages[:max(1, min(len(messages), args.linear_budget // max(size, 1)))]
+            row = run_engine(engine_name, corpus, sample)
+            found = row.pop("found")
+            # todos los motores deben devolver la misma palabra en los mensajes comunes
+            if reference is not None:
+                common = min(len(found), len(reference))
+                assert found[:common] == reference[:common], f"{engine_name} difiere en corpus={size}"
+            if reference is None or len(found) > len(reference):
+                reference = found
+            rows.append(row)
+
+    print_table(rows, ["engine", "corpus_size", "messages", "build_ms", "per_message_us"])
+    if args.output:
+        write_results(args.output, "matcher", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark del coste de registrar métricas (core/metrics.py): nanosegundos por inc()/observe() con varios hilos
+registrando a la vez, y coste de exportar /metrics.
+
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --threads 1 4 16 --ops 200000 --output results/metrics.json
+"""
+import argparse
+import threading
+import time
+
+from common import print_table, write_results
+
+from core.metrics import MetricsRegistry, STAGES
+
+
+def run(threads: int, ops: int) -> dict:
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "Contador", ("code",))
+    histogram = registry.histogram("bench_seconds", "Histograma", ("stage",))
+    barrier = threading.Barrier(threads)
+    elapsed = {}
+
+    def worker(index: int):
+        barrier.wait()
+        start = time.perf_counter_ns()
+        for i in range(ops):
+            counter.inc("OK")
+            histogram.observe(i * 1e-6, STAGES[i % len(STAGES)])
+        elapsed[index] = time.perf_counter_ns() - start
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    start = time.perf_counter()
+    text = registry.render()
+    render_ms = (time.perf_counter() - start) * 1000
+    assert f'bench_total{{code="OK"}} {threads * ops}' in text
+    wall_ns = max(elapsed.values())
+    return {
+        "threads": threads,
+        # tiempo de pared por registro del conjunto de hilos (con el GIL no hay paralelismo real)
+        "ns_per_record": round(wall_ns / (threads * ops * 2), 1),
+        "records_per_s": round(threads * ops * 2 / (wall_ns / 1e9), 1),
+        "render_ms": round(render_ms, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del registro de métricas")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--ops", type=int, default=100000, help="inc() + observe() por hilo")
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    rows = [run(threads, args.ops) for threads in args.threads]
+    print_table(rows, ["threads", "ns_per_record", "records_per_s", "render_ms"])
+    if args.output:
+        write_results(args.output, "metrics", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
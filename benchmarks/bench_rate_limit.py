@@ -0,0 +1,106 @@
+"""
+Benchmark del límite de peticiones: memory:// (un contador por proceso) frente a sharedmem:// (contadores
+compartidos en un archivo mapeado en memoria). Varios procesos con varios hilos comprueban el límite de
+IPs distintas con la estrategia sliding-window-counter; se mide la latencia de cada comprobación
+(p50/p99), la espera por locks y las entradas desalojadas.
+
+    python benchmarks/bench_rate_limit.py
+    python benchmarks/bench_rate_limit.py --processes 4 --threads 8 --keys 100000 --slots 4096 --output results/rl.json
+"""
+import argparse
+import multiprocessing
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import percentile, print_table, write_results
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+import core.rate_limit  # noqa: F401 (registra el esquema sharedmem://)
+
+
+def worker(uri: str, args, seed: int, results) -> None:
+    storage = storage_from_string(uri)
+    strategy = SlidingWindowCounterRateLimiter(storage)
+    item = parse(args.limit)
+    latencies, allowed = [], [0]
+    lock = threading.Lock()
+
+    def run_thread(thread_seed: int):
+        rng = random.Random(thread_seed)
+        local, local_allowed = [], 0
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            # las IPs "calientes" concentran el tráfico, como en un reparto real
+            key = f"10.0.{rng.randrange(args.hot_keys)}" if rng.random() < 0.5 else f"ip-{rng.randrange(args.keys)}"
+            start = time.perf_counter()
+            local_allowed += strategy.hit(item, key)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            allowed[0] += local_allowed
+
+    threads = [threading.Thread(target=run_thread, args=(seed * 1000 + i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = storage.stats() if hasattr(storage, "stats") else {}
+    results.put((latencies, allowed[0], stats.get("lock_wait_ms", 0.0), stats.get("evictions", 0)))
+
+
+def run_config(name: str, uri: str, args) -> dict:
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(uri, args, i, results)) for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [value for result in collected for value in result[0]]
+    ms = lambda seconds: round(seconds * 1000, 4)
+    return {
+        "storage": name,
+        "checks_per_s": round(len(latencies) / args.seconds, 1),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "allowed": sum(result[1] for result in collected),
+        "lock_wait_ms": round(sum(result[2] for result in collected), 1),
+        "evictions": sum(result[3] for result in collected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del almacenamiento del límite de peticiones")
+    parser.add_argument("--processes", type=int, default=4, help="Procesos (workers de uvicorn)")
+    parser.add_argument("--threads", type=int, default=4, help="Hilos por proceso")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--keys", type=int, default=50000, help="IPs distintas")
+    parser.add_argument("--hot-keys", type=int, default=20, help="IPs que reciben la mitad del tráfico")
+    parser.add_argument("--slots", type=int, default=65536, help="Slots de la tabla compartida")
+    parser.add_argument("--limit", default="100/minute")
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = {
+            "memory": "memory://",
+            "sharedmem": f"sharedmem://{Path(tmp) / 'ratelimit.bin'}?slots={args.slots}",
+        }
+        rows = [run_config(name, uri, args) for name, uri in configs.items()]
+
+    # con memory:// cada proceso permite el límite completo: "allowed" crece con el número de procesos
+    print_table(rows, ["storage", "checks_per_s", "p50_ms", "p99_ms", "allowed", "lock_wait_ms", "evictions"])
+    if args.output:
+        write_results(args.output, "rate_limit", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
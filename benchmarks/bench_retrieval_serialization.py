@@ -0,0 +1,119 @@
+"""
+Benchmark de GET /api/messages/{session_id}: camino con esquemas Pydantic frente al camino rápido
+(filas de MESSAGE_COLUMNS codificadas directamente a JSON, RETRIEVAL_FAST_PATH).
+Las peticiones pasan por el router real con TestClient, incluida la validación de la respuesta de FastAPI.
+
+    python benchmarks/bench_retrieval_serialization.py
+    python benchmarks/bench_retrieval_serialization.py --page-sizes 100 1000 --iterations 200 --output results/get.json
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from common import percentile, print_table, write_results
+
+os.environ.setdefault("API_KEY", "bench-api-key")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from controllers import message_controller
+from core.cache import get_page_cache
+from core.database import Base, create_db_engine, get_db
+from models.message_model import MessageModel
+from models import session_stats_model  # noqa: F401 (registra la tabla)
+from services.message_service import MessageStorageService
+
+SESSION_ID = "session-bench"
+
+
+def populate(SessionLocal, count: int) -> None:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = [{
+        "message_id": f"msg-{i:07d}",
+        "session_id": SESSION_ID,
+        "content": f"Mensaje de benchmark número {i}, con acentos y signos: ¿qué tal?",
+        "timestamp": start + timedelta(seconds=i),
+        "sender": "user" if i % 2 else "system",
+        "word_count": 10,
+        "character_count": 62,
+        "processed_at": start + timedelta(seconds=i, milliseconds=250),
+    } for i in range(count)]
+    with SessionLocal() as db:
+        db.execute(insert(MessageModel), rows)
+        db.execute(*MessageStorageService._session_stats_increment(rows))
+        db.commit()
+
+
+def build_client(SessionLocal) -> TestClient:
+    def override_get_db():
+        with SessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+    app.state.limiter = message_controller.limiter
+    app.include_router(message_controller.router)
+    app.dependency_overrides[get_db] = override_get_db
+    # se mide la serialización: sin caché de páginas
+    app.dependency_overrides[get_page_cache] = lambda: None
+    return TestClient(app)
+
+
+def run(client: TestClient, fast_path: bool, page_size: int, iterations: int) -> dict:
+    message_controller.RETRIEVAL_FAST_PATH = fast_path
+    url = f"/api/messages/{SESSION_ID}?limit={page_size}"
+    headers = {"X-API-Key": os.environ["API_KEY"]}
+    for _ in range(5):  # calentamiento
+        client.get(url, headers=headers)
+    latencies, size = [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        size = len(response.content)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "path": "fast" if fast_path else "schemas",
+        "page_size": page_size,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización del GET de mensajes")
+    parser.add_argument("--messages", type=int, default=5000, help="Mensajes en la sesión")
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    # el límite de peticiones del endpoint no aplica al benchmark
+    message_controller.limiter.enabled = False
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        Base.metadata.create_all(engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        populate(SessionLocal, args.messages)
+        with build_client(SessionLocal) as client:
+            for page_size in args.page_sizes:
+                schemas = run(client, False, page_size, args.iterations)
+                fast = run(client, True, page_size, args.iterations)
+                fast["speedup"] = round(schemas["p50_ms"] / fast["p50_ms"], 2) if fast["p50_ms"] else None
+                rows += [schemas, fast]
+        engine.dispose()
+
+    print_table(rows, ["path", "page_size", "p50_ms", "p99_ms", "bytes", "speedup"])
+    if args.output:
+        write_results(args.output, "retrieval_serialization", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Micro-benchmarks de los caminos calientes de los servicios, a varias escalas:
+- processing: MessageProcessingService.process_message según tamaño del corpus, densidad de palabras
+  prohibidas y longitud del mensaje.
+- storage: MessageStorageService.save_message según el número de filas ya guardadas.
+- retrieval: MessageRetrievalService.get_messages_by_session según el tamaño de la sesión y de la página.
+
+Cada fila tiene un identificador "case" estable, de modo que compare.py puede comparar dos ejecuciones:
+
+    python benchmarks/bench_services.py --output results/base.json
+    python benchmarks/bench_services.py --suites processing --corpus-sizes 14 10000 --output results/new.json
+    python benchmarks/compare.py results/base.json results/new.json
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from common import percentile, print_table, write_results
+from datagen import make_corpus, make_requests, populate, write_corpus
+
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base, create_db_engine
+from core.exceptions import BannedWordException
+from models import message_model, session_stats_model  # noqa: F401 (registra las tablas)
+from services.message_service import MessageProcessingService, MessageRetrievalService, MessageStorageService
+
+SUITES = ("processing", "storage", "retrieval")
+
+
+def summarize(suite: str, case: str, latencies: list, **extra) -> dict:
+    """ Fila de resultados: latencia por operación en microsegundos y operaciones por segundo """
+    us = lambda seconds: round(seconds * 1e6, 1)
+    total = sum(latencies)
+    return {
+        "suite": suite,
+        "case": case,
+        **extra,
+        "ops": len(latencies),
+        "p50_us": us(percentile(latencies, 50)),
+        "p99_us": us(percentile(latencies, 99)),
+        "ops_per_s": round(len(latencies) / total, 1) if total else 0.0,
+    }
+
+
+def measure(func, items) -> list:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_processing(args, workdir: Path) -> list:
+    rows = []
+    for corpus_size in args.corpus_sizes:
+        rng = random.Random(args.seed)
+        corpus = make_corpus(corpus_size, rng)
+        path = workdir / f"corpus-{corpus_size}.json"
+        write_corpus(path, corpus)
+        os.environ["CORPUS_FILE_PATH"] = str(path)
+        service = MessageProcessingService()
+        service._get_matcher()  # la compilación del matcher no forma parte de la medida
+
+        for banned_ratio, words in itertools.product(args.banned_ratios, args.message_words):
+            requests = make_requests(args.iterations, corpus, rng, banned_ratio=banned_ratio,
+                                     words=(max(1, words // 2), words))
+            rejected = 0
+
+            def process(request):
+                nonlocal rejected
+                try:
+                    service.process_message(request)
+                except BannedWordException:
+                    rejected += 1
+
+            latencies = measure(process, requests)
+            rows.append(summarize(
+                "processing", f"corpus={corpus_size},banned={banned_ratio:g},words={words}", latencies,
+                rejected=rejected,
+            ))
+    return rows
+
+
+def bench_storage(args, workdir: Path) -> list:
+    rows = []
+    processor_corpus = workdir / "corpus-storage.json"
+    write_corpus(processor_corpus, ["palabraprohibida"])
+    os.environ["CORPUS_FILE_PATH"] = str(processor_corpus)
+    service = MessageProcessingService()
+    for existing in args.db_sizes:
+        rng = random.Random(args.seed)
+        engine = create_db_engine(f"sqlite:///{workdir / f'storage-{existing}.db'}", profile=args.profile)
+        Base.metadata.create_all(engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        populate(SessionLocal, args.sessions, existing // args.sessions, rng)
+        messages = [service.process_message(request) for request in
+                    make_requests(args.iterations, [], rng, sessions=args.sessions, banned_ratio=0)]
+        with SessionLocal() as db:
+            storage = MessageStorageService(db)
+            latencies = measure(storage.save_message, messages)
+        engine.dispose()
+        rows.append(summarize("storage", f"rows={existing},profile={args.profile}", latencies))
+    return rows
+
+
+def bench_retrieval(args, workdir: Path) -> list:
+    rows = []
+    for session_size in args.session_sizes:
+        rng = random.Random(args.seed)
+        engine = create_db_engine(f"sqlite:///{workdir / f'retrieval-{session_size}.db'}", profile=args.profile)
+        Base.metadata.create_all(engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        sessions = 10
+        populate(SessionLocal, sessions, session_size, rng)
+        with SessionLocal() as db:
+            retrieval = MessageRetrievalService(db)
+            for page_size in args.page_sizes:
+                session_ids = [f"session-{rng.randrange(sessions)}" for _ in range(args.iterations)]
+                latencies = measure(lambda session_id: retrieval.get_messages_by_session(session_id, limit=page_size),
+                                    session_ids)
+                rows.append(summarize("retrieval", f"session={session_size},limit={page_size}", latencies))
+        engine.dispose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de los servicios de mensajes")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--iterations", type=int, default=500, help="Operaciones medidas por caso")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[14, 1000, 10000])
+    parser.add_argument("--banned-ratios", type=float, nargs="+", default=[0.0, 0.2])
+    parser.add_argument("--message-words", type=int, nargs="+", default=[10, 100],
+                        help="Máximo de palabras por mensaje")
+    parser.add_argument("--db-sizes", type=int, nargs="+", default=[0, 10000, 100000],
+                        help="Filas guardadas antes de medir save_message")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--session-sizes", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--profile", default="performance", help="Perfil de PRAGMA de SQLite")
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    suites = {"processing": bench_processing, "storage": bench_storage, "retrieval": bench_retrieval}
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for suite in args.suites:
+            rows += suites[suite](args, Path(tmp))
+
+    print_table(rows, ["suite", "case", "ops", "p50_us", "p99_us", "ops_per_s", "rejected"])
+    if args.output:
+        write_results(args.output, "services", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
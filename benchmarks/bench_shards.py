@@ -0,0 +1,145 @@
+"""
+Throughput de escritura de mensajes según el número de shards (DATABASE_SHARDS).
+--workers escritores guardan mensajes en paralelo, cada uno en sus propias sesiones, con save_message y una
+sesión de base de datos por mensaje (como una petición POST). El caso shards=1 es MessageStorageService sobre un
+único archivo; el resto usa ShardedMessageStorageService con N archivos.
+Con --processes cada escritor es un proceso, como los workers de uvicorn; con hilos el GIL limita el paralelismo.
+
+    python benchmarks/bench_shards.py
+    python benchmarks/bench_shards.py --processes --workers 8 --shards 1 2 4 8 --profile durable --output results/shards.json
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import percentile, print_table, write_results
+from datagen import make_requests, write_corpus
+
+from sqlalchemy.orm import sessionmaker
+
+from core.database import ShardSet, create_db_engine, init_db
+from models import message_model, message_registry_model, session_stats_model  # noqa: F401 (registra las tablas)
+from services.message_service import MessageProcessingService, MessageStorageService
+from services.sharded_storage import ShardedMessageStorageService
+
+
+def shard_paths(workdir: str, count: int) -> list:
+    return [f"sqlite:///{Path(workdir) / f'shards{count}_{n}.db'}" for n in range(count)]
+
+
+def make_writer(workdir: str, count: int, profile: str):
+    """ Función save(message) y motores del caso; shards=1 es un único archivo sin registro de IDs """
+    if count == 1:
+        engine = create_db_engine(f"sqlite:///{Path(workdir) / 'single.db'}", profile=profile)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def save(message):
+            with SessionLocal() as db:
+                MessageStorageService(db).save_message(message)
+        return save, [engine]
+    shards = ShardSet(shard_paths(workdir, count), profile)
+    return ShardedMessageStorageService(shards).save_message, shards.engines
+
+
+def create_schema(workdir: str, count: int, profile: str) -> None:
+    _, engines = make_writer(workdir, count, profile)
+    for engine in engines:
+        init_db(engine)
+        engine.dispose()
+
+
+def write_messages(workdir: str, count: int, profile: str, messages: list, start_at: float) -> tuple:
+    """ Escritor: guarda sus mensajes; devuelve (latencias, errores, inicio, fin) """
+    save, engines = make_writer(workdir, count, profile)
+    # los escritores arrancan a la vez, después de abrir sus motores
+    time.sleep(max(0.0, start_at - time.time()))
+    latencies, errors = [], 0
+    started = time.time()
+    for message in messages:
+        start = time.perf_counter()
+        try:
+            save(message)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    finished = time.time()
+    for engine in engines:
+        engine.dispose()
+    return latencies, errors, started, finished
+
+
+def run_case(args, workdir: str, count: int, batches: list) -> list:
+    start_at = time.time() + 1.0
+    jobs = [(workdir, count, args.profile, messages, start_at) for messages in batches]
+    if args.processes:
+        with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+            return pool.starmap(write_messages, jobs)
+    results = [None] * len(jobs)
+
+    def worker(index):
+        results[index] = write_messages(*jobs[index])
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(len(jobs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput de escritura según el número de shards")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=8, help="Escritores en paralelo")
+    parser.add_argument("--processes", action="store_true", help="Un proceso por escritor (por defecto hilos)")
+    parser.add_argument("--messages", type=int, default=500, help="Mensajes por escritor")
+    parser.add_argument("--sessions", type=int, default=64, help="Sesiones por escritor")
+    parser.add_argument("--profile", default="performance", help="Perfil de PRAGMA de SQLite")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = Path(workdir) / "corpus.json"
+        write_corpus(corpus, ["palabraprohibida"])
+        os.environ["CORPUS_FILE_PATH"] = str(corpus)
+        service = MessageProcessingService()
+
+        for count in args.shards:
+            rng = random.Random(args.seed)
+            batches = []
+            for writer in range(args.workers):
+                requests = make_requests(args.messages, [], rng, sessions=args.sessions, banned_ratio=0,
+                                         prefix=f"shards{count}-w{writer}")
+                for request in requests:
+                    request.session_id = f"w{writer}-{request.session_id}"
+                batches.append([service.process_message(request) for request in requests])
+
+            create_schema(workdir, count, args.profile)
+            results = run_case(args, workdir, count, batches)
+            latencies = [latency for result in results for latency in result[0]]
+            elapsed = max(result[3] for result in results) - min(result[2] for result in results)
+            ms = lambda seconds: round(seconds * 1000, 3)
+            rows.append({
+                "case": f"shards={count},workers={args.workers},processes={args.processes},profile={args.profile}",
+                "shards": count,
+                "messages": len(latencies),
+                "errors": sum(result[1] for result in results),
+                "msgs_per_s": round(len(latencies) / elapsed, 1),
+                "p50_ms": ms(percentile(latencies, 50)),
+                "p99_ms": ms(percentile(latencies, 99)),
+            })
+
+    print_table(rows, ["shards", "messages", "errors", "msgs_per_s", "p50_ms", "p99_ms"])
+    if args.output:
+        write_results(args.output, "shards", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
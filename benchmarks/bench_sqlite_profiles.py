@@ -0,0 +1,120 @@
+"""
+Benchmark de perfiles de PRAGMA de SQLite con carga mixta de lectura y escritura.
+Cada perfil usa una base de datos temporal nueva; hilos escritores guardan mensajes con
+MessageStorageService y hilos lectores consultan sesiones con MessageRetrievalService.
+
+    python benchmarks/bench_sqlite_profiles.py
+    python benchmarks/bench_sqlite_profiles.py --writers 4 --readers 8 --seconds 10 --output results/sqlite.json
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from common import percentile, print_table, write_results
+
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base, SQLITE_PRAGMA_PROFILES, create_db_engine
+from core.exceptions import DatabaseException
+from models import message_model  # noqa: F401 (registra la tabla)
+from schemas.message_schema import DataResponseSchema, MessageResponseSchema, Metadata
+from services.message_service import MessageRetrievalService, MessageStorageService
+
+
+def make_message(message_id: str, session_id: str) -> MessageResponseSchema:
+    now = datetime.now(timezone.utc)
+    return MessageResponseSchema(status="success", data=DataResponseSchema(
+        message_id=message_id, session_id=session_id, content="mensaje de benchmark " * 5,
+        timestamp=now, sender=random.choice(["user", "system"]),
+        metadata=Metadata(word_count=15, character_count=105, processed_at=now)
+    ))
+
+
+def run_profile(profile: str, args, workdir: Path) -> dict:
+    engine = create_db_engine(f"sqlite:///{workdir / f'{profile}.db'}", profile=profile)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    stop = threading.Event()
+    write_latencies, read_latencies, errors = [], [], []
+    lock = threading.Lock()
+
+    def writer(worker: int):
+        db = SessionLocal()
+        storage = MessageStorageService(db)
+        counter, local = 0, []
+        while not stop.is_set():
+            message = make_message(f"w{worker}-{counter}", f"session-{counter % args.sessions}")
+            counter += 1
+            start = time.perf_counter()
+            try:
+                storage.save_message(message)
+                local.append(time.perf_counter() - start)
+            except DatabaseException as e:
+                with lock:
+                    errors.append(str(e.detail["error"]["details"]))
+        db.close()
+        with lock:
+            write_latencies.extend(local)
+
+    def reader(worker: int):
+        db = SessionLocal()
+        retrieval = MessageRetrievalService(db)
+        rng, local = random.Random(worker), []
+        while not stop.is_set():
+            start = time.perf_counter()
+            retrieval.get_messages_by_session(f"session-{rng.randrange(args.sessions)}", limit=args.page_size)
+            local.append(time.perf_counter() - start)
+            db.rollback()  # cierra la transacción de lectura para ver escrituras nuevas
+        db.close()
+        with lock:
+            read_latencies.extend(local)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "profile": profile,
+        "writes_per_s": round(len(write_latencies) / args.seconds, 1),
+        "reads_per_s": round(len(read_latencies) / args.seconds, 1),
+        "write_p50_ms": ms(percentile(write_latencies, 50)),
+        "write_p99_ms": ms(percentile(write_latencies, 99)),
+        "read_p50_ms": ms(percentile(read_latencies, 50)),
+        "read_p99_ms": ms(percentile(read_latencies, 99)),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de perfiles de PRAGMA de SQLite")
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PRAGMA_PROFILES))
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [run_profile(profile, args, Path(tmp)) for profile in args.profiles]
+
+    print_table(rows, ["profile", "writes_per_s", "reads_per_s", "write_p50_ms", "write_p99_ms",
+                       "read_p50_ms", "read_p99_ms", "errors"])
+    if args.output:
+        write_results(args.output, "sqlite_profiles", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark del modo write-behind frente al guardado directo (un commit por mensaje).
+Varios hilos clientes guardan mensajes durante un tiempo fijo; para cada configuración se mide
+el throughput y la latencia de confirmación (p50/p99) que vería la petición.
+
+    python benchmarks/bench_write_behind.py
+    python benchmarks/bench_write_behind.py --clients 16 --batch-sizes 50 200 --flush-ms 2 10 --output results/wb.json
+"""
+import argparse
+import itertools
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import percentile, print_table, write_results
+from bench_sqlite_profiles import make_message
+
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base, create_db_engine
+from core.exceptions import DatabaseException
+from models import message_model, session_stats_model  # noqa: F401 (registra las tablas)
+from services.message_service import MessageStorageService
+from services.write_behind import ACK_MODES, WriteBehindStorageService, WriteBehindWriter
+
+
+def run_config(name: str, config: dict, args, workdir: Path) -> dict:
+    engine = create_db_engine(f"sqlite:///{workdir / f'{name}.db'}", profile=args.profile)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    writer = WriteBehindWriter(SessionLocal, **config) if config else None
+    stop = threading.Event()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(worker: int):
+        db = SessionLocal()
+        storage = WriteBehindStorageService(db, writer) if writer else MessageStorageService(db)
+        counter, local = 0, []
+        while not stop.is_set():
+            message = make_message(f"c{worker}-{counter}", f"session-{counter % args.sessions}")
+            counter += 1
+            start = time.perf_counter()
+            try:
+                storage.save_message(message)
+                local.append(time.perf_counter() - start)
+            except DatabaseException as e:
+                with lock:
+                    errors.append(str(e.detail["error"]["details"]))
+        db.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    drain = 0.0
+    if writer:
+        # en modo enqueue el throughput real incluye vaciar la cola
+        drain_start = time.perf_counter()
+        writer.close()
+        drain = time.perf_counter() - drain_start
+    elapsed = time.perf_counter() - started
+    with SessionLocal() as db:
+        stored = db.query(message_model.MessageModel).count()
+    engine.dispose()
+
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "config": name,
+        "acks_per_s": round(len(latencies) / args.seconds, 1),
+        "stored_per_s": round(stored / elapsed, 1),
+        "ack_p50_ms": ms(percentile(latencies, 50)),
+        "ack_p99_ms": ms(percentile(latencies, 99)),
+        "drain_ms": ms(drain),
+        "batches": writer.stats()["batches"] if writer else stored,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del escritor write-behind")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--profile", default="durable", help="Perfil de PRAGMA de SQLite")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--flush-ms", type=float, nargs="+", default=[2, 10])
+    parser.add_argument("--ack-modes", nargs="+", default=list(ACK_MODES))
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    configs = {"direct": None}
+    for ack_mode, batch_size, flush_ms in itertools.product(args.ack_modes, args.batch_sizes, args.flush_ms):
+        configs[f"{ack_mode}-b{batch_size}-t{flush_ms:g}ms"] = {
+            "ack_mode": ack_mode, "batch_size": batch_size, "flush_interval_ms": flush_ms,
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [run_config(name, config, args, Path(tmp)) for name, config in configs.items()]
+
+    print_table(rows, ["config", "acks_per_s", "stored_per_s", "ack_p50_ms", "ack_p99_ms",
+                       "drain_ms", "batches", "errors"])
+    if args.output:
+        write_results(args.output, "write_behind", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
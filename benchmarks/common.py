@@ -0,0 +1,60 @@
+"""
+Utilidades compartidas por los benchmarks.
+Los scripts se ejecutan desde la raíz del proyecto, p. ej.:
+    python benchmarks/bench_matcher.py
+"""
+import json
+import math
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = PROJECT_ROOT / "src"
+
+# mismo pythonpath que pytest.ini
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+
+def percentile(values, pct: float) -> float:
+    """ Percentil por rango más cercano de una lista de valores """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def timed(func, *args, **kwargs):
+    """ Ejecuta func y devuelve (resultado, segundos) """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def write_results(path, benchmark: str, results: list, params: dict = None) -> None:
+    """ Escribe los resultados en JSON para poder comparar ejecuciones """
+    payload = {
+        "benchmark": benchmark,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params or {},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Resultados guardados en: {path}")
+
+
+def print_table(rows: list, columns: list) -> None:
+    """ Imprime una tabla simple con las columnas indicadas """
+    widths = [max(len(str(c)), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
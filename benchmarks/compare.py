@@ -0,0 +1,89 @@
+"""
+Compara dos archivos de resultados de los benchmarks (--output) y señala las regresiones.
+Las filas se emparejan por sus campos de texto (p. ej. "suite" y "case") y los campos de --key; se comparan
+las métricas de latencia (*_ms, *_us: menor es mejor) y de throughput (*_per_s: mayor es mejor).
+Termina con código 1 si alguna métrica empeora más que --threshold, para usarlo en CI.
+
+    python benchmarks/compare.py results/base.json results/new.json
+    python benchmarks/compare.py results/base.json results/new.json --threshold 0.15 --metrics p50_us
+"""
+import argparse
+import json
+import sys
+
+from common import print_table
+
+LOWER_IS_BETTER = ("_ms", "_us")
+HIGHER_IS_BETTER = ("_per_s",)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def row_key(row: dict, key_fields: list) -> tuple:
+    fields = sorted(name for name, value in row.items() if isinstance(value, str) or name in key_fields)
+    return tuple((name, row[name]) for name in fields)
+
+
+def metric_direction(name: str) -> int:
+    """ 1 si un valor menor es mejor, -1 si un valor mayor es mejor, 0 si no es una métrica comparable """
+    if name.endswith(LOWER_IS_BETTER):
+        return 1
+    if name.endswith(HIGHER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(base: dict, new: dict, threshold: float, metrics: list = None, key_fields: list = None) -> list:
+    """ Filas de comparación con el cambio relativo de cada métrica (positivo = peor) """
+    key_fields = key_fields or []
+    base_rows = {row_key(row, key_fields): row for row in base["results"]}
+    comparison = []
+    for row in new["results"]:
+        key = row_key(row, key_fields)
+        reference = base_rows.get(key)
+        if reference is None:
+            continue
+        for name, value in row.items():
+            direction = metric_direction(name)
+            if not direction or (metrics and name not in metrics):
+                continue
+            old = reference.get(name)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or not old:
+                continue
+            change = direction * (value - old) / old
+            comparison.append({
+                "row": ",".join(str(v) for _, v in key),
+                "metric": name,
+                "base": old,
+                "new": value,
+                "change": f"{change:+.1%}",
+                "status": "REGRESSION" if change > threshold else ("improved" if change < -threshold else "ok"),
+            })
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos ejecuciones de un benchmark")
+    parser.add_argument("base", help="Resultados de referencia")
+    parser.add_argument("new", help="Resultados nuevos")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento relativo tolerado")
+    parser.add_argument("--metrics", nargs="+", help="Métricas a comparar (por defecto todas)")
+    parser.add_argument("--key", nargs="+", default=[], help="Campos numéricos que identifican la fila")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    if base.get("benchmark") != new.get("benchmark"):
+        parser.error(f"benchmarks distintos: {base.get('benchmark')} y {new.get('benchmark')}")
+
+    rows = compare(base, new, args.threshold, args.metrics, args.key)
+    print_table(rows, ["row", "metric", "base", "new", "change", "status"])
+    regressions = sum(row["status"] == "REGRESSION" for row in rows)
+    print(f"{len(rows)} métricas comparadas, {regressions} regresiones (umbral {args.threshold:.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
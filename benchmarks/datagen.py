@@ -0,0 +1,116 @@
+"""
+Generador de datos sintéticos para los benchmarks: corpus de palabras prohibidas, mensajes con una densidad
+configurable de palabras prohibidas, peticiones de mensajes y bases de datos pobladas con N sesiones.
+Con la misma semilla genera siempre los mismos datos, para que las ejecuciones sean comparables.
+"""
+import json
+import random
+import string
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from common import PROJECT_ROOT
+
+from sqlalchemy import insert
+
+from models.message_model import MessageModel
+from schemas.message_schema import MessageRequestSchema
+from services.message_service import MessageStorageService
+
+ALPHABET = string.ascii_lowercase + "áéíóúñ"
+VOCABULARY = ["hola", "mensaje", "ayuda", "cuenta", "gracias", "por", "favor", "tengo",
+              "una", "pregunta", "sobre", "el", "pedido", "de", "la", "entrega", "hoy"]
+BASE_TIMESTAMP = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def load_base_corpus() -> list:
+    with open(PROJECT_ROOT / "src" / "data" / "corpus_filter.json") as f:
+        return [w.lower() for w in json.load(f)["banned_words"]]
+
+
+def make_corpus(size: int, rng: random.Random) -> list:
+    """ Corpus real ampliado con pseudo-palabras de 3 a 14 caracteres """
+    words = load_base_corpus()[:size]
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 14)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def write_corpus(path, words: list) -> None:
+    """ Guarda el corpus con el formato de CORPUS_FILE_PATH """
+    with open(path, "w") as f:
+        json.dump({"banned_words": words}, f)
+
+
+def make_messages(
+    count: int,
+    corpus: list,
+    rng: random.Random,
+    banned_ratio: float = 0.2,
+    words: Tuple[int, int] = (5, 30),
+) -> list:
+    """ Mensajes tokenizados de words[0] a words[1] tokens; una fracción (banned_ratio) incluye una palabra
+        del corpus con un typo """
+    messages = []
+    for _ in range(count):
+        tokens = [rng.choice(VOCABULARY) for _ in range(rng.randint(*words))]
+        if rng.random() < banned_ratio:
+            word = rng.choice(corpus)
+            if len(word) > 4:
+                pos = rng.randrange(len(word))
+                word = word[:pos] + rng.choice(ALPHABET) + word[pos + 1:]
+            tokens.insert(rng.randrange(len(tokens) + 1), word)
+        messages.append(tokens)
+    return messages
+
+
+def make_requests(
+    count: int,
+    corpus: list,
+    rng: random.Random,
+    sessions: int = 50,
+    banned_ratio: float = 0.2,
+    words: Tuple[int, int] = (5, 30),
+    prefix: str = "msg",
+) -> List[MessageRequestSchema]:
+    """ Peticiones de POST /api/messages/ repartidas entre `sessions` sesiones """
+    return [
+        MessageRequestSchema(
+            message_id=f"{prefix}-{i:08d}",
+            session_id=f"session-{rng.randrange(sessions)}",
+            content=" ".join(tokens),
+            timestamp=BASE_TIMESTAMP + timedelta(seconds=i),
+            sender=rng.choice(["user", "system"]),
+        )
+        for i, tokens in enumerate(make_messages(count, corpus, rng, banned_ratio, words))
+    ]
+
+
+def populate(SessionLocal, sessions: int, per_session: int, rng: random.Random,
+             words: Tuple[int, int] = (5, 30), chunk_size: int = 5000) -> int:
+    """ Inserta per_session mensajes en cada una de las sesiones session-0..N-1 (con sus contadores);
+        devuelve el total de filas """
+    total = sessions * per_session
+    for start in range(0, total, chunk_size):
+        rows = []
+        for i in range(start, min(start + chunk_size, total)):
+            content = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(*words)))
+            rows.append({
+                "message_id": f"seed-{i:09d}",
+                "session_id": f"session-{i % sessions}",
+                "content": content,
+                "timestamp": BASE_TIMESTAMP + timedelta(seconds=i),
+                "sender": "user" if i % 2 else "system",
+                "word_count": len(content.split()),
+                "character_count": len(content),
+                "processed_at": BASE_TIMESTAMP + timedelta(seconds=i, milliseconds=250),
+            })
+        with SessionLocal() as db:
+            db.execute(insert(MessageModel), rows)
+            db.execute(*MessageStorageService._session_stats_increment(rows))
+            db.commit()
+    return total
@@ -0,0 +1,210 @@
+"""
+Prueba de carga HTTP de una instancia de main:app.
+Arranca uvicorn en un subproceso (base de datos temporal) o usa un servidor ya levantado (--url), y para cada
+nivel de concurrencia ejecuta durante --seconds una mezcla de POST /api/messages/ y GET /api/messages/{session_id}
+con clientes asyncio + httpx en bucle cerrado. Informa RPS, latencia p50/p95/p99 por operación y el desglose de
+respuestas 2xx/304/429/4xx/5xx; con --slo-p99-ms indica el mayor nivel que cumple el objetivo de p99.
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --concurrency 1 8 32 64 --post-ratio 0.3 --seconds 20 --output results/load.json
+    python benchmarks/loadtest.py --url http://localhost:8000 --api-key mi-clave --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import SRC_DIR, percentile, print_table, write_results
+from datagen import VOCABULARY
+
+import httpx
+
+DEFAULT_API_KEY = "loadtest-api-key"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir: Path) -> tuple:
+    """ Arranca uvicorn con main:app y espera a que responda; devuelve (proceso, url) """
+    port = free_port()
+    env = {
+        **os.environ,
+        "API_KEY": args.api_key,
+        "DATABASE_URL": f"sqlite:///{workdir / 'loadtest.db'}",
+        "CORPUS_FILE_PATH": str(SRC_DIR / "data" / "corpus_filter.json"),
+        "RATE_LIMIT_ENABLED": "true" if args.rate_limit else "false",
+        "RATE_LIMIT_STORAGE_URI": f"sharedmem://{workdir / 'ratelimit.bin'}",
+        "API_KEYS_SOURCE": "",
+    }
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=SRC_DIR, env=env)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn terminó con código {process.returncode}")
+        try:
+            if httpx.get(f"{url}/", timeout=1).status_code < 500:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn no respondió en 30 s")
+
+
+def status_class(status: int) -> str:
+    if status == 429:
+        return "429"
+    if status == 304:
+        return "304"
+    return f"{status // 100}xx"
+
+
+class LoadRun:
+    """ Resultados de un nivel de concurrencia """
+    def __init__(self):
+        self.latencies = {"post": [], "get": []}
+        self.statuses = Counter()
+        self.errors = Counter()
+
+
+async def client_loop(client: httpx.AsyncClient, run: LoadRun, args, worker: int, deadline: float, counter) -> None:
+    rng = random.Random(args.seed * 1000 + worker)
+    headers = {"X-API-Key": args.api_key}
+    while time.perf_counter() < deadline:
+        session_id = f"load-session-{rng.randrange(args.sessions)}"
+        if rng.random() < args.post_ratio:
+            operation = "post"
+            message_id = f"load-{worker}-{next(counter)}"
+            words = rng.randint(*args.message_words)
+            request = client.post("/api/messages/", headers=headers, json={
+                "message_id": message_id,
+                "session_id": session_id,
+                "content": " ".join(rng.choice(VOCABULARY) for _ in range(words)),
+                "timestamp": "2025-01-01T00:00:00Z",
+                "sender": rng.choice(["user", "system"]),
+            })
+        else:
+            operation = "get"
+            request = client.get(f"/api/messages/{session_id}", headers=headers, params={"limit": args.page_size})
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            run.errors[type(e).__name__] += 1
+            continue
+        run.latencies[operation].append(time.perf_counter() - start)
+        run.statuses[status_class(response.status_code)] += 1
+
+
+async def run_level(url: str, concurrency: int, args, counter) -> dict:
+    run = LoadRun()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        # calentamiento: conexiones abiertas y corpus cargado antes de medir
+        warmup = time.perf_counter() + args.warmup
+        await asyncio.gather(*(client_loop(client, LoadRun(), args, i, warmup, counter) for i in range(concurrency)))
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        await asyncio.gather(*(client_loop(client, run, args, i, deadline, counter) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    every = run.latencies["post"] + run.latencies["get"]
+    ms = lambda seconds: round(seconds * 1000, 2)
+    row = {
+        "concurrency": concurrency,
+        "requests": len(every),
+        "rps": round(len(every) / elapsed, 1),
+        "p50_ms": ms(percentile(every, 50)),
+        "p95_ms": ms(percentile(every, 95)),
+        "p99_ms": ms(percentile(every, 99)),
+    }
+    for operation, values in run.latencies.items():
+        row[f"{operation}_rps"] = round(len(values) / elapsed, 1)
+        row[f"{operation}_p99_ms"] = ms(percentile(values, 99))
+    for status in ("2xx", "304", "429", "4xx", "5xx"):
+        row[status] = run.statuses.get(status, 0)
+    row["errors"] = sum(run.errors.values())
+    return row
+
+
+async def seed_sessions(url: str, args) -> None:
+    """ Un mensaje por sesión: los GET de la mezcla no devuelven 404 por sesiones vacías """
+    headers = {"X-API-Key": args.api_key}
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout) as client:
+        for session in range(args.sessions):
+            await client.post("/api/messages/", headers=headers, json={
+                "message_id": f"load-seed-{session}-{args.seed}",
+                "session_id": f"load-session-{session}",
+                "content": "mensaje inicial de la prueba de carga",
+                "timestamp": "2025-01-01T00:00:00Z",
+                "sender": "user",
+            })
+
+
+async def run_all(url: str, args) -> list:
+    counter = iter(range(10 ** 12))
+    await seed_sessions(url, args)
+    return [await run_level(url, concurrency, args, counter) for concurrency in args.concurrency]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga HTTP de la API de mensajes")
+    parser.add_argument("--url", help="Servidor ya levantado (por defecto arranca uvicorn con una BD temporal)")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", DEFAULT_API_KEY))
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn (servidor local)")
+    parser.add_argument("--rate-limit", action="store_true", help="Mantener activo el límite de peticiones")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duración de cada nivel")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--post-ratio", type=float, default=0.5, help="Fracción de POST en la mezcla")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--message-words", type=int, nargs=2, default=[5, 30], metavar=("MIN", "MAX"))
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--slo-p99-ms", type=float, help="Objetivo de p99 para calcular la capacidad")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del archivo JSON de resultados")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        url = args.url
+        if url is None:
+            process, url = start_server(args, Path(tmp))
+        try:
+            rows = asyncio.run(run_all(url, args))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    print_table(rows, ["concurrency", "rps", "p50_ms", "p95_ms", "p99_ms", "post_rps", "post_p99_ms",
+                       "get_rps", "get_p99_ms", "2xx", "304", "429", "4xx", "5xx", "errors"])
+    if args.slo_p99_ms is not None:
+        within = [row for row in rows if row["p99_ms"] <= args.slo_p99_ms and not row["5xx"] and not row["errors"]]
+        best = max(within, key=lambda row: row["rps"], default=None)
+        if best:
+            print(f"Capacidad con p99 <= {args.slo_p99_ms:g} ms: {best['rps']} req/s "
+                  f"(concurrencia {best['concurrency']})")
+        else:
+            print(f"Ningún nivel cumple p99 <= {args.slo_p99_ms:g} ms")
+    if args.output:
+        write_results(args.output, "loadtest", rows, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,7 @@ def run_all_tests():
     
     unit_tests = [
         "tests/test_auth/",
+        "tests/test_core/",
         "tests/test_services/"
     ]
     
@@ -66,7 +67,7 @@ def run_coverage():
     subprocess.run(["coverage", "erase"], cwd=project_root)
     
     # Tests unitarios con cobertura
-    unit_tests = ["tests/test_auth/", "tests/test_services/"]
+    unit_tests = ["tests/test_auth/", "tests/test_core/", "tests/test_services/"]
     for test_path in unit_tests:
         if (project_root / test_path).exists():
             subprocess.run([
@@ -114,7 +115,7 @@ if __name__ == "__main__":
         # Solo unitarios
         project_root = Path(__file__).parent
         subprocess.run([
-            sys.executable, "-m", "pytest", "tests/test_auth/", "tests/test_services/", "-v"
+            sys.executable, "-m", "pytest", "tests/test_auth/", "tests/test_core/", "tests/test_services/", "-v"
         ], cwd=project_root)
     else:
         # Todos los tests
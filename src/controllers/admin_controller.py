@@ -0,0 +1,34 @@
+import asyncio
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+from core.auth import verify_admin_key
+from core.exceptions import ProfilerBusyException
+from core.profiler import DEFAULT_INTERVAL_MS, ProfilerBusyError, start_profile
+
+router = APIRouter(prefix="/admin", tags=["Admin router"], dependencies=[Depends(verify_admin_key)])
+
+# cada cuánto comprueba el endpoint si terminó la sesión de perfilado (segundos)
+PROFILE_POLL_INTERVAL = 0.05
+
+@router.post("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0, description="Duración máxima de la sesión"),
+    requests: Optional[int] = Query(None, ge=1, description="Terminar tras estas peticiones (sin contar /admin)"),
+    interval_ms: float = Query(DEFAULT_INTERVAL_MS, ge=1, le=1000, description="Intervalo de muestreo"),
+    top: int = Query(20, ge=1, le=500, description="Funciones en la tabla top"),
+    include_idle: bool = Query(False, description="Incluir hilos en espera"),
+    format: Literal["json", "collapsed"] = Query("json", description="collapsed: texto para flamegraph.pl"),
+):
+    """Perfila el proceso durante seconds o las próximas requests peticiones y devuelve las funciones más costosas
+    y las pilas colapsadas. Responde al terminar la sesión."""
+    try:
+        session = start_profile(seconds, requests, interval_ms / 1000, include_idle)
+    except ProfilerBusyError:
+        raise ProfilerBusyException()
+    # espera sin ocupar un hilo del threadpool: el muestreo ocurre en el hilo del perfilador
+    while session.running:
+        await asyncio.sleep(PROFILE_POLL_INTERVAL)
+    if format == "collapsed":
+        return PlainTextResponse(session.collapsed())
+    return session.report(top)
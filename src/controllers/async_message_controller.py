@@ -0,0 +1,164 @@
+from fastapi import APIRouter, Body, Depends, Query, Security, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from dependencies.services import (
+    get_message_processing_service, get_async_storage_service, get_async_retrieval_service, get_async_export_service
+)
+from dependencies.auth import require_api_key
+from services.message_service import (
+    MessageProcessingService, AsyncMessageStorageService, AsyncMessageRetrievalService, AsyncMessageExportService,
+    ConflictPolicy, DEFAULT_CONFLICT_POLICY, encode_messages_page, session_page_etag
+)
+from schemas.message_schema import (
+    MessageRequestSchema, MessageIngestResponseSchema, MessagesListSchema, MessagesBatchResponseSchema
+)
+from core.cache import SessionPageCache, get_page_cache
+from core.exceptions import SenderMissingException, MessagesNotFoundException
+from core.metrics import MetricsRoute, count_messages, record_batch_results
+from controllers import message_controller
+from controllers.message_controller import (
+    limiter, MAX_BATCH_SIZE, ON_CONFLICT_DESCRIPTION, etag_matches, not_modified_response, page_response
+)
+from typing import List, Optional
+
+# mismos endpoints que message_controller, pero async def sobre AsyncSession (DATABASE_ASYNC=true)
+router = APIRouter(tags=["Messages router"], prefix="/api/messages", route_class=MetricsRoute)
+
+@router.post("/")
+@limiter.limit("100/hour")
+@count_messages
+async def receive_message(
+    request: Request,
+    message: MessageRequestSchema,
+    api_key: str = Security(require_api_key),
+    service: MessageProcessingService = Depends(get_message_processing_service),
+    storage_service: AsyncMessageStorageService = Depends(get_async_storage_service),
+    on_conflict: Optional[ConflictPolicy] = Query(default=None, description=ON_CONFLICT_DESCRIPTION),
+) -> MessageIngestResponseSchema:
+    """Recibe y procesa un mensaje, luego lo almacena en la base de datos.
+    Con on_conflict (o INGEST_CONFLICT_POLICY) la ingesta es idempotente y created indica si el mensaje se creó."""
+    # la moderación (fuzzy matching) consume CPU: se ejecuta en el threadpool para no bloquear el event loop
+    processed_message = await run_in_threadpool(service.process_message, message)
+    policy = on_conflict or DEFAULT_CONFLICT_POLICY
+    created = True
+    if policy is None:
+        await storage_service.save_message(processed_message)
+    else:
+        created = await storage_service.upsert_message(processed_message, policy)
+    return MessageIngestResponseSchema(status=processed_message.status, data=processed_message.data, created=created)
+
+@router.post("/batch")
+@limiter.limit("100/hour")
+async def receive_messages_batch(
+    request: Request,
+    messages: List[MessageRequestSchema] = Body(..., min_length=1, max_length=MAX_BATCH_SIZE),
+    api_key: str = Security(require_api_key),
+    service: MessageProcessingService = Depends(get_message_processing_service),
+    storage_service: AsyncMessageStorageService = Depends(get_async_storage_service),
+    on_conflict: Optional[ConflictPolicy] = Query(default=None, description=ON_CONFLICT_DESCRIPTION),
+) -> MessagesBatchResponseSchema:
+    """Recibe un lote de mensajes, los procesa y almacena los aceptados en una sola transacción."""
+    policy = on_conflict or DEFAULT_CONFLICT_POLICY
+    # moderación del lote en el threadpool; en el event loop solo queda la E/S de la base de datos
+    processed = await run_in_threadpool(service.process_batch, messages)
+    if policy is None:
+        results = await storage_service.save_batch(processed)
+    else:
+        results = await storage_service.upsert_batch(processed, policy)
+    record_batch_results(results)
+    accepted = sum(1 for result in results if result.status == "accepted")
+    return MessagesBatchResponseSchema(
+        results=results,
+        accepted=accepted,
+        rejected=len(results) - accepted
+    )
+
+@router.get("/{session_id}")
+@limiter.limit("500/hour")
+async def get_messages_by_session(
+    request: Request,
+    response: Response,
+    session_id: str,
+    api_key: str = Security(require_api_key),
+    limit: int = Query(default=100, ge=1, le=1000, description="Número máximo de mensajes a devolver"),
+    offset: int = Query(default=0, ge=0, description="Número de mensajes a omitir"),
+    sender: Optional[str] = Query(default=None, description="Filtrar por remitente (user/system)"),
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco de la página siguiente (next_cursor)"),
+    retrieval_service: AsyncMessageRetrievalService = Depends(get_async_retrieval_service),
+    page_cache: Optional[SessionPageCache] = Depends(get_page_cache)
+) -> MessagesListSchema:
+    """Recupera mensajes por session_id, con paginación (offset o cursor) y filtro opcional por remitente.
+    Los mensajes se ordenan por (timestamp, message_id); next_cursor apunta a la página siguiente.
+    Con If-None-Match igual al ETag vigente se responde 304 sin leer ni serializar mensajes."""
+    if sender and sender not in ["user", "system"]:
+        raise SenderMissingException()
+
+    fast_path = message_controller.RETRIEVAL_FAST_PATH
+    cache_key = (session_id, sender, cursor, offset, limit)
+    token = page_cache.token(session_id) if fast_path and page_cache is not None else None
+
+    total, version = await retrieval_service.get_session_version(session_id, sender)
+    etag = session_page_etag(session_id, sender, cursor, offset, limit, total, version)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    if token is not None:
+        cached = page_cache.get(cache_key, lambda value: value[0] == etag)
+        if cached is not None:
+            return page_response(cached[1], etag, page_cache, hit=True)
+
+    if fast_path:
+        rows, next_cursor = await retrieval_service.get_session_page_rows(
+            session_id=session_id,
+            limit=limit,
+            offset=offset,
+            sender=sender,
+            cursor=cursor
+        )
+        if not rows:
+            raise MessagesNotFoundException(session_id, sender)
+        body = encode_messages_page(rows, total, next_cursor)
+        if page_cache is not None:
+            page_cache.set(cache_key, session_id, (etag, body), token, size=len(body) + len(etag))
+        return page_response(body, etag, page_cache)
+
+    messages, next_cursor = await retrieval_service.get_session_page(
+        session_id=session_id,
+        limit=limit,
+        offset=offset,
+        sender=sender,
+        cursor=cursor
+    )
+
+    if not messages:
+        raise MessagesNotFoundException(session_id, sender)
+
+    response.headers["ETag"] = etag
+    return MessagesListSchema(
+        messages=messages,
+        total=total,
+        count=len(messages),
+        next_cursor=next_cursor
+    )
+
+@router.get("/{session_id}/export")
+@limiter.limit("100/hour")
+async def export_session_messages(
+    request: Request,
+    session_id: str,
+    api_key: str = Security(require_api_key),
+    sender: Optional[str] = Query(default=None, description="Filtrar por remitente (user/system)"),
+    retrieval_service: AsyncMessageRetrievalService = Depends(get_async_retrieval_service),
+    export_service: AsyncMessageExportService = Depends(get_async_export_service)
+) -> StreamingResponse:
+    """Exporta todos los mensajes de la sesión como NDJSON (un mensaje por línea) en streaming."""
+    if sender and sender not in ["user", "system"]:
+        raise SenderMissingException()
+
+    if not await retrieval_service.get_session_total(session_id, sender):
+        raise MessagesNotFoundException(session_id, sender)
+
+    return StreamingResponse(
+        export_service.iter_session_ndjson(session_id, sender),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{session_id}.ndjson"'}
+    )
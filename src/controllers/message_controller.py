@@ -1,59 +1,193 @@
-from fastapi import APIRouter, Depends, Query, Security, Request
-from dependencies.services import get_message_processing_service, get_storage_service, get_retrieval_service
+from fastapi import APIRouter, Body, Depends, Query, Security, Request, Response
+from fastapi.responses import StreamingResponse
+from dependencies.services import get_message_processing_service, get_storage_service, get_retrieval_service, get_export_service
 from dependencies.auth import require_api_key
-from services.message_service import MessageProcessingService, MessageStorageService, MessageRetrievalService
-from schemas.message_schema import MessageRequestSchema, MessageResponseSchema, MessagesListSchema
+from services.message_service import (
+    MessageProcessingService, MessageStorageService, MessageRetrievalService, MessageExportService,
+    ConflictPolicy, DEFAULT_CONFLICT_POLICY, encode_messages_page, session_page_etag
+)
+from schemas.message_schema import (
+    MessageRequestSchema, MessageIngestResponseSchema, MessagesListSchema, MessagesBatchResponseSchema
+)
+from core.cache import SessionPageCache, get_page_cache
 from core.exceptions import SenderMissingException, MessagesNotFoundException
-from typing import Optional
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.metrics import MetricsRoute, count_messages, record_batch_results
+from core.rate_limit import limiter
+from typing import List, Optional
+import os
 
-# limiter para configurar un máximo de requests por IP
-limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(tags=["Messages router"], prefix="/api/messages", route_class=MetricsRoute)
 
-router = APIRouter(tags=["Messages router"], prefix="/api/messages")
+# máximo de mensajes por lote
+MAX_BATCH_SIZE = 1000
+
+# ingesta idempotente: política ante un message_id existente (por defecto INGEST_CONFLICT_POLICY)
+ON_CONFLICT_DESCRIPTION = (
+    "Ingesta idempotente ante un message_id existente: reject (duplicado), ignore (se conserva el guardado) "
+    "o replace (mismo session_id y sender)"
+)
+
+# GET de mensajes: las filas se codifican directamente a JSON, sin un modelo Pydantic por mensaje
+# (RETRIEVAL_FAST_PATH=false vuelve a construir y validar MessagesListSchema)
+RETRIEVAL_FAST_PATH = os.getenv("RETRIEVAL_FAST_PATH", "true").lower() == "true"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Indica si la cabecera If-None-Match de la petición incluye el ETag (comparación débil)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+def not_modified_response(etag: str) -> Response:
+    """Respuesta 304 sin cuerpo para un cliente que ya tiene la versión actual de la página."""
+    return Response(status_code=304, headers={"ETag": etag})
+
+def page_response(body: bytes, etag: str, page_cache: Optional[SessionPageCache], hit: bool = False) -> Response:
+    """Respuesta JSON de una página ya serializada; X-Cache indica si vino de la caché de páginas."""
+    headers = {"ETag": etag}
+    if page_cache is not None:
+        headers["X-Cache"] = "HIT" if hit else "MISS"
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.post("/")
 @limiter.limit("100/hour") 
+@count_messages
 def receive_message(
     request: Request,
     message: MessageRequestSchema,
     api_key: str = Security(require_api_key),
     service: MessageProcessingService = Depends(get_message_processing_service),
     storage_service: MessageStorageService = Depends(get_storage_service),
-) -> MessageResponseSchema:
-    """Recibe y procesa un mensaje, luego lo almacena en la base de datos."""
+    on_conflict: Optional[ConflictPolicy] = Query(default=None, description=ON_CONFLICT_DESCRIPTION),
+) -> MessageIngestResponseSchema:
+    """Recibe y procesa un mensaje, luego lo almacena en la base de datos.
+    Con on_conflict (o INGEST_CONFLICT_POLICY) la ingesta es idempotente y created indica si el mensaje se creó."""
     processed_message = service.process_message(message)
-    storage_service.save_message(processed_message)
-    return processed_message
+    policy = on_conflict or DEFAULT_CONFLICT_POLICY
+    created = True
+    if policy is None:
+        storage_service.save_message(processed_message)
+    else:
+        created = storage_service.upsert_message(processed_message, policy)
+    return MessageIngestResponseSchema(status=processed_message.status, data=processed_message.data, created=created)
+
+@router.post("/batch")
+@limiter.limit("100/hour")
+def receive_messages_batch(
+    request: Request,
+    messages: List[MessageRequestSchema] = Body(..., min_length=1, max_length=MAX_BATCH_SIZE),
+    api_key: str = Security(require_api_key),
+    service: MessageProcessingService = Depends(get_message_processing_service),
+    storage_service: MessageStorageService = Depends(get_storage_service),
+    on_conflict: Optional[ConflictPolicy] = Query(default=None, description=ON_CONFLICT_DESCRIPTION),
+) -> MessagesBatchResponseSchema:
+    """Recibe un lote de mensajes, los procesa y almacena los aceptados en una sola transacción.
+    Devuelve el resultado de cada mensaje en el mismo orden del lote; con on_conflict (o INGEST_CONFLICT_POLICY)
+    la ingesta es idempotente y created indica si cada mensaje aceptado se creó."""
+    policy = on_conflict or DEFAULT_CONFLICT_POLICY
+    if policy is None:
+        results = storage_service.save_batch(service.process_batch(messages))
+    else:
+        results = storage_service.upsert_batch(service.process_batch(messages), policy)
+    record_batch_results(results)
+    accepted = sum(1 for result in results if result.status == "accepted")
+    return MessagesBatchResponseSchema(
+        results=results,
+        accepted=accepted,
+        rejected=len(results) - accepted
+    )
 
 @router.get("/{session_id}")
 @limiter.limit("500/hour") 
 def get_messages_by_session(
     request: Request,
+    response: Response,
     session_id: str,
     api_key: str = Security(require_api_key),
     limit: int = Query(default=100, ge=1, le=1000, description="Número máximo de mensajes a devolver"),
     offset: int = Query(default=0, ge=0, description="Número de mensajes a omitir"),
     sender: Optional[str] = Query(default=None, description="Filtrar por remitente (user/system)"),
-    retrieval_service: MessageRetrievalService = Depends(get_retrieval_service)
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco de la página siguiente (next_cursor)"),
+    retrieval_service: MessageRetrievalService = Depends(get_retrieval_service),
+    page_cache: Optional[SessionPageCache] = Depends(get_page_cache)
 ) -> MessagesListSchema:
-    """Recupera mensajes por session_id, con paginación y filtro opcional por remitente."""
+    """Recupera mensajes por session_id, con paginación (offset o cursor) y filtro opcional por remitente.
+    Los mensajes se ordenan por (timestamp, message_id); next_cursor apunta a la página siguiente.
+    La respuesta incluye un ETag derivado de la versión de la sesión: con If-None-Match vigente se
+    responde 304 sin leer ni serializar mensajes."""
     if sender and sender not in ["user", "system"]:
         raise SenderMissingException()
-    
-    messages = retrieval_service.get_messages_by_session(
+
+    # caché de páginas serializadas (con su ETag); se invalida por sesión en cada escritura del proceso
+    cache_key = (session_id, sender, cursor, offset, limit)
+    token = page_cache.token(session_id) if RETRIEVAL_FAST_PATH and page_cache is not None else None
+
+    # la versión (clave primaria de session_stats) se lee siempre: con varios workers, otro proceso pudo escribir
+    # sin invalidar esta caché, y una página o un 304 solo se sirven si corresponden a la versión vigente
+    total, version = retrieval_service.get_session_version(session_id, sender)
+    etag = session_page_etag(session_id, sender, cursor, offset, limit, total, version)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    if token is not None:
+        cached = page_cache.get(cache_key, lambda value: value[0] == etag)
+        if cached is not None:
+            return page_response(cached[1], etag, page_cache, hit=True)
+
+    if RETRIEVAL_FAST_PATH:
+        rows, next_cursor = retrieval_service.get_session_page_rows(
+            session_id=session_id,
+            limit=limit,
+            offset=offset,
+            sender=sender,
+            cursor=cursor
+        )
+        if not rows:
+            raise MessagesNotFoundException(session_id, sender)
+        body = encode_messages_page(rows, total, next_cursor)
+        if page_cache is not None:
+            page_cache.set(cache_key, session_id, (etag, body), token, size=len(body) + len(etag))
+        return page_response(body, etag, page_cache)
+
+    messages, next_cursor = retrieval_service.get_session_page(
         session_id=session_id,
         limit=limit,
         offset=offset,
-        sender=sender
+        sender=sender,
+        cursor=cursor
     )
     
     if not messages:
         raise MessagesNotFoundException(session_id, sender)
-    
+
+    response.headers["ETag"] = etag
     return MessagesListSchema(
         messages=messages,
-        total=len(messages),
-        count=len(messages)
+        total=total,
+        count=len(messages),
+        next_cursor=next_cursor
+    )
+
+@router.get("/{session_id}/export")
+@limiter.limit("100/hour")
+def export_session_messages(
+    request: Request,
+    session_id: str,
+    api_key: str = Security(require_api_key),
+    sender: Optional[str] = Query(default=None, description="Filtrar por remitente (user/system)"),
+    retrieval_service: MessageRetrievalService = Depends(get_retrieval_service),
+    export_service: MessageExportService = Depends(get_export_service)
+) -> StreamingResponse:
+    """Exporta todos los mensajes de la sesión como NDJSON (un mensaje por línea) en streaming."""
+    if sender and sender not in ["user", "system"]:
+        raise SenderMissingException()
+
+    if not retrieval_service.get_session_total(session_id, sender):
+        raise MessagesNotFoundException(session_id, sender)
+
+    return StreamingResponse(
+        export_service.iter_session_ndjson(session_id, sender),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{session_id}.ndjson"'}
     )
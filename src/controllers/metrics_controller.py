@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core.metrics import render_metrics
+
+router = APIRouter(tags=["Metrics router"])
+
+# formato de texto de exposición de Prometheus
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas de la API (histogramas por etapa, mensajes por resultado, peticiones en curso y pool de la BD)."""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,195 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+# intervalo (segundos) entre comprobaciones del origen de claves; 0 comprueba en cada petición
+DEFAULT_RELOAD_INTERVAL = 5.0
+# bytes del digest usados como índice; la comparación del digest completo es en tiempo constante
+INDEX_PREFIX_BYTES = 8
+# cliente asignado a la API key única de API_KEY (sin almacén de claves)
+DEFAULT_CLIENT_ID = "default"
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def hash_api_key(api_key: str) -> bytes:
+    """ SHA-256 de la API key: las claves en claro no se guardan en memoria ni en el origen """
+    return hashlib.sha256(api_key.encode()).digest()
+
+
+def _parse_digest(entry: dict) -> bytes:
+    if "key_sha256" in entry:
+        return bytes.fromhex(entry["key_sha256"])
+    return hash_api_key(entry["key"])
+
+
+class FileKeySource:
+    """
+    Claves en un archivo JSON:
+        {"keys": [{"client_id": "acme", "key_sha256": "<hex>"}, {"client_id": "beta", "key": "<clave>", "active": false}]}
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def fingerprint(self) -> Hashable:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> Dict[bytes, str]:
+        with open(self.path, "r") as f:
+            entries = json.load(f).get("keys", [])
+        return {_parse_digest(entry): entry["client_id"] for entry in entries if entry.get("active", True)}
+
+
+class DatabaseKeySource:
+    """ Claves en la tabla api_keys (models/api_key_model.py) """
+    def __init__(self, session_factory: sessionmaker):
+        self.session_factory = session_factory
+
+    def fingerprint(self) -> Hashable:
+        from models.api_key_model import ApiKeyModel
+        # altas, bajas y modificaciones cambian el número de filas, las activas o el último updated_at
+        with self.session_factory() as db:
+            return tuple(db.execute(select(
+                func.count(),
+                func.sum(ApiKeyModel.active),
+                func.max(ApiKeyModel.updated_at),
+            ).select_from(ApiKeyModel)).one())
+
+    def load(self) -> Dict[bytes, str]:
+        from models.api_key_model import ApiKeyModel
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(ApiKeyModel.key_sha256, ApiKeyModel.client_id).where(ApiKeyModel.active.is_(True))
+            ).all()
+        return {bytes.fromhex(key_sha256): client_id for key_sha256, client_id in rows}
+
+
+@dataclass(frozen=True)
+class ApiKeySnapshot:
+    """ Claves vigentes indexadas por el prefijo de su digest: prefijo -> ((digest, client_id), ...) """
+    index: Dict[bytes, Tuple[Tuple[bytes, str], ...]]
+    fingerprint: Hashable
+    size: int
+
+
+def build_snapshot(keys: Dict[bytes, str], fingerprint: Hashable = None) -> ApiKeySnapshot:
+    index: Dict[bytes, Tuple[Tuple[bytes, str], ...]] = {}
+    for digest, client_id in keys.items():
+        prefix = digest[:INDEX_PREFIX_BYTES]
+        index[prefix] = index.get(prefix, ()) + ((digest, client_id),)
+    return ApiKeySnapshot(index=index, fingerprint=fingerprint, size=len(keys))
+
+
+class ApiKeyStore:
+    """
+    API keys de los clientes, compartidas por el proceso.
+    - lookup() calcula el SHA-256 de la clave recibida, busca su prefijo en un dict (O(1), independiente del
+      número de claves) y compara el digest completo con hmac.compare_digest.
+    - El origen se comprueba como máximo cada reload_interval segundos y solo se recarga si cambia su huella;
+      la recarga sustituye el snapshot de forma atómica.
+    """
+    def __init__(self, source, reload_interval: Optional[float] = None):
+        self.source = source
+        if reload_interval is None:
+            reload_interval = float(os.getenv("API_KEYS_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL))
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ApiKeySnapshot] = None
+        self._last_check = 0.0
+        self.load_count = 0
+        self.reload_count = 0
+        self.check_count = 0
+
+    def lookup(self, api_key: str) -> Optional[str]:
+        """ Devuelve el client_id de la API key, o None si no es válida """
+        digest = hash_api_key(api_key)
+        client_id = None
+        for candidate, candidate_client in self.get().index.get(digest[:INDEX_PREFIX_BYTES], ()):
+            if hmac.compare_digest(candidate, digest):
+                client_id = candidate_client
+        return client_id
+
+    def get(self) -> ApiKeySnapshot:
+        """ Snapshot vigente; solo consulta el origen en la primera carga o al vencer el intervalo """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._refresh(force=True)
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            return self._refresh(force=False)
+        return snapshot
+
+    def reload(self) -> ApiKeySnapshot:
+        """ Fuerza la relectura del origen """
+        return self._refresh(force=True)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "keys": snapshot.size if snapshot else 0,
+            "loads": self.load_count,
+            "reloads": self.reload_count,
+            "checks": self.check_count,
+        }
+
+    def _refresh(self, force: bool) -> ApiKeySnapshot:
+        with self._lock:
+            current = self._snapshot
+            # otro hilo pudo haber recargado mientras se esperaba el lock
+            if not force and current is not None and time.monotonic() - self._last_check < self.reload_interval:
+                return current
+            self._last_check = time.monotonic()
+            self.check_count += 1
+            try:
+                fingerprint = self.source.fingerprint()
+                if not force and current is not None and fingerprint == current.fingerprint:
+                    return current
+                snapshot = build_snapshot(self.source.load(), fingerprint)
+            except Exception as e:
+                # si ya hay claves cargadas se siguen usando; en la primera carga se propaga el error
+                if current is None:
+                    raise
+                logger.warning("No se pudieron recargar las API keys: %s", e)
+                return current
+
+            if current is None:
+                self.load_count += 1
+            else:
+                self.reload_count += 1
+            self._snapshot = snapshot
+            return snapshot
+
+
+_stores: Dict[str, ApiKeyStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_api_key_store() -> Optional[ApiKeyStore]:
+    """
+    Almacén de claves del proceso según API_KEYS_SOURCE: ruta a un archivo JSON o "database" (tabla api_keys).
+    None si no está configurado (se usa la API key única de API_KEY).
+    """
+    source = os.getenv("API_KEYS_SOURCE", "")
+    if not source:
+        return None
+    store = _stores.get(source)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(source)
+            if store is None:
+                if source == "database":
+                    from core.database import SessionLocal
+                    key_source = DatabaseKeySource(SessionLocal)
+                else:
+                    key_source = FileKeySource(os.path.abspath(source))
+                store = _stores[source] = ApiKeyStore(key_source)
+    return store
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover (Windows)
+    fcntl = None
+
+# almacenamiento en frío de mensajes antiguos (ARCHIVE_ENABLED); las lecturas consultan también los segmentos
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+DEFAULT_ARCHIVE_DIR = os.path.join("data", "archive")
+# tamaño a partir del cual se empieza un segmento nuevo
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+# bloques descomprimidos que se conservan en memoria por proceso
+BLOCK_CACHE_SIZE = 256
+
+# fila de un mensaje archivado: mismos campos y orden que MESSAGE_COLUMNS (y los atributos de MessageModel)
+ArchivedRow = namedtuple("ArchivedRow", [
+    "message_id", "session_id", "content", "timestamp", "sender", "word_count", "character_count", "processed_at",
+])
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def encode_block(rows: Sequence[tuple]) -> bytes:
+    """ Comprime filas de MESSAGE_COLUMNS (JSON + zlib) """
+    raw = json.dumps(
+        [[m, s, c, _isoformat(t), snd, wc, cc, _isoformat(p)] for m, s, c, t, snd, wc, cc, p in rows],
+        ensure_ascii=False, separators=(",", ":")
+    ).encode()
+    return zlib.compress(raw, 6)
+
+
+def decode_block(data: bytes) -> Tuple[ArchivedRow, ...]:
+    rows = json.loads(zlib.decompress(data))
+    return tuple(
+        ArchivedRow(m, s, c, _parse(t), snd, wc, cc, _parse(p)) for m, s, c, t, snd, wc, cc, p in rows
+    )
+
+
+class SegmentStore:
+    """
+    Segmentos de solo anexado con los bloques comprimidos de los mensajes archivados.
+    - append() escribe bloques al final del segmento actual y devuelve su posición (segmento, offset, longitud,
+      crc32); sync() los lleva a disco antes de que el índice de la base de datos los referencie.
+    - Un segmento no se modifica nunca: al superar segment_max_bytes se empieza otro.
+    - read() verifica el crc32 y memoriza los bloques descomprimidos (LRU por proceso).
+    Las rutas de los segmentos son relativas al directorio del almacén, con un prefijo por base de datos
+    (p. ej. "shard0/") cuando hay varios shards.
+    """
+    def __init__(self, directory: Optional[str] = None, segment_max_bytes: Optional[int] = None):
+        self.directory = directory or os.getenv("ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
+        self.segment_max_bytes = segment_max_bytes or int(
+            os.getenv("ARCHIVE_SEGMENT_MAX_BYTES", DEFAULT_SEGMENT_MAX_BYTES)
+        )
+        self._lock = threading.Lock()
+        self._files = {}
+        self._read_block = lru_cache(maxsize=BLOCK_CACHE_SIZE)(self._read_block_uncached)
+
+    def _path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    def _next_segment(self, prefix: str, full: Optional[str] = None) -> str:
+        """ Último segmento del prefijo si tiene espacio (y no es full); si no, el siguiente número """
+        folder = self._path(prefix)
+        os.makedirs(folder, exist_ok=True)
+        numbers = sorted(int(name[8:14]) for name in os.listdir(folder)
+                         if name.startswith("segment-") and name.endswith(".seg"))
+        number = numbers[-1] if numbers else 1
+        segment = os.path.join(prefix, f"segment-{number:06d}.seg")
+        if numbers and (segment == full or os.path.getsize(self._path(segment)) >= self.segment_max_bytes):
+            number += 1
+        return os.path.join(prefix, f"segment-{number:06d}.seg")
+
+    def append(self, prefix: str, block: bytes) -> Tuple[str, int, int, int]:
+        """ Anexa un bloque comprimido; devuelve (segmento, offset, longitud, crc32) """
+        with self._lock:
+            segment, f = self._files.get(prefix, (None, None))
+            if f is None or f.tell() >= self.segment_max_bytes:
+                if f is not None:
+                    self._sync_file(f)
+                    f.close()
+                segment = self._next_segment(prefix, segment)
+                f = open(self._path(segment), "ab")
+                self._files[prefix] = (segment, f)
+            offset = f.tell()
+            f.write(block)
+            return segment, offset, len(block), zlib.crc32(block)
+
+    @staticmethod
+    def _sync_file(f) -> None:
+        f.flush()
+        os.fsync(f.fileno())
+
+    def sync(self) -> None:
+        """ Escribe y sincroniza con el disco los bloques anexados (antes del commit del índice) """
+        with self._lock:
+            for _, f in self._files.values():
+                self._sync_file(f)
+
+    def close(self) -> None:
+        with self._lock:
+            for _, f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def _read_block_uncached(self, segment: str, offset: int, length: int, crc: int) -> Tuple[ArchivedRow, ...]:
+        with open(self._path(segment), "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        if len(data) != length or zlib.crc32(data) != crc:
+            raise ValueError(f"Bloque dañado en {segment} (offset {offset})")
+        return decode_block(data)
+
+    def read(self, segment: str, offset: int, length: int, crc: int) -> Tuple[ArchivedRow, ...]:
+        """ Filas de un bloque, ordenadas por (timestamp, message_id) """
+        return self._read_block(segment, offset, length, crc)
+
+    def read_blocks(self, blocks: Sequence[tuple]) -> List[ArchivedRow]:
+        """ Filas de varios bloques (segmento, offset, longitud, crc32) """
+        rows = []
+        for block in blocks:
+            rows.extend(self.read(*block))
+        return rows
+
+    def lock(self):
+        """ Lock exclusivo entre procesos del directorio del almacén (un solo trabajo de archivado a la vez) """
+        os.makedirs(self.directory, exist_ok=True)
+        return _DirectoryLock(os.path.join(self.directory, "archive.lock"))
+
+
+class _DirectoryLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._file.close()
+                raise RuntimeError("Ya hay un trabajo de archivado en curso")
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+_archive_store: Optional[SegmentStore] = None
+_archive_store_lock = threading.Lock()
+
+
+def get_archive_store() -> Optional[SegmentStore]:
+    """ Almacén en frío del proceso, o None si ARCHIVE_ENABLED=false """
+    global _archive_store
+    if not ARCHIVE_ENABLED:
+        return None
+    if _archive_store is None:
+        with _archive_store_lock:
+            if _archive_store is None:
+                _archive_store = SegmentStore()
+    return _archive_store
@@ -1,6 +1,9 @@
 from fastapi.security.api_key import APIKeyHeader
-from fastapi import Security
+from fastapi import Request, Security
+from core.api_keys import DEFAULT_CLIENT_ID, get_api_key_store
 from core.exceptions import UnauthorizedException
+from core.metrics import stage_timer
+import hmac
 import os
 
 # Configuración de API Keys
@@ -9,13 +12,36 @@ def get_valid_api_key():
     return os.getenv("API_KEY", "api-key-default-123")
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
 
-def verify_api_key(api_key: str = Security(api_key_header)):
-    """Verifica que la API Key proporcionada sea válida."""
+def get_client_id(api_key: str):
+    """Devuelve el cliente de la API Key, o None si no es válida.
+    Con API_KEYS_SOURCE se busca en el almacén de claves; si no, se compara con API_KEY."""
+    store = get_api_key_store()
+    if store is not None:
+        return store.lookup(api_key)
+    if hmac.compare_digest(api_key.encode(), get_valid_api_key().encode()):
+        return DEFAULT_CLIENT_ID
+    return None
+
+def verify_api_key(api_key: str = Security(api_key_header), request: Request = None):
+    """Verifica que la API Key proporcionada sea válida y guarda su cliente en request.state.client_id."""
     if not api_key:
         raise UnauthorizedException(message="Falta API Key en el header 'X-API-Key'")
 
-    valid_api_key = get_valid_api_key()
-    if api_key != valid_api_key:
+    with stage_timer("auth"):
+        client_id = get_client_id(api_key)
+    if client_id is None:
         raise UnauthorizedException(message="API key inválida o no autorizada")
+    if request is not None:
+        request.state.client_id = client_id
     return api_key
+
+def verify_admin_key(admin_key: str = Security(admin_key_header)):
+    """Verifica la clave de administración (ADMIN_API_KEY) de los endpoints /admin."""
+    expected = os.getenv("ADMIN_API_KEY")
+    if not admin_key:
+        raise UnauthorizedException(message="Falta la clave de administración en el header 'X-Admin-Key'")
+    if not expected or not hmac.compare_digest(admin_key.encode(), expected.encode()):
+        raise UnauthorizedException(message="Clave de administración inválida")
+    return admin_key
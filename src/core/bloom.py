@@ -0,0 +1,173 @@
+import math
+import os
+import threading
+from hashlib import blake2b
+from typing import Iterable, List, Optional, Sequence
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import sessionmaker
+
+from core.metrics import ID_FILTER_CHECKS, ID_FILTER_ROUND_TRIPS_SAVED, METRICS_ENABLED
+
+# filtro Bloom de los message_id guardados: evita consultar la base de datos para los IDs nuevos.
+# Desactivado por defecto: construirlo lee todos los message_id en el arranque de cada worker
+ID_FILTER_ENABLED = os.getenv("ID_FILTER_ENABLED", "false").lower() == "true"
+# tasa de falsos positivos objetivo, IDs previstos y memoria máxima (bytes) del filtro
+DEFAULT_FP_RATE = 0.01
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+# IDs leídos por lote al reconstruir el filtro
+REBUILD_CHUNK_SIZE = 10_000
+_MASK64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    """
+    Filtro Bloom sobre un bytearray: "x in filtro" es False solo si x nunca se añadió (sin falsos negativos),
+    y True con probabilidad fp_rate para un x que no se añadió.
+    - El tamaño (bits) y el número de hashes se calculan para capacity elementos y fp_rate, con un máximo de
+      max_bytes: si no caben, la tasa real de falsos positivos es mayor (estimated_fp_rate()).
+    - Las k posiciones se derivan de un solo blake2b de 128 bits (doble hashing de Kirsch-Mitzenmacher).
+    - add() toma un lock (cada bit es una lectura-modificación-escritura de un byte); las consultas no.
+    No admite borrados.
+    """
+    def __init__(self, capacity: int, fp_rate: float = DEFAULT_FP_RATE, max_bytes: Optional[int] = None):
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate debe estar entre 0 y 1")
+        self.capacity = max(capacity, 1)
+        self.fp_rate = fp_rate
+        bits = math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)
+        if max_bytes is not None:
+            bits = min(bits, max_bytes * 8)
+        self.size = max(bits // 8, 1) * 8
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray(self.size // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, item: str) -> List[int]:
+        digest = int.from_bytes(blake2b(item.encode(), digest_size=16).digest(), "little")
+        h1, h2 = digest & _MASK64, (digest >> 64) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        positions = self._positions(item)
+        bits = self._bits
+        with self._lock:
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def add_many(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_fp_rate(self) -> float:
+        """ Tasa de falsos positivos esperada con los elementos añadidos: (1 - e^(-k·n/m))^k """
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class MessageIdFilter(BloomFilter):
+    """
+    Filtro Bloom de los message_id de la base de datos, con contadores de su efecto:
+    - definitely_new: IDs que el filtro descarta sin consultar la base de datos.
+    - false_positives / duplicates: IDs que el filtro no descarta y que la consulta confirma nuevos / existentes.
+    - round_trips_saved: consultas de duplicados no ejecutadas (lotes) e INSERT fallidos evitados (duplicados
+      de mensajes individuales rechazados sin INSERT ni rollback).
+    Es una caché del proceso: un ID guardado por otro proceso no está en el filtro, y la restricción UNIQUE
+    de la base de datos sigue siendo la que garantiza que no haya duplicados.
+    """
+    def __init__(self, capacity: int, fp_rate: float = DEFAULT_FP_RATE, max_bytes: Optional[int] = None):
+        super().__init__(capacity, fp_rate, max_bytes)
+        self.definitely_new = 0
+        self.false_positives = 0
+        self.duplicates = 0
+        self.round_trips_saved = 0
+
+    def candidates(self, message_ids: Sequence[str]) -> List[str]:
+        """ IDs que pueden existir (el resto son nuevos con seguridad) """
+        possible = [message_id for message_id in message_ids if message_id in self]
+        new = len(message_ids) - len(possible)
+        if new:
+            self.definitely_new += new
+            if METRICS_ENABLED:
+                ID_FILTER_CHECKS.inc("definitely_new", amount=new)
+        return possible
+
+    def record_lookup(self, checked: int, found: int, saved: int = 0) -> None:
+        """ Registra el resultado de la consulta de los candidatos y los viajes a la base de datos evitados """
+        self.false_positives += checked - found
+        self.duplicates += found
+        self.round_trips_saved += saved
+        if METRICS_ENABLED:
+            if checked - found:
+                ID_FILTER_CHECKS.inc("false_positive", amount=checked - found)
+            if found:
+                ID_FILTER_CHECKS.inc("duplicate", amount=found)
+            if saved:
+                ID_FILTER_ROUND_TRIPS_SAVED.inc(amount=saved)
+
+    def stats(self) -> dict:
+        return {
+            "items": self.count,
+            "capacity": self.capacity,
+            "bytes": self.nbytes,
+            "hashes": self.hashes,
+            "estimated_fp_rate": self.estimated_fp_rate(),
+            "definitely_new": self.definitely_new,
+            "false_positives": self.false_positives,
+            "duplicates": self.duplicates,
+            "round_trips_saved": self.round_trips_saved,
+        }
+
+
+def _stored_ids_query():
+    # import diferido: los modelos importan core.database
+    from models.archive_model import ArchivedMessageIdModel
+    from models.message_model import MessageModel
+    return union_all(select(MessageModel.message_id), select(ArchivedMessageIdModel.message_id))
+
+
+def build_message_id_filter(
+    session_factory: sessionmaker,
+    capacity: Optional[int] = None,
+    fp_rate: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> MessageIdFilter:
+    """ Construye el filtro con los message_id de messages y del almacenamiento en frío.
+        La capacidad es la mayor entre capacity (ID_FILTER_CAPACITY) y el doble de los IDs guardados. """
+    capacity = capacity or int(os.getenv("ID_FILTER_CAPACITY", DEFAULT_CAPACITY))
+    fp_rate = fp_rate or float(os.getenv("ID_FILTER_FP_RATE", DEFAULT_FP_RATE))
+    max_bytes = max_bytes or int(os.getenv("ID_FILTER_MAX_BYTES", DEFAULT_MAX_BYTES))
+    with session_factory() as db:
+        stored = db.execute(select(func.count()).select_from(_stored_ids_query().subquery())).scalar_one()
+        id_filter = MessageIdFilter(max(capacity, 2 * stored), fp_rate, max_bytes)
+        result = db.execute(_stored_ids_query().execution_options(yield_per=REBUILD_CHUNK_SIZE))
+        for chunk in result.scalars().partitions():
+            id_filter.add_many(chunk)
+    return id_filter
+
+
+# filtro del proceso; se construye al arrancar la app (init_id_filter)
+_id_filter: Optional[MessageIdFilter] = None
+
+
+def init_id_filter(session_factory: sessionmaker) -> Optional[MessageIdFilter]:
+    """ (Re)construye el filtro del proceso desde la base de datos; None si ID_FILTER_ENABLED=false """
+    global _id_filter
+    _id_filter = build_message_id_filter(session_factory) if ID_FILTER_ENABLED else None
+    return _id_filter
+
+
+def get_id_filter() -> Optional[MessageIdFilter]:
+    """ Obtiene el filtro del proceso, o None si está desactivado o la app no lo ha construido """
+    return _id_filter
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional, Set, Tuple
+
+# presupuesto de memoria (bytes) y vigencia (segundos) por defecto de la caché de páginas
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_TTL = 30.0
+# coste fijo estimado por entrada (clave, tupla, nodos del OrderedDict e índice por sesión)
+ENTRY_OVERHEAD = 256
+# máximo de sesiones con generación registrada antes de reiniciar el registro
+MAX_TRACKED_GENERATIONS = 100_000
+
+
+@dataclass
+class _CacheEntry:
+    value: object
+    session_id: str
+    expires_at: float
+    size: int
+
+
+class SessionPageCache:
+    """
+    Caché LRU/TTL en memoria de respuestas serializadas, agrupadas por sesión.
+    - El tamaño total (bytes de las respuestas + coste fijo por entrada) no supera max_bytes.
+    - invalidate_session() elimina todas las páginas de una sesión tras una escritura.
+    - token()/set() evitan guardar una página leída antes de una invalidación concurrente:
+      set() descarta el valor si la sesión se invalidó después de obtener el token.
+    - La caché y sus invalidaciones son del proceso: con varios workers, una escritura atendida por otro worker
+      no invalida estas páginas. get(key, is_fresh) descarta (stale) la entrada que ya no corresponde a la
+      versión vigente de la sesión.
+    """
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("PAGE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.ttl = ttl if ttl is not None else float(os.getenv("PAGE_CACHE_TTL", DEFAULT_TTL))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._session_keys: Dict[str, Set[Hashable]] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    def get(self, key: Hashable, is_fresh: Optional[Callable[[object], bool]] = None) -> Optional[object]:
+        """ Devuelve el valor vigente de la clave, o None si no está, expiró o is_fresh(valor) es False """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if is_fresh is not None and not is_fresh(entry.value):
+                self._remove(key)
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def token(self, session_id: str) -> Tuple[int, int]:
+        """ Versión actual de la sesión; se obtiene antes de leer la página de la base de datos """
+        with self._lock:
+            return self._epoch, self._generations.get(session_id, 0)
+
+    def set(
+        self,
+        key: Hashable,
+        session_id: str,
+        value: object,
+        token: Optional[Tuple[int, int]] = None,
+        size: Optional[int] = None,
+    ) -> bool:
+        """ Guarda el valor si la sesión no se invalidó desde token; devuelve si quedó en caché.
+            size es el tamaño en bytes del valor (por defecto len(value)). """
+        size = (len(value) if size is None else size) + ENTRY_OVERHEAD
+        if size > self.max_bytes or self.ttl <= 0:
+            return False
+        with self._lock:
+            if token is not None and token != (self._epoch, self._generations.get(session_id, 0)):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(value, session_id, time.monotonic() + self.ttl, size)
+            self._session_keys.setdefault(session_id, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate_session(self, session_id: str) -> int:
+        """ Elimina las páginas de la sesión; devuelve cuántas había """
+        with self._lock:
+            if len(self._generations) >= MAX_TRACKED_GENERATIONS:
+                # reiniciar el registro invalida también los tokens emitidos para otras sesiones
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[session_id] = self._generations.get(session_id, 0) + 1
+            keys = self._session_keys.pop(session_id, ())
+            for key in keys:
+                entry = self._entries.pop(key)
+                self.size -= entry.size
+            self.invalidations += 1
+            return len(keys)
+
+    def clear(self) -> None:
+        """ Vacía la caché sin reiniciar los contadores """
+        with self._lock:
+            self._entries.clear()
+            self._session_keys.clear()
+            self._generations.clear()
+            self._epoch += 1
+            self.size = 0
+
+    def stats(self) -> dict:
+        """ Contadores de aciertos, fallos, desalojos e invalidaciones """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        keys = self._session_keys.get(entry.session_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._session_keys[entry.session_id]
+
+
+# caché del proceso (PAGE_CACHE_ENABLED); None si está desactivada
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+_page_cache: Optional[SessionPageCache] = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[SessionPageCache]:
+    """ Obtiene la caché de páginas del proceso, o None si PAGE_CACHE_ENABLED=false """
+    global _page_cache
+    if not PAGE_CACHE_ENABLED:
+        return None
+    if _page_cache is None:
+        with _page_cache_lock:
+            if _page_cache is None:
+                _page_cache = SessionPageCache()
+    return _page_cache
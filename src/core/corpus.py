@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from core.corpus_artifact import CORPUS_ARTIFACT_ENABLED, CorpusArtifact, artifact_path_for
+
+logger = logging.getLogger("uvicorn.error")
+
+# intervalo (segundos) entre comprobaciones del archivo; 0 comprueba en cada acceso
+DEFAULT_RELOAD_INTERVAL = 5.0
+
+
+def load_corpus_file(path: str) -> dict:
+    """ Lee y parsea el archivo JSON del corpus de palabras prohibidas """
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def normalize_words(corpus: dict) -> Tuple[str, ...]:
+    """ Normaliza las palabras del corpus a minúsculas, sin duplicados y en el orden original """
+    return tuple(dict.fromkeys(w.lower() for w in corpus.get("banned_words", [])))
+
+
+@dataclass(frozen=True)
+class CorpusSnapshot:
+    """
+    Versión inmutable del corpus cargado en memoria.
+    Las peticiones en curso conservan la referencia a su snapshot aunque se recargue el archivo.
+    Si se cargó del artefacto precompilado, words se lee de su mmap y artifact da acceso a su índice.
+    """
+    words: Sequence[str]
+    digest: str
+    mtime_ns: int
+    size: int
+    artifact: Optional[CorpusArtifact] = field(default=None, compare=False)
+    # (mtime_ns, tamaño) del artefacto al cargar, o None si no existía
+    artifact_stat: Optional[Tuple[int, int]] = None
+    _compiled: Dict[str, object] = field(default_factory=dict, compare=False, repr=False)
+
+    def compiled(self, name: str, factory: Callable[[Sequence[str]], object]) -> object:
+        """ Devuelve (y memoriza) una estructura derivada de las palabras, p. ej. un índice de búsqueda """
+        value = self._compiled.get(name)
+        if value is None:
+            value = self._compiled.setdefault(name, factory(self.words))
+        return value
+
+
+class CorpusStore:
+    """
+    Corpus de palabras prohibidas compartido por el proceso.
+    - Se carga una sola vez y se recarga únicamente si cambia el mtime/tamaño y el hash del archivo.
+    - La recarga sustituye el snapshot de forma atómica (una sola asignación de referencia).
+    - Expone contadores de cargas, recargas y comprobaciones del archivo.
+    - Si existe el artefacto precompilado del JSON (artifact_path, por defecto <corpus>.bin) y su hash de
+      origen coincide con el del JSON, las palabras y el índice se leen de su mmap en lugar de parsear el JSON.
+      Un artefacto ausente, inválido o de otra versión del JSON se ignora y se usa el JSON; artifact_path=""
+      no lo busca.
+    """
+    def __init__(self, path: str, reload_interval: Optional[float] = None, artifact_path: Optional[str] = None):
+        self.path = path
+        if artifact_path is None and CORPUS_ARTIFACT_ENABLED:
+            artifact_path = artifact_path_for(path)
+        self.artifact_path = artifact_path
+        if reload_interval is None:
+            reload_interval = float(os.getenv('CORPUS_RELOAD_INTERVAL', DEFAULT_RELOAD_INTERVAL))
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CorpusSnapshot] = None
+        self._last_check = 0.0
+        self.load_count = 0
+        self.reload_count = 0
+        self.check_count = 0
+
+    def get(self) -> CorpusSnapshot:
+        """ Devuelve el snapshot vigente; solo toca disco en la primera carga o al vencer el intervalo """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._refresh(force=True)
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            return self._refresh(force=False)
+        return snapshot
+
+    def reload(self) -> CorpusSnapshot:
+        """ Fuerza la relectura del archivo (hook explícito de recarga) """
+        return self._refresh(force=True)
+
+    def stats(self) -> dict:
+        """ Contadores para verificar que el camino caliente no accede a disco """
+        snapshot = self._snapshot
+        return {
+            "path": self.path,
+            "loads": self.load_count,
+            "reloads": self.reload_count,
+            "checks": self.check_count,
+            "words": len(snapshot.words) if snapshot else 0,
+            "digest": snapshot.digest if snapshot else None,
+            "source": ("artifact" if snapshot.artifact is not None else "json") if snapshot else None,
+        }
+
+    def _artifact_stat(self) -> Optional[Tuple[int, int]]:
+        if not self.artifact_path:
+            return None
+        try:
+            stat = os.stat(self.artifact_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _open_artifact(self, digest: str) -> Optional[CorpusArtifact]:
+        """ Mapea el artefacto si es válido y corresponde al JSON (digest); si no, None (se usa el JSON) """
+        try:
+            artifact = CorpusArtifact(self.artifact_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Se ignora el artefacto del corpus '%s': %s", self.artifact_path, e)
+            return None
+        if artifact.source_digest != digest:
+            logger.warning("El artefacto del corpus '%s' no corresponde a '%s' (hay que recompilarlo)",
+                           self.artifact_path, self.path)
+            artifact.close()
+            return None
+        return artifact
+
+    def _refresh(self, force: bool) -> CorpusSnapshot:
+        with self._lock:
+            current = self._snapshot
+            # otro hilo pudo haber recargado mientras se esperaba el lock
+            if not force and current is not None and time.monotonic() - self._last_check < self.reload_interval:
+                return current
+            self._last_check = time.monotonic()
+            self.check_count += 1
+            try:
+                stat = os.stat(self.path)
+                artifact_stat = self._artifact_stat()
+                if (not force and current is not None
+                        and (stat.st_mtime_ns, stat.st_size, artifact_stat)
+                        == (current.mtime_ns, current.size, current.artifact_stat)):
+                    return current
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+                digest = hashlib.sha256(raw).hexdigest()
+                same_content = current is not None and digest == current.digest
+                artifact = None
+                if artifact_stat is not None and not (same_content and current.artifact is not None):
+                    artifact = self._open_artifact(digest)
+                if same_content and artifact is None:
+                    # mismo contenido (p. ej. touch): se conservan las palabras y los índices, con el mtime/tamaño
+                    # nuevos para que las siguientes comprobaciones no vuelvan a leer y calcular el hash del archivo
+                    self._snapshot = replace(current, mtime_ns=stat.st_mtime_ns, size=stat.st_size,
+                                             artifact_stat=artifact_stat, _compiled=current._compiled)
+                    return self._snapshot
+                snapshot = CorpusSnapshot(
+                    words=artifact.words if artifact is not None else normalize_words(json.loads(raw)),
+                    digest=digest,
+                    mtime_ns=stat.st_mtime_ns,
+                    size=stat.st_size,
+                    artifact=artifact,
+                    artifact_stat=artifact_stat,
+                )
+            except (OSError, ValueError):
+                # si ya hay un corpus válido se sigue sirviendo; en la primera carga se propaga el error
+                if current is None:
+                    raise
+                return current
+
+            if current is None:
+                self.load_count += 1
+            else:
+                self.reload_count += 1
+            self._snapshot = snapshot
+            return snapshot
+
+
+_stores: Dict[str, CorpusStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_corpus_store(path: str) -> CorpusStore:
+    """ Obtiene el CorpusStore del proceso para la ruta indicada (uno por archivo) """
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = CorpusStore(key)
+    return store
+
+
+def reload_corpus(path: Optional[str] = None) -> None:
+    """ Fuerza la recarga de un corpus concreto o de todos los cargados en el proceso """
+    stores = [get_corpus_store(path)] if path else list(_stores.values())
+    for store in stores:
+        store.reload()
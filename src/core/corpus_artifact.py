@@ -0,0 +1,183 @@
+"""
+Artefacto binario precompilado del corpus de palabras prohibidas: las palabras normalizadas y el BK-tree del
+matcher en tablas planas, listas para usarse con mmap de solo lectura. Todos los workers que mapean el mismo
+archivo comparten sus páginas (caché de páginas del sistema) en lugar de parsear el JSON y construir el índice
+cada uno. Se genera desde src/ como paso de build (o tras editar el corpus):
+
+    python -m core.corpus_artifact
+    python -m core.corpus_artifact --corpus data/corpus_filter.json --output data/corpus_filter.bin
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Sequence
+from typing import List, Optional, Tuple
+
+# el corpus usa el artefacto <corpus sin extensión>.bin si existe y corresponde al JSON (CORPUS_ARTIFACT_ENABLED)
+CORPUS_ARTIFACT_ENABLED = os.getenv("CORPUS_ARTIFACT_ENABLED", "true").lower() == "true"
+ARTIFACT_MAGIC = b"BWCORPUS"
+# versión del formato; un artefacto de otra versión se ignora (hay que volver a compilarlo)
+ARTIFACT_VERSION = 1
+# cabecera: magic, versión, palabras, nodos, aristas, longitud máxima, sha256 del JSON de origen
+_HEADER = struct.Struct("<8sIIIII32s")
+_U32 = 4
+
+
+def artifact_path_for(corpus_path: str) -> str:
+    """ Ruta del artefacto de un corpus JSON: mismo nombre con extensión .bin """
+    return os.path.splitext(corpus_path)[0] + ".bin"
+
+
+class ArtifactWords(Sequence):
+    """ Palabras del artefacto, decodificadas bajo demanda desde el mapeo (sin copiarlas todas al proceso) """
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("índice de palabra fuera de rango")
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+
+class CorpusArtifact:
+    """
+    Artefacto del corpus mapeado en memoria (mmap de solo lectura).
+    - words: palabras normalizadas, en el orden del corpus.
+    - nodes: BK-tree en anchura, 3 enteros por nodo (índice de la palabra, primera arista, número de aristas);
+      el nodo 0 es la raíz.
+    - edge_distances / edge_nodes: distancia indel y nodo hijo de cada arista; las aristas de un nodo son
+      contiguas y están ordenadas por distancia (se recorren con bisect).
+    Las tablas son vistas sobre el mapeo: leerlas no copia el archivo al proceso. Lanza ValueError si el archivo
+    no es un artefacto válido de ARTIFACT_VERSION.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < _HEADER.size:
+                raise ValueError(f"Artefacto de corpus truncado: {path}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        try:
+            self._load()
+        except ValueError:
+            self.close()
+            raise
+
+    def _load(self) -> None:
+        magic, version, word_count, node_count, edge_count, max_length, digest = _HEADER.unpack_from(self._mmap)
+        if magic != ARTIFACT_MAGIC:
+            raise ValueError(f"{self.path} no es un artefacto de corpus")
+        if version != ARTIFACT_VERSION:
+            raise ValueError(f"Versión de artefacto {version} no soportada (se esperaba {ARTIFACT_VERSION})")
+        if sys.byteorder != "little":
+            raise ValueError("El artefacto de corpus solo se puede mapear en sistemas little-endian")
+        # se valida todo antes de crear las vistas: con vistas abiertas el mmap no se puede cerrar
+        bounds = [_HEADER.size]
+        for count in (word_count + 1, 3 * node_count, edge_count, edge_count):
+            bounds.append(bounds[-1] + count * _U32)
+        if (bounds[-1] > self.size
+                or bounds[-1] + struct.unpack_from("<I", self._mmap, bounds[1] - _U32)[0] != self.size):
+            raise ValueError(f"Artefacto de corpus truncado: {self.path}")
+        view = memoryview(self._mmap)
+        offsets, self.nodes, self.edge_distances, self.edge_nodes = (
+            view[start:end].cast("I") for start, end in zip(bounds, bounds[1:])
+        )
+        self.words = ArtifactWords(offsets, view[bounds[-1]:])
+        self.max_length = max_length
+        self.source_digest = digest.hex()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.nodes) // 3
+
+    def close(self) -> None:
+        """ Libera el mapeo (solo cuando ningún matcher lo usa: las vistas abiertas lo impiden) """
+        for name in ("nodes", "edge_distances", "edge_nodes"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        words = self.__dict__.pop("words", None)
+        if words is not None:
+            words.offsets.release()
+            words.blob.release()
+        self._mmap.close()
+
+
+def write_artifact(
+    path: str,
+    words: Sequence,
+    nodes: List[Tuple[int, int, int]],
+    edges: List[Tuple[int, int]],
+    max_length: int,
+    source_digest: str,
+) -> int:
+    """ Escribe el artefacto en un archivo temporal y lo renombra (atómico): los workers que mapean la versión
+        anterior la siguen leyendo hasta recargar. Devuelve los bytes escritos. """
+    encoded = [word.encode("utf-8") for word in words]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    header = _HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_VERSION, len(encoded), len(nodes), len(edges), max_length,
+                          bytes.fromhex(source_digest))
+    body = b"".join([
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        struct.pack(f"<{3 * len(nodes)}I", *(value for node in nodes for value in node)),
+        struct.pack(f"<{len(edges)}I", *(distance for distance, _ in edges)),
+        struct.pack(f"<{len(edges)}I", *(node for _, node in edges)),
+        b"".join(encoded),
+    ])
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return len(header) + len(body)
+
+
+def compile_corpus(corpus_path: str, artifact_path: Optional[str] = None) -> dict:
+    """ Compila el corpus JSON en su artefacto; devuelve la ruta, palabras, nodos del índice y bytes escritos """
+    # imports diferidos: core.corpus y el matcher (services) importan este módulo
+    from core.corpus import normalize_words
+    from services.message_service import BKTreeMatcher
+    artifact_path = artifact_path or artifact_path_for(corpus_path)
+    with open(corpus_path, "rb") as f:
+        raw = f.read()
+    words = normalize_words(json.loads(raw))
+    nodes, edges = BKTreeMatcher(words, threshold=100, cache_size=0).flatten()
+    size = write_artifact(artifact_path, words, nodes, edges, max(map(len, words), default=0),
+                          hashlib.sha256(raw).hexdigest())
+    return {"path": artifact_path, "words": len(words), "nodes": len(nodes), "bytes": size}
+
+
+def main(argv: Optional[Sequence] = None) -> int:
+    from dotenv import load_dotenv
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compila el corpus de palabras prohibidas en un artefacto binario")
+    parser.add_argument("--corpus", default=os.getenv("CORPUS_FILE_PATH", os.path.join("data", "corpus_filter.json")),
+                        help="Corpus JSON de origen (CORPUS_FILE_PATH)")
+    parser.add_argument("--output", help="Ruta del artefacto (por defecto, la del corpus con extensión .bin)")
+    args = parser.parse_args(argv)
+
+    stats = compile_corpus(args.corpus, args.output)
+    print(f"{stats['path']}: {stats['words']} palabras, {stats['nodes']} nodos del índice ({stats['bytes']} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,218 @@
-from sqlalchemy import create_engine
+import hashlib
+import os
+from typing import Dict, List, Optional
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# configuración de la base de datos (DATABASE_URL), SQLite por defecto
+DEFAULT_DATABASE_URL = "sqlite:///./data/messages.db"
+
+# perfiles de PRAGMA aplicados a cada conexión SQLite nueva (SQLITE_PRAGMA_PROFILE)
+SQLITE_PRAGMA_PROFILES = {
+    # valores por defecto de SQLite: journal rollback y fsync completo en cada commit
+    "default": {},
+    # WAL: los lectores no bloquean al escritor; synchronous=NORMAL solo sincroniza en los checkpoints
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,      # 64 MiB (valor negativo = KiB)
+        "mmap_size": 268435456,    # 256 MiB
+        "temp_store": "MEMORY",
+    },
+    # WAL con fsync en cada commit: más lento, sin pérdida de transacciones ante un corte de energía
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+}
+DEFAULT_PRAGMA_PROFILE = "performance"
+
+def get_database_url() -> str:
+    """Obtiene la URL de la base de datos desde las variables de entorno."""
+    return os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+def get_pragma_profile() -> str:
+    """Obtiene el perfil de PRAGMA de SQLite desde las variables de entorno."""
+    profile = os.getenv("SQLITE_PRAGMA_PROFILE", DEFAULT_PRAGMA_PROFILE)
+    if profile not in SQLITE_PRAGMA_PROFILES:
+        raise ValueError(f"Perfil de PRAGMA desconocido: '{profile}'")
+    return profile
+
+def _is_memory_database(url: URL) -> bool:
+    return url.database in (None, "", ":memory:") or url.database.startswith("file::memory:")
+
+def _engine_options(url: URL) -> dict:
+    """Argumentos del motor según el backend y las variables DB_POOL_*."""
+    options = {}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if _is_memory_database(url):
+            # una única conexión compartida: cada conexión nueva sería otra base en memoria
+            options["poolclass"] = StaticPool
+            return options
+        directory = os.path.dirname(url.database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    options["pool_size"] = int(os.getenv("DB_POOL_SIZE", 5))
+    options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    options["pool_timeout"] = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    options["pool_recycle"] = int(os.getenv("DB_POOL_RECYCLE", -1))
+    options["pool_pre_ping"] = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    return options
+
+def apply_sqlite_pragmas(engine: Engine, profile: str) -> None:
+    """Registra un listener que aplica el perfil de PRAGMA al abrir cada conexión."""
+    pragmas = SQLITE_PRAGMA_PROFILES[profile]
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def create_db_engine(url: Optional[str] = None, profile: Optional[str] = None) -> Engine:
+    """Crea el motor de base de datos a partir de DATABASE_URL, DB_POOL_* y SQLITE_PRAGMA_PROFILE."""
+    url = make_url(url or get_database_url())
+    engine = create_engine(url, **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(engine, profile or get_pragma_profile())
+    return engine
+
+def create_async_db_engine(url: Optional[str] = None, profile: Optional[str] = None) -> AsyncEngine:
+    """Crea el motor asíncrono; las URL sqlite:// usan el driver aiosqlite."""
+    url = make_url(url or get_database_url())
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    engine = create_async_engine(url, **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(engine.sync_engine, profile or get_pragma_profile())
+    return engine
 
-# configuración de la base de datos SQLite
-SQLALCHEMY_DATABASE_URL = "sqlite:///./data/messages.db"
 # motor de la base de datos
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+SQLALCHEMY_DATABASE_URL = get_database_url()
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 # sesión de la base de datos
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # clase base para los modelos
 Base = declarative_base()
 
+def _add_missing_columns(bind: Engine, table) -> None:
+    """Añade a una tabla existente las columnas nuevas del modelo (deben ser nulables o tener server_default)."""
+    existing = {column["name"] for column in inspect(bind).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+        if column.server_default is not None:
+            ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+        with bind.begin() as conn:
+            conn.execute(text(ddl))
+
+def init_db(bind: Optional[Engine] = None) -> None:
+    """Crea las tablas, columnas e índices que falten (create_all no modifica tablas existentes)."""
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    for table in Base.metadata.sorted_tables:
+        _add_missing_columns(bind, table)
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
 def get_db():
     """Obtiene una sesión de base de datos."""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_session_factory() -> sessionmaker:
+    """Obtiene la fábrica de sesiones, para servicios que abren su propia sesión (p. ej. streaming)."""
+    return SessionLocal
+
+# shards de mensajes (DATABASE_SHARDS > 1): los mensajes se reparten por session_id entre varios archivos SQLite
+DATABASE_SHARDS = int(os.getenv("DATABASE_SHARDS", 1))
+
+def shard_urls(count: int, url: Optional[str] = None) -> List[str]:
+    """URLs de los shards: DATABASE_SHARD_URL con {shard}, o DATABASE_URL con el sufijo _shard{n} en el archivo.
+    Con una base en memoria cada shard es otra base en memoria."""
+    template = os.getenv("DATABASE_SHARD_URL")
+    if template:
+        return [template.format(shard=shard) for shard in range(count)]
+    base = make_url(url or get_database_url())
+    if _is_memory_database(base):
+        return [base.render_as_string(hide_password=False)] * count
+    root, extension = os.path.splitext(base.database)
+    return [base.set(database=f"{root}_shard{shard}{extension}").render_as_string(hide_password=False)
+            for shard in range(count)]
+
+def shard_index(key: str, count: int) -> int:
+    """Shard de una clave; hash estable entre procesos y reinicios (hash() de Python no lo es)."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big") % count
+
+class ShardSet:
+    """
+    Motores de los shards de mensajes, cada uno con su archivo SQLite, su pool y su lock de escritura.
+    - Los mensajes y session_stats de una sesión viven en el shard de shard_index(session_id).
+    - message_registry reparte los message_id por shard_index(message_id) y garantiza que sean únicos
+      entre todos los shards.
+    """
+    def __init__(self, urls: List[str], profile: Optional[str] = None):
+        self.urls = urls
+        self.engines = [create_db_engine(url, profile) for url in urls]
+        self.session_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=shard_engine) for shard_engine in self.engines
+        ]
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, key: str) -> int:
+        return shard_index(key, len(self.engines))
+
+    def session_factory_for(self, session_id: str) -> sessionmaker:
+        """Fábrica de sesiones del shard que guarda la sesión de mensajes."""
+        return self.session_factories[self.shard_for(session_id)]
+
+    def named_engines(self) -> Dict[str, Engine]:
+        return {f"shard{shard}": shard_engine for shard, shard_engine in enumerate(self.engines)}
+
+    def init(self) -> None:
+        """Crea las tablas, columnas e índices que falten en cada shard."""
+        for shard_engine in self.engines:
+            init_db(shard_engine)
+
+shards: Optional[ShardSet] = ShardSet(shard_urls(DATABASE_SHARDS)) if DATABASE_SHARDS > 1 else None
+
+def get_shards() -> Optional[ShardSet]:
+    """Obtiene los shards de mensajes, o None si DATABASE_SHARDS <= 1 (un único archivo)."""
+    return shards
+
+# modo asíncrono (DATABASE_ASYNC=true): endpoints async def con AsyncSession sobre aiosqlite
+ASYNC_DB_ENABLED = os.getenv("DATABASE_ASYNC", "false").lower() == "true"
+if ASYNC_DB_ENABLED and shards is not None:
+    raise ValueError("DATABASE_SHARDS solo está disponible en modo síncrono (DATABASE_ASYNC=false)")
+# el motor asíncrono solo se crea en modo asíncrono (aiosqlite es necesario únicamente en ese caso)
+async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL) if ASYNC_DB_ENABLED else None
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if ASYNC_DB_ENABLED else None
+)
+
+async def get_async_db():
+    """Obtiene una sesión asíncrona de base de datos."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_async_session_factory() -> async_sessionmaker:
+    """Obtiene la fábrica de sesiones asíncronas."""
+    return AsyncSessionLocal
@@ -63,6 +63,21 @@ class DatabaseException(HTTPException):
             }
         )
 
+# Excepción para cursor de paginación inválido
+class InvalidCursorException(HTTPException):
+    def __init__(self, cursor: str):
+        super().__init__(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail={
+                "status": "error",
+                "error": {
+                    "code": "INVALID_CURSOR",
+                    "message": "El cursor de paginación no es válido",
+                    "details": f"Usa el valor 'next_cursor' de la respuesta anterior (recibido: '{cursor}')."
+                }
+            }
+        )
+
 class MessagesNotFoundException(HTTPException):
     def __init__(self, session_id: str, sender: Optional[str] = None):
         message = f"No se encontraron mensajes para la sesión '{session_id}'"
@@ -97,6 +112,21 @@ class UnauthorizedException(HTTPException):
             headers={"WWW-Authenticate": "Bearer"}
         )
 
+# Excepción por sesión de perfilado ya en curso
+class ProfilerBusyException(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=409,
+            detail={
+                "status": "error",
+                "error": {
+                    "code": "PROFILER_BUSY",
+                    "message": "Ya hay una sesión de perfilado en curso",
+                    "details": "Espera a que termine la sesión actual antes de iniciar otra."
+                }
+            }
+        )
+
 # Handler personalizado para Rate Limiting de slowapi
 async def custom_rate_limit_exceeded_handler(request: Request, exc):
     # Extraer información del error de slowapi
@@ -0,0 +1,611 @@
+import asyncio
+import functools
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from slowapi.errors import RateLimitExceeded
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("uvicorn.error")
+
+# límites (segundos) de los buckets de los histogramas de latencia
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# etapas de una petición con histograma propio en api_request_stage_seconds
+STAGES = ("validation", "auth", "banned_word_scan", "db_commit", "db_query", "serialization")
+# intervalo (segundos) entre volcados del snapshot del proceso en METRICS_DIR
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class _Metric:
+    """ Métrica con etiquetas; los valores viven en los shards por hilo del registro """
+    type = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _new_cell(self) -> list:
+        return [0.0]
+
+    def _cell(self, labels: tuple) -> list:
+        # cada hilo escribe solo en su shard: no hace falta lock para registrar un valor
+        shard = self.registry._shard()
+        cell = shard.get((self.name, labels))
+        if cell is None:
+            cell = shard[(self.name, labels)] = self._new_cell()
+        return cell
+
+    def describe(self) -> dict:
+        return {"name": self.name, "type": self.type, "help": self.help, "labelnames": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._cell(labels)[0] += amount
+
+
+class Gauge(_Metric):
+    """ Gauge sumado entre hilos y procesos vivos; set_function() lo calcula al exportar """
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], Dict[tuple, float]]] = None
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._cell(labels)[0] += amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self._cell(labels)[0] -= amount
+
+    def set_function(self, function: Callable[[], Dict[tuple, float]]) -> None:
+        """ function() devuelve {etiquetas: valor} y se evalúa en cada exportación """
+        self._function = function
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def _new_cell(self) -> list:
+        # un contador por bucket (sin acumular), el +Inf, la suma y el total de observaciones
+        return [0] * (len(self.buckets) + 1) + [0.0, 0]
+
+    def observe(self, value: float, *labels: str) -> None:
+        cell = self._cell(labels)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def describe(self) -> dict:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso con exportación en el formato de texto de Prometheus.
+    - Cada hilo acumula sus valores en un shard propio (threading.local): registrar es una suma sin locks.
+    - snapshot() suma los shards; con varios workers cada proceso vuelca su snapshot en un directorio
+      compartido (METRICS_DIR) y render() agrega los de todos los procesos.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells = self._local.cells = {}
+            with self._lock:
+                self._shards.append(cells)
+            return cells
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: '{metric.name}'")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets=buckets))
+
+    def snapshot(self) -> dict:
+        """ Valores del proceso: {"pid", "metrics": [{descripción, "samples": [[etiquetas, valores]]}]} """
+        samples: Dict[tuple, list] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, cell in list(shard.items()):
+                total = samples.get(key)
+                if total is None:
+                    samples[key] = list(cell)
+                else:
+                    for i, value in enumerate(cell):
+                        total[i] += value
+        metrics = []
+        for metric in list(self._metrics.values()):
+            metric_samples = [[list(labels), values] for (name, labels), values in samples.items()
+                              if name == metric.name]
+            if isinstance(metric, Gauge) and metric._function is not None:
+                try:
+                    metric_samples += [[list(labels), [value]] for labels, value in metric._function().items()]
+                except Exception as e:  # una métrica calculada no debe romper la exportación
+                    logger.warning("No se pudo calcular la métrica '%s': %s", metric.name, e)
+            metrics.append({**metric.describe(), "samples": metric_samples})
+        return {"pid": os.getpid(), "metrics": metrics}
+
+    def render(self, snapshots: Optional[List[dict]] = None) -> str:
+        """ Texto de exposición de Prometheus (0.0.4) de uno o varios snapshots agregados """
+        return render_snapshots(snapshots if snapshots is not None else [self.snapshot()])
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots: List[dict]) -> List[dict]:
+    """ Suma los snapshots de varios procesos. Los gauges de procesos terminados se descartan;
+        contadores e histogramas se conservan porque son acumulados. """
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        alive = _pid_alive(snapshot["pid"])
+        for metric in snapshot["metrics"]:
+            if metric["type"] == "gauge" and not alive:
+                continue
+            target = merged.get(metric["name"])
+            if target is None:
+                target = merged[metric["name"]] = {**metric, "samples": {}}
+            for labels, values in metric["samples"]:
+                key = tuple(labels)
+                total = target["samples"].get(key)
+                if total is None:
+                    target["samples"][key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        total[i] += value
+    return list(merged.values())
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_snapshots(snapshots: List[dict]) -> str:
+    lines = []
+    for metric in sorted(merge_snapshots(snapshots), key=lambda m: m["name"]):
+        name, names = metric["name"], metric["labelnames"]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, values in sorted(metric["samples"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels_text(names, labels)} {_number(values[0])}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + ["+Inf"], values[:-2]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels_text(names, labels, le)} {_number(cumulative)}")
+            lines.append(f"{name}_sum{_labels_text(names, labels)} {_number(values[-2])}")
+            lines.append(f"{name}_count{_labels_text(names, labels)} {_number(values[-1])}")
+    return "\n".join(lines) + "\n"
+
+
+# --- métricas de la API ---
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+registry = MetricsRegistry()
+REQUESTS = registry.counter("api_requests_total", "Peticiones atendidas", ("method", "route", "status"))
+REQUEST_SECONDS = registry.histogram("api_request_duration_seconds", "Duración de las peticiones", ("method", "route"))
+STAGE_SECONDS = registry.histogram("api_request_stage_seconds", "Duración de cada etapa de las peticiones", ("stage",))
+IN_FLIGHT = registry.gauge("api_requests_in_flight", "Peticiones en curso")
+MESSAGES = registry.counter("api_messages_total", "Mensajes aceptados o rechazados", ("result", "code"))
+ERRORS = registry.counter("api_errors_total", "Respuestas de error por código", ("code",))
+DB_POOL = registry.gauge("api_db_pool_connections", "Conexiones del pool de la base de datos", ("engine", "state"))
+ID_FILTER_CHECKS = registry.counter(
+    "api_id_filter_checks_total", "message_id comprobados con el filtro Bloom por resultado", ("result",)
+)
+ID_FILTER_ROUND_TRIPS_SAVED = registry.counter(
+    "api_id_filter_round_trips_saved_total", "Consultas de duplicados e INSERT fallidos evitados por el filtro Bloom"
+)
+PAGE_CACHE_HITS = registry.gauge("api_page_cache_hits", "Aciertos de la caché de páginas de sesión")
+PAGE_CACHE_MISSES = registry.gauge("api_page_cache_misses", "Fallos de la caché de páginas de sesión")
+PAGE_CACHE_EVICTIONS = registry.gauge("api_page_cache_evictions", "Páginas desalojadas de la caché por tamaño")
+CORPUS_LOADS = registry.gauge("api_corpus_loads", "Cargas iniciales del corpus de palabras prohibidas")
+CORPUS_RELOADS = registry.gauge("api_corpus_reloads", "Recargas del corpus por cambios en el archivo")
+CORPUS_SOURCE = registry.gauge("api_corpus_source", "Origen del corpus cargado (json o artifact)", ("source",))
+
+
+class RequestTimer:
+    """ Tiempos acumulados de la petición en curso; se observan una sola vez al terminar """
+    __slots__ = ("stages", "entered", "exited")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.entered: Optional[float] = None
+        self.exited: Optional[float] = None
+
+
+request_timer: ContextVar[Optional[RequestTimer]] = ContextVar("metrics_request_timer", default=None)
+# inicio del commit de la sesión en curso (before_commit -> after_commit/after_rollback)
+_commit_started: ContextVar[Optional[float]] = ContextVar("metrics_commit_started", default=None)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """ Suma la duración a la etapa de la petición en curso, o la observa directamente fuera de una petición
+        (p. ej. en el hilo del escritor write-behind) """
+    timer = request_timer.get()
+    if timer is not None:
+        timer.stages[stage] = timer.stages.get(stage, 0.0) + seconds
+    elif METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, stage)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """ Mide el bloque como una etapa de la petición """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def count_messages(endpoint: Callable) -> Callable:
+    """ Marca el endpoint para que MetricsRoute cuente su mensaje como aceptado o rechazado (por código) """
+    endpoint.count_messages = True
+    return endpoint
+
+
+def record_batch_results(results) -> None:
+    """ Cuenta los mensajes de un lote según su estado final (BatchItemResultSchema) """
+    if not METRICS_ENABLED:
+        return
+    for result in results:
+        if result.status == "accepted":
+            MESSAGES.inc("accepted", "")
+        else:
+            MESSAGES.inc("rejected", result.error.code if result.error else "")
+
+
+def _error_code(exc: Exception) -> str:
+    if isinstance(exc, RateLimitExceeded):
+        return "RATE_LIMIT_EXCEEDED"
+    if isinstance(exc, RequestValidationError):
+        return "VALIDATION_ERROR"
+    if isinstance(exc, HTTPException):
+        detail = exc.detail
+        if isinstance(detail, dict) and isinstance(detail.get("error"), dict):
+            return detail["error"].get("code", "HTTP_ERROR")
+        return "HTTP_ERROR"
+    return "INTERNAL_ERROR"
+
+
+def _mark_endpoint(endpoint: Callable) -> Callable:
+    """ Registra el inicio y el fin del endpoint: lo anterior es validación y lo posterior serialización """
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kwargs):
+            timer = request_timer.get()
+            if timer is not None:
+                timer.entered = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if timer is not None:
+                    timer.exited = time.perf_counter()
+    else:
+        @functools.wraps(endpoint)
+        def timed_endpoint(*args, **kwargs):
+            # en el threadpool la petición conserva su contexto (y el mismo RequestTimer)
+            timer = request_timer.get()
+            if timer is not None:
+                timer.entered = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if timer is not None:
+                    timer.exited = time.perf_counter()
+    return timed_endpoint
+
+
+class MetricsRoute(APIRoute):
+    """
+    Ruta que mide cada petición: duración total, etapas, peticiones en curso, estado y código de error.
+    - validation: desde la llegada de la petición hasta la entrada al endpoint (lectura del body, validación
+      y dependencias), sin contar auth.
+    - serialization: desde la salida del endpoint hasta la respuesta, más la codificación hecha en el endpoint.
+    """
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        self.count_messages = getattr(endpoint, "count_messages", False)
+        super().__init__(path, _mark_endpoint(endpoint) if METRICS_ENABLED else endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not METRICS_ENABLED:
+            return handler
+        route = self.path_format
+        count_messages = self.count_messages
+
+        async def metrics_handler(request: Request):
+            # el middleware de Server-Timing pudo crear ya el timer de la petición
+            timer = request_timer.get()
+            token = None
+            if timer is None:
+                timer = RequestTimer()
+                token = request_timer.set(timer)
+            IN_FLIGHT.inc()
+            start = time.perf_counter()
+            status, code = 500, None
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except Exception as exc:
+                code = _error_code(exc)
+                status = getattr(exc, "status_code", 422 if code == "VALIDATION_ERROR" else 500)
+                raise
+            finally:
+                end = time.perf_counter()
+                if token is not None:
+                    request_timer.reset(token)
+                IN_FLIGHT.dec()
+                stages = timer.stages
+                # sin entrada al endpoint la petición falló en la validación o en las dependencias
+                entered = timer.entered if timer.entered is not None else end
+                stages["validation"] = max(entered - start - stages.get("auth", 0.0), 0.0)
+                if timer.exited is not None:
+                    stages["serialization"] = stages.get("serialization", 0.0) + end - timer.exited
+                for stage, seconds in stages.items():
+                    STAGE_SECONDS.observe(seconds, stage)
+                REQUEST_SECONDS.observe(end - start, request.method, route)
+                REQUESTS.inc(request.method, route, str(status))
+                if code is not None:
+                    ERRORS.inc(code)
+                if count_messages:
+                    if code is None:
+                        MESSAGES.inc("accepted", "")
+                    else:
+                        MESSAGES.inc("rejected", code)
+
+        return metrics_handler
+
+
+# --- base de datos: tiempos de consultas y commits, uso del pool ---
+
+# sentencias que cuentan como escritura (db_commit); DDL y PRAGMA no se miden
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLAC")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    verb = statement.lstrip()[:6].upper()
+    if verb == "SELECT":
+        record_stage("db_query", time.perf_counter() - start)
+    elif verb in _WRITE_VERBS and _commit_started.get() is None:
+        # las escrituras que ocurren dentro del commit (flush del ORM) ya cuentan en db_commit
+        record_stage("db_commit", time.perf_counter() - start)
+
+
+def _before_commit(session):
+    _commit_started.set(time.perf_counter())
+
+
+def _after_commit(session):
+    start = _commit_started.get()
+    if start is not None:
+        _commit_started.set(None)
+        record_stage("db_commit", time.perf_counter() - start)
+
+
+def _after_rollback(session):
+    _commit_started.set(None)
+
+
+_database_instrumented = False
+
+
+def instrument_database() -> None:
+    """ Registra los listeners de SQLAlchemy (una vez por proceso, para todos los motores y sesiones):
+        db_query para las lecturas y db_commit para las escrituras y el commit """
+    global _database_instrumented
+    if _database_instrumented:
+        return
+    _database_instrumented = True
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Session, "before_commit", _before_commit)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+
+
+def pool_usage(engines: Dict[str, Engine]) -> Dict[tuple, float]:
+    """ Conexiones en uso, libres y de desbordamiento de cada pool (los pools sin tamaño se omiten) """
+    usage = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        usage[(name, "checked_out")] = pool.checkedout()
+        usage[(name, "idle")] = pool.checkedin()
+        usage[(name, "overflow")] = max(pool.overflow(), 0)
+        usage[(name, "size")] = pool.size()
+    return usage
+
+
+def monitor_db_pools(engines: Dict[str, Engine]) -> None:
+    """ Exporta el uso de los pools en api_db_pool_connections """
+    DB_POOL.set_function(lambda: pool_usage({name: e for name, e in engines.items() if e is not None}))
+
+
+def _stat_function(stats: Callable[[], Optional[dict]], key: str) -> Callable[[], Dict[tuple, float]]:
+    """ Función de un gauge sin etiquetas que lee stats()[key]; sin muestra si stats() devuelve None """
+    def value() -> Dict[tuple, float]:
+        current = stats()
+        return {(): current[key]} if current is not None else {}
+    return value
+
+
+def monitor_page_cache(get_cache: Callable[[], Optional[object]]) -> None:
+    """ Exporta los contadores de SessionPageCache.stats() (get_cache() devuelve None si está desactivada) """
+    def stats() -> Optional[dict]:
+        cache = get_cache()
+        return cache.stats() if cache is not None else None
+    for gauge, key in ((PAGE_CACHE_HITS, "hits"), (PAGE_CACHE_MISSES, "misses"),
+                       (PAGE_CACHE_EVICTIONS, "evictions")):
+        gauge.set_function(_stat_function(stats, key))
+
+
+def monitor_corpus(stats: Callable[[], dict]) -> None:
+    """ Exporta las cargas, recargas y el origen del corpus a partir de CorpusStore.stats() """
+    CORPUS_LOADS.set_function(_stat_function(stats, "loads"))
+    CORPUS_RELOADS.set_function(_stat_function(stats, "reloads"))
+
+    def source() -> Dict[tuple, float]:
+        current = stats()["source"]
+        return {(current,): 1} if current else {}
+    CORPUS_SOURCE.set_function(source)
+
+
+# --- varios workers: snapshots por proceso en METRICS_DIR ---
+
+def get_metrics_dir() -> Optional[str]:
+    """ Directorio compartido por los workers (METRICS_DIR); None con un solo proceso """
+    return os.getenv("METRICS_DIR") or None
+
+
+def write_snapshot(directory: str) -> None:
+    """ Vuelca el snapshot del proceso de forma atómica (archivo temporal + rename) """
+    os.makedirs(directory, exist_ok=True)
+    snapshot = registry.snapshot()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, os.path.join(directory, f"metrics-{snapshot['pid']}.json"))
+
+
+def read_snapshots(directory: str) -> List[dict]:
+    """ Snapshots de todos los procesos; el del proceso actual se toma en memoria (sin retraso) """
+    snapshots = [registry.snapshot()]
+    own = os.path.join(directory, f"metrics-{os.getpid()}.json")
+    for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+        if path == own:
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # archivo a medio escribir o eliminado: se ignora en esta exportación
+    return snapshots
+
+
+def render_metrics() -> str:
+    """ Texto de /metrics: el proceso actual o, con METRICS_DIR, todos los workers """
+    directory = get_metrics_dir()
+    return registry.render(read_snapshots(directory) if directory else None)
+
+
+class SnapshotWriter:
+    """ Hilo que vuelca el snapshot del proceso en METRICS_DIR cada flush_interval segundos """
+    def __init__(self, directory: str, flush_interval: Optional[float] = None):
+        self.directory = directory
+        if flush_interval is None:
+            flush_interval = float(os.getenv("METRICS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+
+    def start(self) -> "SnapshotWriter":
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._flush()
+
+    def _flush(self) -> None:
+        try:
+            write_snapshot(self.directory)
+        except OSError as e:
+            logger.warning("No se pudieron volcar las métricas en '%s': %s", self.directory, e)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self._flush()
+
+
+_snapshot_writer: Optional[SnapshotWriter] = None
+
+
+def start_metrics_writer() -> Optional[SnapshotWriter]:
+    """ Arranca el volcado periódico si hay METRICS_DIR (varios workers) """
+    global _snapshot_writer
+    directory = get_metrics_dir()
+    if directory and METRICS_ENABLED and _snapshot_writer is None:
+        _snapshot_writer = SnapshotWriter(directory).start()
+    return _snapshot_writer
+
+
+def stop_metrics_writer() -> None:
+    """ Último volcado al apagar el worker """
+    global _snapshot_writer
+    if _snapshot_writer is not None:
+        _snapshot_writer.close()
+        _snapshot_writer = None
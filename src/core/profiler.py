@@ -0,0 +1,205 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# endpoint /admin/profile: solo se registra si hay una clave de administración (ADMIN_API_KEY)
+PROFILER_ENABLED = bool(os.getenv("ADMIN_API_KEY"))
+# duración máxima de una sesión de perfilado (segundos) e intervalo de muestreo por defecto (ms)
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+DEFAULT_INTERVAL_MS = 5.0
+# frames hoja (archivo, función) de hilos en espera: workers del threadpool, escritor, bucle de eventos
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+# las peticiones a las rutas de administración no cuentan para el límite de peticiones de la sesión
+ADMIN_PATH_PREFIX = "/admin"
+
+
+def frame_label(code) -> str:
+    """ Etiqueta de un frame en las pilas colapsadas: modulo:funcion (sin ';' ni espacios) """
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_qualname}".replace(";", ":").replace(" ", "_")
+
+
+class ProfileSession:
+    """
+    Perfilador por muestreo de todos los hilos del proceso.
+    Un hilo propio toma cada interval segundos las pilas de los demás hilos (sys._current_frames) y acumula
+    cuántas veces aparece cada pila; los hilos en espera se descartan salvo con include_idle.
+    Termina al pasar seconds o, con requests, cuando ProfilerMiddleware ha contado esas peticiones.
+    No modifica el código perfilado: el coste es el del hilo de muestreo, que toma el GIL en cada muestra.
+    Las funciones en C (python-Levenshtein, pydantic-core, sqlite3) no tienen frame: su tiempo se atribuye a quien
+    las llama. El tiempo de fuzz.ratio aparece en los frames de Python de fuzzywuzzy (fuzz:ratio,
+    StringMatcher:StringMatcher.ratio), con la llamada en C a Levenshtein incluida en su llamador.
+    """
+    def __init__(
+        self,
+        seconds: float,
+        requests: Optional[int] = None,
+        interval: float = DEFAULT_INTERVAL_MS / 1000,
+        include_idle: bool = False,
+    ):
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.requests_seen = 0
+        self.started_at: Optional[float] = None
+        self.elapsed = 0.0
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """ Espera a que termine la sesión; devuelve si terminó """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self._thread is not None and not self._thread.is_alive()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def request_finished(self) -> None:
+        """ Cuenta una petición atendida; detiene la sesión al llegar a requests """
+        with self._lock:
+            self.requests_seen += 1
+            if self.requests is not None and self.requests_seen >= self.requests:
+                self._done.set()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = self.started_at + self.seconds
+        while not self._done.is_set() and time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self._sample(frame)
+            self._done.wait(self.interval)
+        self.elapsed = time.perf_counter() - self.started_at
+        self._done.set()
+
+    def _sample(self, frame) -> None:
+        leaf = frame.f_code
+        if not self.include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FRAMES:
+            self.idle_samples += 1
+            return
+        stack = []
+        labels = self._labels
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = frame_label(code)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """ Pilas en formato colapsado (raíz;...;hoja muestras), entrada de flamegraph.pl y speedscope """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 20) -> List[dict]:
+        """ Funciones con más muestras propias (en la hoja) y totales (en cualquier nivel de la pila) """
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        samples = self.samples or 1
+        ranked = sorted(total, key=lambda label: (own[label], total[label]), reverse=True)[:limit]
+        return [
+            {
+                "function": label,
+                "self_samples": own[label],
+                "total_samples": total[label],
+                "self_pct": round(100 * own[label] / samples, 2),
+                "total_pct": round(100 * total[label] / samples, 2),
+            }
+            for label in ranked
+        ]
+
+    def by_module(self) -> List[Tuple[str, int]]:
+        """ Muestras propias agrupadas por módulo de la función hoja """
+        modules: Counter = Counter()
+        for stack, count in self.stacks.items():
+            modules[stack.rsplit(";", 1)[-1].split(":", 1)[0]] += count
+        return modules.most_common()
+
+    def report(self, top: int = 20) -> dict:
+        return {
+            "duration_seconds": round(self.elapsed, 3),
+            "interval_ms": self.interval * 1000,
+            "requests": self.requests_seen,
+            "samples": self.samples,
+            "idle_samples": self.idle_samples,
+            "top": self.top_functions(top),
+            "modules": [{"module": module, "self_samples": count} for module, count in self.by_module()],
+            "collapsed": self.collapsed(),
+        }
+
+
+# sesión en curso del proceso; solo puede haber una a la vez
+_session: Optional[ProfileSession] = None
+_session_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def start_profile(
+    seconds: float,
+    requests: Optional[int] = None,
+    interval: float = DEFAULT_INTERVAL_MS / 1000,
+    include_idle: bool = False,
+) -> ProfileSession:
+    """ Inicia una sesión de perfilado (seconds se limita a PROFILER_MAX_SECONDS); ProfilerBusyError si ya hay una """
+    global _session
+    with _session_lock:
+        if _session is not None and _session.running:
+            raise ProfilerBusyError("Ya hay una sesión de perfilado en curso")
+        _session = ProfileSession(min(seconds, PROFILER_MAX_SECONDS), requests, interval, include_idle)
+        _session.start()
+        return _session
+
+
+class ProfilerMiddleware:
+    """
+    Middleware ASGI que cuenta las peticiones atendidas mientras hay una sesión de perfilado en curso,
+    para las sesiones limitadas a las próximas N peticiones. Sin sesión solo comprueba una variable global.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session = _session
+            if (session is not None and session.running and scope["type"] == "http"
+                    and not scope["path"].startswith(ADMIN_PATH_PREFIX)):
+                session.request_finished()
@@ -0,0 +1,311 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+from core.api_keys import DEFAULT_CLIENT_ID
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover (Windows: solo exclusión entre hilos del mismo proceso)
+    fcntl = None
+
+# cabecera del archivo: firma, número de slots y slots por bucket
+_HEADER = struct.Struct("<8sQQ")
+_HEADER_SIZE = 64
+# byte de la cabecera sobre el que cada proceso que usa la tabla mantiene un lock compartido de fcntl
+_USERS_LOCK_OFFSET = _HEADER_SIZE - 1
+_MAGIC = b"RLSHM001"
+# slot: hash de la clave (0 = libre), contador y expiración (epoch en segundos)
+_SLOT = struct.Struct("<Qqd")
+# slots por bucket: cada clave se busca solo en su bucket (comprobación O(1))
+BUCKET_SLOTS = 16
+DEFAULT_SLOTS = 65536
+# junto a los datos de la app (como data/messages.db): cada despliegue usa su propia tabla
+DEFAULT_STORAGE_FILE = os.path.join("data", "ratelimit.bin")
+# locks de hilo por proceso (los locks de fcntl no excluyen a hilos del mismo proceso)
+_THREAD_LOCK_STRIPES = 256
+
+
+# tablas abiertas por cada proceso: una segunda instancia sobre el mismo archivo no la reinicia
+_opened_paths = {}
+
+
+def _key_hash(key: str) -> int:
+    # 64 bits: colisiones despreciables; el 0 queda reservado para slots libres
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Almacenamiento de límites de peticiones compartido por los procesos de un mismo host.
+    - Tabla hash de tamaño fijo en un archivo mapeado en memoria (mmap): la memoria no crece con las IPs.
+    - Cada clave vive en un bucket de BUCKET_SLOTS slots; las claves expiradas se reutilizan y, si el bucket
+      está lleno, se desaloja la que expira antes.
+    - Cada bucket se protege con un lock de rango de fcntl (entre procesos) y un lock de hilo (dentro del proceso).
+    - Mientras un proceso usa la tabla mantiene un lock compartido sobre la cabecera; el primero en abrirla sin
+      ningún otro proceso vivo la reinicia, de modo que los contadores no sobreviven a un reinicio de la app.
+
+    URI: sharedmem:///ruta/al/archivo?slots=65536 (sin ruta usa DEFAULT_STORAGE_FILE, data/ratelimit.bin).
+    """
+    STORAGE_SCHEME = ["sharedmem"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        parsed = urllib.parse.urlparse(uri or "sharedmem://")
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        self.path = parsed.path or DEFAULT_STORAGE_FILE
+        requested = int(options.get("slots", query.get("slots", DEFAULT_SLOTS)))
+        self.slots = max(BUCKET_SLOTS, requested - requested % BUCKET_SLOTS)
+        self._thread_locks = [threading.Lock() for _ in range(_THREAD_LOCK_STRIPES)]
+        self._open_lock = threading.Lock()
+        # los contadores de stats() se actualizan desde buckets distintos: necesitan su propio lock
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self.checks = 0
+        self.evictions = 0
+        self.lock_wait_ns = 0
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError, struct.error)
+
+    # --- archivo compartido ---
+
+    def _ensure_open(self) -> mmap.mmap:
+        # tras un fork el proceso hijo abre su propio descriptor (los locks de fcntl son por proceso)
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        with self._open_lock:
+            if self._map is not None and self._pid == os.getpid():
+                return self._map
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if fcntl:
+                fcntl.lockf(fd, fcntl.LOCK_EX, _USERS_LOCK_OFFSET, 0, os.SEEK_SET)
+            try:
+                header = os.pread(fd, _HEADER.size, 0)
+                if len(header) == _HEADER.size and header[:8] == _MAGIC and self._in_use(fd):
+                    # otro proceso ya creó la tabla: se usa su tamaño
+                    _, self.slots, _ = _HEADER.unpack(header)
+                else:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, _HEADER_SIZE + self.slots * _SLOT.size)
+                    os.pwrite(fd, _HEADER.pack(_MAGIC, self.slots, BUCKET_SLOTS), 0)
+                if fcntl:
+                    # se libera al terminar el proceso (los locks de fcntl no se heredan con fork)
+                    fcntl.lockf(fd, fcntl.LOCK_SH, 1, _USERS_LOCK_OFFSET, os.SEEK_SET)
+            finally:
+                if fcntl:
+                    fcntl.lockf(fd, fcntl.LOCK_UN, _USERS_LOCK_OFFSET, 0, os.SEEK_SET)
+            self._map = mmap.mmap(fd, _HEADER_SIZE + self.slots * _SLOT.size)
+            self._fd, self._pid = fd, os.getpid()
+            _opened_paths.setdefault(self._pid, set()).add(self.path)
+            return self._map
+
+    def _in_use(self, fd: int) -> bool:
+        """ True si otro proceso vivo (o este mismo) usa ya la tabla; si no, sus contadores son de una ejecución
+            anterior. Sin fcntl no se puede saber y se conserva. """
+        if fcntl is None or self.path in _opened_paths.get(os.getpid(), ()):
+            return True
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, _USERS_LOCK_OFFSET, os.SEEK_SET)
+        except OSError:
+            return True
+        fcntl.lockf(fd, fcntl.LOCK_UN, 1, _USERS_LOCK_OFFSET, os.SEEK_SET)
+        return False
+
+    @contextmanager
+    def _bucket(self, bucket: int) -> Iterator[mmap.mmap]:
+        """ Bloquea un bucket para el resto de hilos y procesos """
+        table = self._ensure_open()
+        offset = _HEADER_SIZE + bucket * BUCKET_SLOTS * _SLOT.size
+        length = BUCKET_SLOTS * _SLOT.size
+        start = time.perf_counter_ns()
+        thread_lock = self._thread_locks[bucket % _THREAD_LOCK_STRIPES]
+        with thread_lock:
+            if fcntl:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset, os.SEEK_SET)
+            waited = time.perf_counter_ns() - start
+            with self._stats_lock:
+                self.lock_wait_ns += waited
+                self.checks += 1
+            try:
+                yield table
+            finally:
+                if fcntl:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset, os.SEEK_SET)
+
+    def _locate(self, key: str) -> Tuple[int, int]:
+        """ (hash de la clave, bucket) """
+        key_hash = _key_hash(key)
+        return key_hash, key_hash % (self.slots // BUCKET_SLOTS)
+
+    def _find(self, table: mmap.mmap, key_hash: int, bucket: int, now: float, create: bool):
+        """ Slot de la clave en su bucket: (offset, contador, expiración); contador 0 si no existe o expiró.
+            Con create=True devuelve un slot libre, expirado o desalojado para la clave. """
+        base = _HEADER_SIZE + bucket * BUCKET_SLOTS * _SLOT.size
+        free = victim = None
+        victim_expiry = float("inf")
+        for offset in range(base, base + BUCKET_SLOTS * _SLOT.size, _SLOT.size):
+            slot_hash, count, expiry = _SLOT.unpack_from(table, offset)
+            if slot_hash == key_hash:
+                return (offset, count, expiry) if expiry > now else (offset, 0, 0.0)
+            if slot_hash == 0 or expiry <= now:
+                if free is None:
+                    free = offset
+            elif expiry < victim_expiry:
+                victim, victim_expiry = offset, expiry
+        if not create:
+            return None, 0, 0.0
+        if free is None:
+            free = victim
+            with self._stats_lock:
+                self.evictions += 1
+        return free, 0, 0.0
+
+    # --- interfaz de limits.storage.Storage ---
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        key_hash, bucket = self._locate(key)
+        with self._bucket(bucket) as table:
+            now = time.time()
+            offset, count, expires_at = self._find(table, key_hash, bucket, now, create=True)
+            if count == 0:
+                expires_at = now + expiry
+            count += amount
+            _SLOT.pack_into(table, offset, key_hash, count, expires_at)
+            return count
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        key_hash, bucket = self._locate(key)
+        with self._bucket(bucket) as table:
+            offset, count, expires_at = self._find(table, key_hash, bucket, time.time(), create=False)
+            if offset is None or count == 0:
+                return 0
+            count = max(count - amount, 0)
+            _SLOT.pack_into(table, offset, key_hash, count, expires_at)
+            return count
+
+    def get(self, key: str) -> int:
+        key_hash, bucket = self._locate(key)
+        with self._bucket(bucket) as table:
+            return self._find(table, key_hash, bucket, time.time(), create=False)[1]
+
+    def get_expiry(self, key: str) -> float:
+        key_hash, bucket = self._locate(key)
+        now = time.time()
+        with self._bucket(bucket) as table:
+            offset, count, expires_at = self._find(table, key_hash, bucket, now, create=False)
+            return expires_at if count else now
+
+    def clear(self, key: str) -> None:
+        key_hash, bucket = self._locate(key)
+        with self._bucket(bucket) as table:
+            offset, _, _ = self._find(table, key_hash, bucket, time.time(), create=False)
+            if offset is not None:
+                _SLOT.pack_into(table, offset, 0, 0, 0.0)
+
+    def check(self) -> bool:
+        self._ensure_open()
+        return True
+
+    def reset(self) -> Optional[int]:
+        cleared = 0
+        for bucket in range(self.slots // BUCKET_SLOTS):
+            with self._bucket(bucket) as table:
+                base = _HEADER_SIZE + bucket * BUCKET_SLOTS * _SLOT.size
+                for offset in range(base, base + BUCKET_SLOTS * _SLOT.size, _SLOT.size):
+                    if _SLOT.unpack_from(table, offset)[0]:
+                        _SLOT.pack_into(table, offset, 0, 0, 0.0)
+                        cleared += 1
+        return cleared
+
+    # --- ventana deslizante (estrategia sliding-window-counter), igual que limits.storage.MemoryStorage ---
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count, previous_ttl, current_count, _ = self._sliding_window_info(
+            previous_key, current_key, expiry, now
+        )
+        if int(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+            return False
+        # la ventana actual dura dos periodos: es la ventana "anterior" del siguiente
+        current_count = self.incr(current_key, 2 * expiry, amount=amount)
+        if int(previous_count * previous_ttl / expiry + current_count) > limit:
+            # otra petición concurrente ocupó el hueco: se revierte
+            self.decr(current_key, amount)
+            return False
+        return True
+
+    def _sliding_window_info(self, previous_key: str, current_key: str, expiry: int, now: float):
+        previous_count = self.get(previous_key)
+        current_count = self.get(current_key)
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return self._sliding_window_info(previous_key, current_key, expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
+
+    def stats(self) -> dict:
+        """ Contadores del proceso: comprobaciones, desalojos y espera acumulada por locks """
+        return {
+            "path": self.path,
+            "slots": self.slots,
+            "checks": self.checks,
+            "evictions": self.evictions,
+            "lock_wait_ms": self.lock_wait_ns / 1e6,
+        }
+
+
+# configuración del límite de peticiones (un único Limiter para toda la app)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+DEFAULT_RATE_LIMIT_STORAGE_URI = "sharedmem://"
+DEFAULT_RATE_LIMIT_STRATEGY = "sliding-window-counter"
+
+
+def get_rate_limit_storage_uri() -> str:
+    """ Almacenamiento de los contadores (RATE_LIMIT_STORAGE_URI): sharedmem:// o memory:// """
+    return os.getenv("RATE_LIMIT_STORAGE_URI", DEFAULT_RATE_LIMIT_STORAGE_URI)
+
+
+def get_rate_limit_key(request: Request) -> str:
+    """ Clave del límite: el cliente de la API key (request.state.client_id) o, con la API key única, la IP """
+    client_id = getattr(request.state, "client_id", None)
+    if client_id and client_id != DEFAULT_CLIENT_ID:
+        return f"client:{client_id}"
+    return get_remote_address(request)
+
+
+limiter = Limiter(
+    key_func=get_rate_limit_key,
+    storage_uri=get_rate_limit_storage_uri(),
+    strategy=os.getenv("RATE_LIMIT_STRATEGY", DEFAULT_RATE_LIMIT_STRATEGY),
+    enabled=RATE_LIMIT_ENABLED,
+)
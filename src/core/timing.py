@@ -0,0 +1,64 @@
+import os
+import time
+from typing import Dict
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import RequestTimer, request_timer
+
+# cabecera Server-Timing con las etapas de cada petición (SERVER_TIMING_ENABLED); desactivada por defecto
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+# descripción de cada etapa en la cabecera (solo ASCII), en el orden en que se listan
+STAGE_DESCRIPTIONS: Dict[str, str] = {
+    "validation": "Validacion",
+    "auth": "Autenticacion",
+    "banned_word_scan": "Moderacion",
+    "db_commit": "Commit",
+    "db_query": "Consulta",
+    "serialization": "Serializacion",
+}
+
+
+def server_timing_header(timer: RequestTimer, total_seconds: float) -> str:
+    """ Valor de Server-Timing: una entrada por etapa medida (ms) y el total de la app """
+    entries = []
+    stages = timer.stages
+    ordered = [name for name in STAGE_DESCRIPTIONS if name in stages]
+    ordered += [name for name in stages if name not in STAGE_DESCRIPTIONS]
+    for stage in ordered:
+        description = STAGE_DESCRIPTIONS.get(stage)
+        desc = f';desc="{description}"' if description else ""
+        entries.append(f"{stage}{desc};dur={stages[stage] * 1000:.3f}")
+    entries.append(f"total;dur={total_seconds * 1000:.3f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI que añade la cabecera Server-Timing con las etapas de la petición.
+    Crea el RequestTimer de la petición (contextvar) en el que informan los servicios (moderación, commit,
+    consultas) y MetricsRoute (validación y serialización); la cabecera se escribe al enviar la respuesta.
+    Solo se registra con SERVER_TIMING_ENABLED=true: desactivado no añade coste.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timer = RequestTimer()
+        token = request_timer.set(timer)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(timer, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timer.reset(token)
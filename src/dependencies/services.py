@@ -1,16 +1,97 @@
-from services.message_service import MessageProcessingService, MessageStorageService, MessageRetrievalService
-from sqlalchemy.orm import Session
-from fastapi import Depends
-from core.database import get_db
-
-def get_message_processing_service() -> MessageProcessingService:
-    """Obtiene una instancia del servicio de procesamiento de mensajes."""
-    return MessageProcessingService()
-
-def get_storage_service(db: Session = Depends(get_db)) -> MessageStorageService:
-    """Obtiene una instancia del servicio de almacenamiento de mensajes."""
-    return MessageStorageService(db) 
-
-def get_retrieval_service(db: Session = Depends(get_db)) -> MessageRetrievalService:
-    """Obtiene una instancia del servicio de recuperación de mensajes."""
-    return MessageRetrievalService(db)
\ No newline at end of file
+from services.message_service import (
+    MessageProcessingService, MessageStorageService, MessageRetrievalService,
+    AsyncMessageStorageService, AsyncMessageRetrievalService,
+    MessageExportService, AsyncMessageExportService
+)
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from fastapi import Depends, Request
+from typing import Iterator, Optional
+import threading
+from services.sharded_storage import ShardedMessageStorageService
+from services.write_behind import WriteBehindWriter, WriteBehindStorageService, get_write_behind_writer
+from core.archive import SegmentStore, get_archive_store
+from core.bloom import MessageIdFilter, get_id_filter
+from core.cache import SessionPageCache, get_page_cache
+from core.database import (
+    ShardSet, get_db, get_async_db, get_session_factory, get_async_session_factory, get_shards
+)
+
+_processing_service_lock = threading.Lock()
+
+def get_message_processing_service(request: Request) -> MessageProcessingService:
+    """Obtiene el servicio de procesamiento de mensajes compartido por el proceso.
+    Se construye en el arranque de la app (lifespan) y se guarda en app.state; si la app no tiene
+    lifespan (p. ej. una app de pruebas) se construye en la primera petición."""
+    service = getattr(request.app.state, "message_processing_service", None)
+    if service is None:
+        with _processing_service_lock:
+            service = getattr(request.app.state, "message_processing_service", None)
+            if service is None:
+                service = request.app.state.message_processing_service = MessageProcessingService()
+    return service
+
+def get_storage_service(
+    db: Session = Depends(get_db),
+    writer: Optional[WriteBehindWriter] = Depends(get_write_behind_writer),
+    page_cache: Optional[SessionPageCache] = Depends(get_page_cache),
+    shards: Optional[ShardSet] = Depends(get_shards),
+    id_filter: Optional[MessageIdFilter] = Depends(get_id_filter)
+) -> MessageStorageService:
+    """Obtiene una instancia del servicio de almacenamiento de mensajes.
+    Con DATABASE_SHARDS > 1 los mensajes se guardan en el shard de su sesión; con WRITE_BEHIND_ENABLED=true
+    los mensajes individuales se guardan mediante el escritor en segundo plano. Con ID_FILTER_ENABLED=true
+    el filtro Bloom del proceso evita las consultas de duplicados de los IDs nuevos."""
+    if shards is not None:
+        return ShardedMessageStorageService(shards, page_cache)
+    if writer is not None:
+        return WriteBehindStorageService(db, writer)
+    return MessageStorageService(db, page_cache, id_filter)
+
+def get_retrieval_service(
+    session_id: str,
+    db: Session = Depends(get_db),
+    shards: Optional[ShardSet] = Depends(get_shards),
+    archive: Optional[SegmentStore] = Depends(get_archive_store)
+) -> Iterator[MessageRetrievalService]:
+    """Obtiene una instancia del servicio de recuperación de mensajes.
+    Con DATABASE_SHARDS > 1 usa una sesión del shard de session_id (parámetro de ruta); con ARCHIVE_ENABLED=true
+    incluye los mensajes archivados."""
+    if shards is None:
+        yield MessageRetrievalService(db, archive)
+        return
+    with shards.session_factory_for(session_id)() as shard_db:
+        yield MessageRetrievalService(shard_db, archive)
+
+def get_export_service(
+    session_id: str,
+    session_factory: sessionmaker = Depends(get_session_factory),
+    shards: Optional[ShardSet] = Depends(get_shards),
+    archive: Optional[SegmentStore] = Depends(get_archive_store)
+) -> MessageExportService:
+    """Obtiene una instancia del servicio de exportación de mensajes."""
+    if shards is not None:
+        session_factory = shards.session_factory_for(session_id)
+    return MessageExportService(session_factory, archive=archive)
+
+def get_async_storage_service(
+    db: AsyncSession = Depends(get_async_db),
+    page_cache: Optional[SessionPageCache] = Depends(get_page_cache),
+    id_filter: Optional[MessageIdFilter] = Depends(get_id_filter)
+) -> AsyncMessageStorageService:
+    """Obtiene una instancia del servicio asíncrono de almacenamiento de mensajes."""
+    return AsyncMessageStorageService(db, page_cache, id_filter)
+
+def get_async_retrieval_service(
+    db: AsyncSession = Depends(get_async_db),
+    archive: Optional[SegmentStore] = Depends(get_archive_store)
+) -> AsyncMessageRetrievalService:
+    """Obtiene una instancia del servicio asíncrono de recuperación de mensajes."""
+    return AsyncMessageRetrievalService(db, archive)
+
+def get_async_export_service(
+    session_factory: async_sessionmaker = Depends(get_async_session_factory),
+    archive: Optional[SegmentStore] = Depends(get_archive_store)
+) -> AsyncMessageExportService:
+    """Obtiene una instancia del servicio asíncrono de exportación de mensajes."""
+    return AsyncMessageExportService(session_factory, archive=archive)
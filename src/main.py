@@ -1,25 +1,102 @@
+from dotenv import load_dotenv
+# antes de importar los módulos que leen variables de entorno al cargarse
+load_dotenv()
+import logging
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from core.database import engine, Base
+from core.bloom import ID_FILTER_ENABLED, init_id_filter
+from core.cache import get_page_cache
+from core.corpus import get_corpus_store
+from core.database import init_db, engine, async_engine, shards, SessionLocal, ASYNC_DB_ENABLED
+from core.metrics import (
+    METRICS_ENABLED, instrument_database, monitor_corpus, monitor_db_pools, monitor_page_cache,
+    start_metrics_writer, stop_metrics_writer
+)
+from core.timing import SERVER_TIMING_ENABLED, ServerTimingMiddleware
+from core.profiler import PROFILER_ENABLED, ProfilerMiddleware
+from core.rate_limit import limiter
 from core.exceptions import CustomValidationException, custom_rate_limit_exceeded_handler
-from dotenv import load_dotenv
 import os
-from controllers import message_controller
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from controllers import message_controller, async_message_controller, metrics_controller, admin_controller
+from models.api_key_model import ApiKeyModel  # noqa: F401 (registra la tabla api_keys)
+from models.archive_model import ArchiveBlockModel  # noqa: F401 (registra las tablas del almacenamiento en frío)
+from models.message_model import MessageModel
+from models.message_registry_model import MessageRegistryModel  # noqa: F401 (registra la tabla message_registry)
+from models.session_stats_model import SessionStatsModel
+from services.message_service import (
+    MessageProcessingService, MessageStorageService, validate_conflict_policy_setting
+)
+from services.write_behind import WRITE_BEHIND_ENABLED, start_write_behind, stop_write_behind
 from slowapi.errors import RateLimitExceeded
 
+# logger de uvicorn: los mensajes de arranque aparecen junto a los del servidor
+logger = logging.getLogger("uvicorn.error")
+
 # Configuración de la app
-limiter = Limiter(key_func=get_remote_address)
-load_dotenv()
 info_app = {"title": "API procesamiento de mensajes",
         "message": "API en funcionamiento",
         "version": f"{os.getenv('API_VERSION', '1.0.0')}"
     }
 
+def build_message_processing_service() -> MessageProcessingService:
+    """Construye el servicio de procesamiento del proceso y compila su corpus y su matcher."""
+    start = time.perf_counter()
+    service = MessageProcessingService()
+    try:
+        service._get_matcher()
+    except (OSError, ValueError) as e:
+        # sin corpus legible la app arranca igual; el corpus se cargará en el primer mensaje
+        logger.warning("No se pudo precargar el corpus '%s': %s", service.corpus_filter_path, e)
+    logger.info("MessageProcessingService construido en %.1f ms", (time.perf_counter() - start) * 1000)
+    return service
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # configuración inválida: la app no arranca, con un error que indica la variable
+    try:
+        validate_conflict_policy_setting()
+    except RuntimeError as e:
+        logger.error("Configuración inválida: %s", e)
+        raise
+    # Crear las tablas en la base de datos al iniciar la app
+    init_db()
+    if shards is not None:
+        shards.init()
+    # bases creadas antes de session_stats: se calculan los contadores una sola vez
+    for session_factory in shards.session_factories if shards is not None else [SessionLocal]:
+        with session_factory() as db:
+            if db.query(MessageModel).first() and not db.query(SessionStatsModel).first():
+                MessageStorageService.rebuild_session_stats(db)
+    # filtro Bloom de los message_id guardados (los shards ya reservan los IDs sin excepciones)
+    id_filter = None
+    if ID_FILTER_ENABLED and shards is None:
+        start = time.perf_counter()
+        id_filter = init_id_filter(SessionLocal)
+        logger.info("Filtro de message_id construido en %.1f ms (%d IDs, %d bytes)",
+                    (time.perf_counter() - start) * 1000, id_filter.count, id_filter.nbytes)
+    # servicio de procesamiento compartido por todas las peticiones
+    app.state.message_processing_service = build_message_processing_service()
+    if METRICS_ENABLED:
+        # cargas y recargas del corpus en /metrics: el camino caliente no debe tocar el disco
+        monitor_corpus(get_corpus_store(app.state.message_processing_service.corpus_filter_path).stats)
+    # escritor en segundo plano con group commit (solo en modo síncrono)
+    if WRITE_BEHIND_ENABLED and not ASYNC_DB_ENABLED:
+        if shards is not None:
+            logger.warning("WRITE_BEHIND_ENABLED se ignora con DATABASE_SHARDS > 1")
+        else:
+            start_write_behind(SessionLocal, get_page_cache(), id_filter)
+    # volcado periódico de las métricas del worker (METRICS_DIR, varios workers)
+    start_metrics_writer()
+    yield
+    # Vaciar la cola del escritor en segundo plano antes de terminar
+    stop_write_behind()
+    stop_metrics_writer()
+
 # Crear la app FastAPI
-app = FastAPI(title=info_app["title"], version=info_app["version"])
+app = FastAPI(title=info_app["title"], version=info_app["version"], lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, custom_rate_limit_exceeded_handler)
 
@@ -33,16 +110,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Crear las tablas en la base de datos al iniciar la app
-@app.on_event("startup")
-def on_startup():
-    Base.metadata.create_all(bind=engine)
-
 # Handler global de error en validación 422
 app.add_exception_handler(RequestValidationError, CustomValidationException)
 
-# Routers   
-app.include_router(message_controller.router)
+# Routers: en modo asíncrono (DATABASE_ASYNC=true) los endpoints de mensajes son async def
+if ASYNC_DB_ENABLED:
+    app.include_router(async_message_controller.router)
+else:
+    app.include_router(message_controller.router)
+
+# Cabecera Server-Timing con las etapas de cada petición (opcional)
+if SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
+# tiempos de consultas y commits de SQLAlchemy (métricas y Server-Timing)
+if METRICS_ENABLED or SERVER_TIMING_ENABLED:
+    instrument_database()
+
+# Métricas: tiempos por etapa, uso del pool de conexiones y caché de páginas, expuestos en /metrics
+if METRICS_ENABLED:
+    monitor_db_pools({"sync": engine, "async": async_engine.sync_engine if async_engine else None,
+                      **(shards.named_engines() if shards is not None else {})})
+    monitor_page_cache(get_page_cache)
+    app.include_router(metrics_controller.router)
+
+# Perfilador bajo demanda en /admin/profile (solo con ADMIN_API_KEY)
+if PROFILER_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+    app.include_router(admin_controller.router)
 
 # Ruta raíz para health check
 @app.get("/")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Boolean, DateTime, func
+from core.database import Base
+
+class ApiKeyModel(Base):
+    """API keys por cliente (API_KEYS_SOURCE=database); solo se guarda el SHA-256 de cada clave"""
+    __tablename__ = "api_keys"
+
+    key_sha256 = Column(String(64), primary_key=True)
+    client_id = Column(String, nullable=False, index=True)
+    active = Column(Boolean, nullable=False, default=True, server_default="1")
+    created_at = Column(DateTime, server_default=func.now())
+    # se actualiza en cada cambio: la recarga del almacén de claves lo usa para detectar modificaciones
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
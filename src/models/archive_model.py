@@ -0,0 +1,38 @@
+from sqlalchemy import DDL, Column, DateTime, Index, Integer, String, event, func
+from core import archive
+from core.database import Base
+
+class ArchiveBlockModel(Base):
+    """Índice del almacenamiento en frío: bloques comprimidos de mensajes consecutivos de una sesión y
+    remitente, con su posición en el segmento y el rango de timestamps que contienen"""
+    __tablename__ = "message_archive_blocks"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    sender = Column(String)
+    segment = Column(String, nullable=False)
+    offset = Column(Integer, nullable=False)
+    length = Column(Integer, nullable=False)
+    crc32 = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    first_timestamp = Column(DateTime)
+    last_timestamp = Column(DateTime)
+    archived_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_message_archive_blocks_session_last", "session_id", "last_timestamp"),
+    )
+
+class ArchivedMessageIdModel(Base):
+    """message_id de los mensajes archivados: mantienen su unicidad fuera de la tabla messages"""
+    __tablename__ = "archived_message_ids"
+
+    message_id = Column(String, primary_key=True)
+
+# un message_id archivado no puede volver a insertarse en messages (mismo error que la clave primaria);
+# solo con ARCHIVE_ENABLED: sin archivado el trigger añadiría una consulta a cada inserción
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE TRIGGER IF NOT EXISTS trg_messages_archived_id BEFORE INSERT ON messages "
+    "WHEN EXISTS (SELECT 1 FROM archived_message_ids WHERE message_id = NEW.message_id) "
+    "BEGIN SELECT RAISE(ABORT, 'UNIQUE constraint failed: messages.message_id'); END"
+).execute_if(dialect="sqlite", callable_=lambda *args, **kwargs: archive.ARCHIVE_ENABLED))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy import Column, String, Integer, DateTime, Index
 from core.database import Base
 
 class MessageModel(Base):
@@ -12,3 +12,9 @@ class MessageModel(Base):
     word_count = Column(Integer, default=0, index=True)
     character_count = Column(Integer, default=0)
     processed_at = Column(DateTime)
+
+    __table_args__ = (
+        # paginación por cursor: rango (timestamp, message_id) dentro de la sesión, con y sin filtro de remitente
+        Index("ix_messages_session_sender_timestamp_id", "session_id", "sender", "timestamp", "message_id"),
+        Index("ix_messages_session_timestamp_id", "session_id", "timestamp", "message_id"),
+    )
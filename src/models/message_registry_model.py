@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, DateTime
+from core.database import Base
+
+class MessageRegistryModel(Base):
+    """Registro de message_id en modo con shards (DATABASE_SHARDS): cada ID se reserva en el shard de su hash
+    antes de guardar el mensaje en el shard de su sesión, de modo que sea único entre todos los shards"""
+    __tablename__ = "message_registry"
+
+    message_id = Column(String, primary_key=True)
+    session_id = Column(String, nullable=False)
+    # momento de la reserva: una reserva antigua sin mensaje (caída entre los dos commits) puede reclamarse
+    claimed_at = Column(DateTime, nullable=False)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Integer
+from core.database import Base
+
+class SessionStatsModel(Base):
+    """Contadores de mensajes por sesión y remitente, actualizados en la misma transacción que el INSERT"""
+    __tablename__ = "session_stats"
+
+    session_id = Column(String, primary_key=True)
+    sender = Column(String, primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    # se incrementa en cada transacción que escribe en la sesión/remitente (ETag del GET de mensajes)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
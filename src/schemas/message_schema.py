@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import List, Literal, Optional
 from pydantic import BaseModel, validator, Field
 from core.exceptions import SenderMissingException
 from datetime import datetime
@@ -33,7 +33,30 @@ class MessageResponseSchema(BaseModel):
     status: str
     data: DataResponseSchema = Field(default_factory=DataResponseSchema)
 
+class MessageIngestResponseSchema(MessageResponseSchema):
+    # False si el message_id ya existía (on_conflict=ignore o replace)
+    created: bool = True
+
 class MessagesListSchema(BaseModel):
     messages: list[MessageResponseSchema] = []
     total: int = 0 
-    count: int = 0 
\ No newline at end of file
+    count: int = 0
+    next_cursor: Optional[str] = None
+
+class BatchItemErrorSchema(BaseModel):
+    code: str
+    message: str
+    details: list = []
+
+class BatchItemResultSchema(BaseModel):
+    message_id: str
+    status: Literal["accepted", "rejected"]
+    data: Optional[DataResponseSchema] = None
+    error: Optional[BatchItemErrorSchema] = None
+    # mensajes aceptados: True si se creó, False si el message_id ya existía (on_conflict=ignore o replace)
+    created: Optional[bool] = None
+
+class MessagesBatchResponseSchema(BaseModel):
+    results: List[BatchItemResultSchema] = []
+    accepted: int = 0
+    rejected: int = 0
@@ -0,0 +1,162 @@
+"""
+Trabajo de archivado: mueve los mensajes anteriores a una fecha de corte de la tabla messages al
+almacenamiento en frío (segmentos comprimidos en ARCHIVE_DIR). Se ejecuta desde src/, p. ej. con cron:
+
+    python -m services.archive --older-than-days 90
+    python -m services.archive --cutoff 2025-01-01T00:00:00
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, distinct, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from core.archive import SegmentStore, encode_block
+from models.archive_model import ArchiveBlockModel, ArchivedMessageIdModel
+from models.message_model import MessageModel
+from services.message_service import MESSAGE_COLUMNS
+
+# sesiones archivadas por transacción
+DEFAULT_BATCH_SESSIONS = 100
+# mensajes por bloque: una página lee solo los bloques que la cubren, no todo lo archivado de la sesión
+DEFAULT_BLOCK_MESSAGES = 500
+
+
+class MessageArchiveService:
+    """
+    Archiva los mensajes con timestamp anterior al corte, por lotes de sesiones:
+    1. Lee los mensajes del lote (transacción de lectura, sin bloquear a los escritores).
+    2. Escribe bloques comprimidos por sesión y remitente (de hasta block_messages mensajes consecutivos) en el
+       segmento y los sincroniza con el disco.
+    3. En una transacción registra los bloques en message_archive_blocks y los IDs en archived_message_ids,
+       y borra los mensajes de messages.
+    Si el proceso termina entre 2 y 3 los bloques quedan en el segmento sin índice y los mensajes siguen en
+    messages: el siguiente archivado los vuelve a escribir. session_stats no cambia (los totales, versiones y
+    ETags de las sesiones se mantienen).
+    """
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        store: SegmentStore,
+        prefix: str = "",
+        batch_sessions: int = DEFAULT_BATCH_SESSIONS,
+        block_messages: int = DEFAULT_BLOCK_MESSAGES,
+    ):
+        self.session_factory = session_factory
+        self.store = store
+        self.prefix = prefix
+        self.batch_sessions = batch_sessions
+        self.block_messages = block_messages
+
+    def archive_before(self, cutoff: datetime) -> Dict[str, int]:
+        """ Archiva los mensajes anteriores a cutoff; devuelve sesiones, mensajes, bloques y bytes escritos """
+        stats = {"sessions": 0, "messages": 0, "blocks": 0, "bytes": 0}
+        with self.session_factory() as db:
+            session_ids = db.execute(
+                select(distinct(MessageModel.session_id)).where(MessageModel.timestamp < cutoff)
+            ).scalars().all()
+        for start in range(0, len(session_ids), self.batch_sessions):
+            batch = self._archive_sessions(session_ids[start:start + self.batch_sessions], cutoff)
+            for key, value in batch.items():
+                stats[key] += value
+        return stats
+
+    def _archive_sessions(self, session_ids: Sequence[str], cutoff: datetime) -> Dict[str, int]:
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(*MESSAGE_COLUMNS)
+                .where(MessageModel.session_id.in_(session_ids), MessageModel.timestamp < cutoff)
+                .order_by(MessageModel.session_id, MessageModel.sender, MessageModel.timestamp,
+                          MessageModel.message_id)
+            ).all()
+        if not rows:
+            return {}
+
+        blocks: List[dict] = []
+        for (session_id, sender), group in groupby(rows, key=lambda row: (row.session_id, row.sender)):
+            group = list(group)
+            for start in range(0, len(group), self.block_messages):
+                chunk = group[start:start + self.block_messages]
+                segment, offset, length, crc = self.store.append(self.prefix, encode_block(chunk))
+                blocks.append({
+                    "session_id": session_id,
+                    "sender": sender,
+                    "segment": segment,
+                    "offset": offset,
+                    "length": length,
+                    "crc32": crc,
+                    "message_count": len(chunk),
+                    "first_timestamp": chunk[0].timestamp,
+                    "last_timestamp": chunk[-1].timestamp,
+                })
+        self.store.sync()
+
+        message_ids = [row.message_id for row in rows]
+        with self.session_factory() as db:
+            db.execute(insert(ArchiveBlockModel), blocks)
+            db.execute(insert(ArchivedMessageIdModel), [{"message_id": message_id} for message_id in message_ids])
+            for start in range(0, len(message_ids), 500):
+                db.execute(delete(MessageModel).where(MessageModel.message_id.in_(message_ids[start:start + 500])))
+            db.commit()
+        return {
+            "sessions": len({block["session_id"] for block in blocks}),
+            "messages": len(rows),
+            "blocks": len(blocks),
+            "bytes": sum(block["length"] for block in blocks),
+        }
+
+
+def parse_cutoff(args) -> datetime:
+    if args.cutoff:
+        cutoff = datetime.fromisoformat(args.cutoff)
+    else:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    # los timestamps se guardan sin zona horaria (UTC)
+    if cutoff.tzinfo is not None:
+        cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None)
+    return cutoff
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Archiva los mensajes antiguos en el almacenamiento en frío")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--older-than-days", type=float, help="Archivar los mensajes con más de N días")
+    group.add_argument("--cutoff", help="Archivar los mensajes anteriores a esta fecha (ISO 8601)")
+    parser.add_argument("--batch-sessions", type=int, default=DEFAULT_BATCH_SESSIONS)
+    parser.add_argument("--block-messages", type=int, default=DEFAULT_BLOCK_MESSAGES,
+                        help="Máximo de mensajes por bloque comprimido")
+    args = parser.parse_args(argv)
+
+    # después de load_dotenv: los módulos leen la configuración al importarse
+    from core.archive import ARCHIVE_ENABLED, get_archive_store
+    from core.database import SessionLocal, init_db, shards
+    if not ARCHIVE_ENABLED:
+        print("ARCHIVE_ENABLED=false: la API no leería los mensajes archivados", file=sys.stderr)
+        return 1
+
+    cutoff = parse_cutoff(args)
+    store = get_archive_store()
+    targets = [("", SessionLocal)] if shards is None else [
+        (f"shard{shard}", session_factory) for shard, session_factory in enumerate(shards.session_factories)
+    ]
+    try:
+        with store.lock():
+            for prefix, session_factory in targets:
+                init_db(session_factory.kw["bind"])
+                stats = MessageArchiveService(
+                    session_factory, store, prefix, args.batch_sessions, args.block_messages
+                ).archive_before(cutoff)
+                print(f"{prefix or 'messages'}: {stats['messages']} mensajes de {stats['sessions']} sesiones "
+                      f"archivados en {stats['blocks']} bloques ({stats['bytes']} bytes)")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
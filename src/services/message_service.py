@@ -1,23 +1,362 @@
+import asyncio
+import base64
+import hashlib
+import heapq
 import json
 import os
 import string
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
 import pytz
-from typing import List, Optional
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Tuple, get_args
 
 from fuzzywuzzy import fuzz
+from sqlalchemy import func, insert, select, tuple_, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session
 
-from core.exceptions import BannedWordException, DatabaseException
+from core.archive import ArchivedRow, SegmentStore
+from core.bloom import MessageIdFilter
+from core.cache import SessionPageCache
+from core.corpus import CorpusStore, get_corpus_store, load_corpus_file
+from core.corpus_artifact import CorpusArtifact
+from core.exceptions import BannedWordException, DatabaseException, InvalidCursorException
+from core.metrics import stage_timer
+from models.archive_model import ArchiveBlockModel, ArchivedMessageIdModel
 from models.message_model import MessageModel
-from schemas.message_schema import MessageRequestSchema, MessageResponseSchema, Metadata, DataResponseSchema
+from models.session_stats_model import SessionStatsModel
+from schemas.message_schema import (
+    MessageRequestSchema, MessageResponseSchema, Metadata, DataResponseSchema,
+    BatchItemErrorSchema, BatchItemResultSchema
+)
+
+try:
+    # incluido con fuzzywuzzy[speedup]; distancia indel (inserción/borrado) implementada en C
+    from Levenshtein import distance as _levenshtein_distance
+
+    def _indel_distance(a: str, b: str) -> int:
+        return _levenshtein_distance(a, b, weights=(1, 1, 2))
+except ImportError:  # pragma: no cover
+    def _indel_distance(a: str, b: str) -> int:
+        previous = [0] * (len(b) + 1)
+        for ca in a:
+            current = [0]
+            for j, cb in enumerate(b):
+                current.append(previous[j] + 1 if ca == cb else max(previous[j + 1], current[j]))
+            previous = current
+        return len(a) + len(b) - 2 * previous[-1]
+
+
+def _max_possible_ratio(len_a: int, len_b: int) -> float:
+    """ Cota superior de fuzz.ratio para dos longitudes: 100 * 2 * min / (len_a + len_b) """
+    return 200.0 * min(len_a, len_b) / (len_a + len_b)
+
+
+def encode_cursor(timestamp: datetime, message_id: str) -> str:
+    """ Cursor opaco (base64 url-safe) con la posición (timestamp, message_id) del último mensaje """
+    raw = json.dumps([timestamp.isoformat(), message_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """ Decodifica un cursor generado por encode_cursor; lanza InvalidCursorException si no es válido """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, message_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), str(message_id)
+    except (ValueError, TypeError):
+        raise InvalidCursorException(cursor)
+
+
+def session_page_etag(
+    session_id: str, sender: Optional[str], cursor: Optional[str], offset: int, limit: int, total: int, version: int
+) -> str:
+    """ ETag de una página: cambia con la versión de la sesión (session_stats) y con los parámetros de la consulta """
+    raw = json.dumps([session_id, sender, cursor, offset, limit, total, version], separators=(",", ":"))
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=12).hexdigest() + '"'
+
+
+# columnas de un mensaje en el orden de las filas (tuplas) leídas sin construir objetos ORM
+MESSAGE_COLUMNS = (
+    MessageModel.message_id,
+    MessageModel.session_id,
+    MessageModel.content,
+    MessageModel.timestamp,
+    MessageModel.sender,
+    MessageModel.word_count,
+    MessageModel.character_count,
+    MessageModel.processed_at,
+)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def page_key(row) -> Tuple[datetime, str]:
+    """ Posición de un mensaje (ORM, fila o ArchivedRow) en el orden de las páginas """
+    return row.timestamp, row.message_id
+
+
+def interleave_rows(cold: List[ArchivedRow], start: int, rows: Iterable) -> Tuple[list, int]:
+    """ Intercala las filas archivadas (cold, desde start) con un bloque de filas ordenadas de la tabla
+        messages; devuelve las filas en orden y la posición de la siguiente fila archivada """
+    merged = []
+    for row in rows:
+        key = page_key(row)
+        while start < len(cold) and page_key(cold[start]) < key:
+            merged.append(cold[start])
+            start += 1
+        merged.append(row)
+    return merged, start
+
+
+def message_row_to_dict(row: tuple) -> dict:
+    """ Convierte una fila de MESSAGE_COLUMNS en el mismo diccionario que DataResponseSchema serializado """
+    message_id, session_id, content, timestamp, sender, word_count, character_count, processed_at = row
+    return {
+        "message_id": message_id,
+        "session_id": session_id,
+        "content": content,
+        "timestamp": _isoformat(timestamp),
+        "sender": sender,
+        "metadata": {
+            "word_count": word_count,
+            "character_count": character_count,
+            "processed_at": _isoformat(processed_at),
+        },
+    }
+
+
+def encode_messages_page(rows: Iterable[tuple], total: int, next_cursor: Optional[str]) -> bytes:
+    """ Codifica una página de filas de MESSAGE_COLUMNS con la misma forma JSON que MessagesListSchema,
+        sin construir ni validar un modelo Pydantic por fila """
+    with stage_timer("serialization"):
+        messages = [{"status": "success", "data": message_row_to_dict(row)} for row in rows]
+        return json.dumps(
+            {"messages": messages, "total": total, "count": len(messages), "next_cursor": next_cursor},
+            ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+
+def encode_ndjson_rows(rows: Iterable[tuple]) -> bytes:
+    """ Codifica filas de MESSAGE_COLUMNS como líneas JSON (NDJSON) """
+    return b"".join(
+        json.dumps(message_row_to_dict(row), ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+        for row in rows
+    )
+
+
+class BannedWordMatcher(ABC):
+    """
+    Motor de búsqueda de palabras prohibidas sobre un corpus normalizado.
+    find() devuelve la misma palabra que el recorrido tokens x corpus con fuzz.ratio:
+    la primera del corpus (por orden) que coincide con el primer token que tenga alguna coincidencia.
+    Cada motor implementa _match_token_uncached; los indexados memorizan _match_token por token.
+    """
+    def __init__(self, words: Sequence[str], threshold: int):
+        self.words = tuple(words)
+        self.threshold = threshold
+        # cota conservadora: fuzz.ratio redondea, 79.5 puede convertirse en 80
+        self._min_bound = threshold - 0.5 - 1e-9
+
+    @abstractmethod
+    def _match_token_uncached(self, token: str) -> Optional[int]:
+        """ Índice en el corpus de la primera palabra similar al token, o None """
+
+    def _match_token(self, token: str) -> Optional[int]:
+        return self._match_token_uncached(token)
+
+    def find(self, tokens: Iterable[str]) -> Optional[str]:
+        seen = set()
+        for token in tokens:
+            if token in seen:
+                continue
+            seen.add(token)
+            index = self._match_token(token)
+            if index is not None:
+                return self.words[index]
+        return None
+
+
+class LinearMatcher(BannedWordMatcher):
+    """ Recorrido completo del corpus por token: O(tokens x corpus) """
+    def _match_token_uncached(self, token: str) -> Optional[int]:
+        for index, banned in enumerate(self.words):
+            if fuzz.ratio(token, banned) >= self.threshold:
+                return index
+        return None
+
+
+class LengthBucketMatcher(BannedWordMatcher):
+    """
+    Índice por longitud: solo compara el token con palabras cuya longitud permite
+    alcanzar el umbral, y memoriza el resultado de los tokens frecuentes.
+    """
+    def __init__(self, words: Sequence[str], threshold: int, cache_size: int = 65536):
+        super().__init__(words, threshold)
+        self._exact: Dict[str, int] = {}
+        buckets: Dict[int, List[Tuple[int, str]]] = {}
+        for index, word in enumerate(self.words):
+            if not word:
+                continue
+            self._exact.setdefault(word, index)
+            buckets.setdefault(len(word), []).append((index, word))
+        self._buckets = buckets
+        self._lengths_cache: Dict[int, Tuple[List[Tuple[int, str]], ...]] = {}
+        self._match_token = lru_cache(maxsize=cache_size)(self._match_token_uncached)
+
+    def _candidate_buckets(self, length: int) -> Tuple[List[Tuple[int, str]], ...]:
+        candidates = self._lengths_cache.get(length)
+        if candidates is None:
+            candidates = tuple(
+                bucket for bucket_length, bucket in self._buckets.items()
+                if _max_possible_ratio(length, bucket_length) >= self._min_bound
+            )
+            self._lengths_cache[length] = candidates
+        return candidates
+
+    def _match_token_uncached(self, token: str) -> Optional[int]:
+        best = self._exact.get(token)
+        for bucket in self._candidate_buckets(len(token)):
+            for index, banned in bucket:
+                # cada bucket está ordenado por índice: no hay mejores candidatos después
+                if best is not None and index >= best:
+                    break
+                if fuzz.ratio(token, banned) >= self.threshold:
+                    best = index
+                    break
+        return best
+
+
+class BKTreeMatcher(BannedWordMatcher):
+    """
+    BK-tree sobre la distancia indel (la que usa fuzz.ratio con python-Levenshtein).
+    La consulta usa el radio máximo compatible con el umbral y verifica con fuzz.ratio.
+    """
+    def __init__(self, words: Sequence[str], threshold: int, cache_size: int = 65536):
+        super().__init__(words, threshold)
+        # nodo: [palabra, índice, {distancia: hijo}]
+        self._root = None
+        self._max_length = 0
+        for index, word in enumerate(self.words):
+            if word:
+                self._insert(word, index)
+                self._max_length = max(self._max_length, len(word))
+        self._match_token = lru_cache(maxsize=cache_size)(self._match_token_uncached)
+
+    def _insert(self, word: str, index: int) -> None:
+        if self._root is None:
+            self._root = [word, index, {}]
+            return
+        node = self._root
+        while True:
+            d = _indel_distance(word, node[0])
+            if d == 0:
+                return  # palabra repetida: se conserva el primer índice
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [word, index, {}]
+                return
+            node = child
+
+    def _radius(self, length: int) -> int:
+        """ Distancia indel máxima con la que alguna palabra del corpus puede alcanzar el umbral """
+        ratio = self._min_bound / 100.0
+        longest = min(self._max_length, int(length * (2.0 - ratio) / ratio) + 1)
+        return int((1.0 - ratio) * (length + longest))
+
+    def _match_token_uncached(self, token: str) -> Optional[int]:
+        if self._root is None:
+            return None
+        radius = self._radius(len(token))
+        best = None
+        stack = [self._root]
+        while stack:
+            word, index, children = stack.pop()
+            d = _indel_distance(token, word)
+            if (d <= radius and (best is None or index < best)
+                    and fuzz.ratio(token, word) >= self.threshold):
+                best = index
+            for child_d, child in children.items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        return best
+
+    def flatten(self) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int]]]:
+        """ Árbol en tablas planas, en anchura (raíz = nodo 0), para el artefacto del corpus:
+            nodos (índice de la palabra, primera arista, número de aristas) y aristas (distancia, nodo hijo) """
+        nodes, edges = [], []
+        queue = [self._root] if self._root is not None else []
+        for _, index, children in queue:
+            nodes.append((index, len(edges), len(children)))
+            for child_d in sorted(children):
+                edges.append((child_d, len(queue)))
+                queue.append(children[child_d])
+        return nodes, edges
+
+
+class MappedBKTreeMatcher(BKTreeMatcher):
+    """
+    BK-tree leído directamente del artefacto precompilado del corpus (mmap compartido entre workers):
+    no construye el árbol ni copia las palabras al proceso; mismas coincidencias que BKTreeMatcher.
+    """
+    def __init__(self, artifact: CorpusArtifact, threshold: int, cache_size: int = 65536):
+        BannedWordMatcher.__init__(self, (), threshold)
+        self.words = artifact.words
+        self._artifact = artifact
+        self._max_length = artifact.max_length
+        self._match_token = lru_cache(maxsize=cache_size)(self._match_token_uncached)
+
+    def _match_token_uncached(self, token: str) -> Optional[int]:
+        artifact = self._artifact
+        nodes, offsets, blob = artifact.nodes, artifact.words.offsets, artifact.words.blob
+        distances, children = artifact.edge_distances, artifact.edge_nodes
+        if not nodes:
+            return None
+        radius = self._radius(len(token))
+        best = None
+        stack = [0]
+        while stack:
+            node = 3 * stack.pop()
+            index, first, count = nodes[node], nodes[node + 1], nodes[node + 2]
+            # decodificación en línea (sin pasar por words[index]): es el camino caliente
+            word = str(blob[offsets[index]:offsets[index + 1]], "utf-8")
+            d = _indel_distance(token, word)
+            if (d <= radius and (best is None or index < best)
+                    and fuzz.ratio(token, word) >= self.threshold):
+                best = index
+            if count:
+                # aristas ordenadas por distancia: los hijos en [d - radio, d + radio] son un rango contiguo
+                low = bisect_left(distances, d - radius, first, first + count)
+                stack.extend(children[low:bisect_right(distances, d + radius, low, first + count)])
+        return best
+
+
+# motores disponibles, seleccionables con la variable BANNED_WORD_MATCHER
+MATCHER_ENGINES = {
+    "linear": LinearMatcher,
+    "length": LengthBucketMatcher,
+    "bktree": BKTreeMatcher,
+}
+# motores que leen su índice del artefacto precompilado del corpus (el resto se construye con sus palabras)
+ARTIFACT_MATCHER_ENGINES = {
+    "bktree": MappedBKTreeMatcher,
+}
 
 class MessageProcessingService:
     """
     Servicio para procesar mensajes, esta clase se encarga de:
     - Validar y filtrar palabras prohibidas usando un corpus con similitud.
     - Añadir metadatos: conteo de palabras, caracteres y timestamp de procesamiento.
+    La app usa una única instancia por proceso: tras el __init__ no guarda estado mutable,
+    por lo que puede compartirse entre hilos.
     """
     def __init__(self):
         """
@@ -25,25 +364,45 @@ class MessageProcessingService:
         """
         self.corpus_filter_path =  os.getenv('CORPUS_FILE_PATH', os.path.join('data', 'corpus_filter.json'))
         self.similarity_threshold = 80
+        self.matcher_engine = os.getenv('BANNED_WORD_MATCHER', 'bktree')
+        if self.matcher_engine not in MATCHER_ENGINES:
+            raise ValueError(f"Motor de búsqueda desconocido: '{self.matcher_engine}'")
         self._punctuation_table = str.maketrans('', '', string.punctuation)
         self.tz = self._get_timezone()
+        self.corpus_store: CorpusStore = get_corpus_store(self.corpus_filter_path)
 
     def _load_corpus(self) -> dict:
         """ Carga el corpus de palabras prohibidas desde un archivo JSON en la carpeta data/ """
-        with open(self.corpus_filter_path, 'r') as f:
-            return json.load(f)
+        return load_corpus_file(self.corpus_filter_path)
+
+    def reload_corpus(self) -> None:
+        """ Fuerza la recarga del corpus compartido desde disco """
+        self.corpus_store.reload()
     
     def _contains_banned_words(self, message: str) -> bool:
-        """ Verifica si el mensaje contiene palabras prohibidas con similitud usando fuzzy matching """
-        corpus = self._load_corpus()
-        banned_words = [w.lower() for w in corpus.get("banned_words", [])]
-        message = message.translate(self._punctuation_table)
-        tokens = message.lower().split()
-        for token in tokens:
-            for banned in banned_words:
-                if fuzz.ratio(token, banned) >= self.similarity_threshold:
-                    return banned
-        return None
+        """ Verifica si el mensaje contiene palabras prohibidas con similitud usando fuzzy matching.
+            El corpus se obtiene del CorpusStore del proceso, sin leer el archivo en cada mensaje. """
+        with stage_timer("banned_word_scan"):
+            message = message.translate(self._punctuation_table)
+            tokens = message.lower().split()
+            return self._get_matcher().find(tokens)
+
+    def _get_matcher(self) -> BannedWordMatcher:
+        """ Matcher del corpus vigente; se construye una vez por versión del corpus y motor """
+        engine = MATCHER_ENGINES[self.matcher_engine]
+        threshold = self.similarity_threshold
+        snapshot = self.corpus_store.get()
+        if snapshot.artifact is not None and self.matcher_engine in ARTIFACT_MATCHER_ENGINES:
+            # índice precompilado del artefacto: solo se lee del mmap, no se construye
+            mapped = ARTIFACT_MATCHER_ENGINES[self.matcher_engine]
+            return snapshot.compiled(
+                f"{self.matcher_engine}:{threshold}",
+                lambda words: mapped(snapshot.artifact, threshold)
+            )
+        return snapshot.compiled(
+            f"{self.matcher_engine}:{threshold}",
+            lambda words: engine(words, threshold)
+        )
     
     def _get_timezone(self) -> timezone:
         """ Obtiene la zona horaria configurada en las variables de entorno """
@@ -93,12 +452,178 @@ class MessageProcessingService:
 
         return response
 
+    def process_batch(self, messages: List[MessageRequestSchema]) -> List[BatchItemResultSchema]:
+        """ Procesa un lote de mensajes sin interrumpirse por los rechazados
+            Entrada:
+            - Lista de MessageRequestSchema
+            Salida:
+            - Lista de BatchItemResultSchema en el mismo orden (accepted con data o rejected con error)
+        """
+        results = []
+        for message_data in messages:
+            try:
+                processed = self.process_message(message_data)
+            except BannedWordException as exc:
+                results.append(BatchItemResultSchema(
+                    message_id=message_data.message_id,
+                    status="rejected",
+                    error=BatchItemErrorSchema(**exc.detail["error"])
+                ))
+            else:
+                results.append(BatchItemResultSchema(
+                    message_id=message_data.message_id,
+                    status="accepted",
+                    data=processed.data
+                ))
+        return results
+
+# políticas de ingesta idempotente ante un message_id existente (?on_conflict= o INGEST_CONFLICT_POLICY):
+# - "reject": el mensaje se rechaza como duplicado
+# - "ignore": se conserva el mensaje guardado y el nuevo se acepta con created=False
+# - "replace": el nuevo reemplaza al guardado si es de la misma sesión y remitente (created=False)
+# Sin política la ingesta es la habitual (comprobación de duplicados, IntegrityError y escritor write-behind).
+ConflictPolicy = Literal["reject", "ignore", "replace"]
+CONFLICT_POLICIES = get_args(ConflictPolicy)
+DEFAULT_CONFLICT_POLICY = os.getenv("INGEST_CONFLICT_POLICY") or None
+
+
+def validate_conflict_policy_setting() -> None:
+    """ Valida INGEST_CONFLICT_POLICY; se llama al arrancar la app (importar el módulo no falla) """
+    if DEFAULT_CONFLICT_POLICY not in (None, *CONFLICT_POLICIES):
+        raise RuntimeError(
+            f"INGEST_CONFLICT_POLICY='{DEFAULT_CONFLICT_POLICY}' no es válida: use {', '.join(CONFLICT_POLICIES)} "
+            "o déjela vacía"
+        )
+
+
+# INSERT de la ingesta idempotente: omite los IDs existentes y devuelve los insertados; sentencia fija
+_INSERT_NEW_STATEMENT = (
+    sqlite_insert(MessageModel)
+    .on_conflict_do_nothing(index_elements=[MessageModel.message_id])
+    .returning(MessageModel.message_id)
+)
+
+
+def reject_result(result: BatchItemResultSchema, code: str, message: str) -> None:
+    """ Marca como rechazado el resultado de un mensaje de un lote """
+    result.status = "rejected"
+    result.data = None
+    result.created = None
+    result.error = BatchItemErrorSchema(code=code, message=message)
+
+
+def reject_conflict(result: BatchItemResultSchema, policy: str) -> None:
+    """ Resuelve un message_id existente que no se reemplazó: aceptado sin crear (ignore) o rechazado """
+    if policy == "ignore":
+        result.created = False
+    elif policy == "replace":
+        reject_result(result, "DUPLICATE_MESSAGE_ID",
+                      f"El mensaje con ID '{result.message_id}' ya existe en otra sesión o remitente, o está archivado")
+    else:
+        reject_result(result, "DUPLICATE_MESSAGE_ID", f"El mensaje con ID '{result.message_id}' ya existe")
+
+
 class MessageStorageService:
     """
     Servicio para almacenar mensajes procesados en la base de datos.
     """
-    def __init__(self, db: Session):
+    # máximo de parámetros por consulta IN al comprobar duplicados
+    _lookup_chunk_size = 500
+
+    def __init__(
+        self,
+        db: Session,
+        page_cache: Optional[SessionPageCache] = None,
+        id_filter: Optional[MessageIdFilter] = None,
+    ):
         self.db = db
+        self.page_cache = page_cache
+        self.id_filter = id_filter
+
+    def _invalidate_pages(self, rows: List[dict]) -> None:
+        """ Invalida las páginas en caché de las sesiones escritas (tras el commit) """
+        if self.page_cache is not None:
+            for session_id in {row["session_id"] for row in rows}:
+                self.page_cache.invalidate_session(session_id)
+
+    def _remember_ids(self, message_ids: Iterable[str]) -> None:
+        """ Añade al filtro Bloom los IDs guardados (tras el commit) o que ya existían """
+        if self.id_filter is not None:
+            self.id_filter.add_many(message_ids)
+
+    def _filter_candidates(self, message_ids: List[str]) -> Tuple[List[str], int]:
+        """ IDs que hay que consultar en la base de datos (todos sin filtro Bloom) y consultas evitadas """
+        if self.id_filter is None:
+            return message_ids, 0
+        candidates = self.id_filter.candidates(message_ids)
+        chunk = self._lookup_chunk_size
+        return candidates, -(-len(message_ids) // chunk) - -(-len(candidates) // chunk)
+
+    def _duplicate_message(self, message_id: str) -> bool:
+        """ Con filtro Bloom: si el mensaje ya existe, para rechazarlo sin INSERT ni rollback.
+            Solo consulta la base de datos si el filtro no descarta el ID; sin filtro devuelve False
+            (el INSERT falla con IntegrityError). """
+        if self.id_filter is None or message_id not in self.id_filter.candidates([message_id]):
+            return False
+        found = self.db.execute(self._existing_ids_query([message_id])).first() is not None
+        self.id_filter.record_lookup(1, int(found), saved=int(found))
+        return found
+
+    @staticmethod
+    def _message_to_row(data: DataResponseSchema) -> dict:
+        """ Convierte los datos de un mensaje procesado en las columnas de MessageModel """
+        return {
+            "message_id": data.message_id,
+            "session_id": data.session_id,
+            "content": data.content,
+            "timestamp": data.timestamp,
+            "sender": data.sender,
+            "word_count": data.metadata.word_count,
+            "character_count": data.metadata.character_count,
+            "processed_at": data.metadata.processed_at,
+        }
+
+    @staticmethod
+    def _session_stats_increment(rows: List[dict], counted: bool = True):
+        """ UPSERT que suma los mensajes insertados a los contadores por (session_id, sender)
+            e incrementa su versión. Devuelve (sentencia, parámetros) para ejecutarse en la misma
+            transacción que el INSERT. Con counted=False (mensajes reemplazados) solo cambia la versión. """
+        counts = Counter((row["session_id"], row["sender"]) for row in rows)
+        if not counted:
+            counts = {key: 0 for key in counts}
+        stmt = sqlite_insert(SessionStatsModel)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SessionStatsModel.session_id, SessionStatsModel.sender],
+            set_={
+                "message_count": SessionStatsModel.message_count + stmt.excluded.message_count,
+                "version": SessionStatsModel.version + 1,
+            }
+        )
+        params = [
+            {"session_id": session_id, "sender": sender, "message_count": count, "version": 1}
+            for (session_id, sender), count in counts.items()
+        ]
+        return stmt, params
+
+    @staticmethod
+    def rebuild_session_stats(db: Session) -> int:
+        """ Recalcula session_stats a partir de la tabla messages y de los bloques archivados
+            (p. ej. en bases anteriores a la tabla). Devuelve el número de filas de estadísticas generadas. """
+        counts = union_all(
+            select(MessageModel.session_id, MessageModel.sender, func.count().label("messages"))
+            .group_by(MessageModel.session_id, MessageModel.sender),
+            select(ArchiveBlockModel.session_id, ArchiveBlockModel.sender,
+                   func.sum(ArchiveBlockModel.message_count).label("messages"))
+            .group_by(ArchiveBlockModel.session_id, ArchiveBlockModel.sender),
+        ).subquery()
+        db.query(SessionStatsModel).delete()
+        db.execute(insert(SessionStatsModel).from_select(
+            ["session_id", "sender", "message_count", "version"],
+            select(counts.c.session_id, counts.c.sender, func.sum(counts.c.messages), func.sum(counts.c.messages))
+            .group_by(counts.c.session_id, counts.c.sender)
+        ))
+        db.commit()
+        return db.query(SessionStatsModel).count()
 
     def save_message(self, message: MessageResponseSchema) -> MessageModel: 
         """ Almacena el mensaje procesado en la base de datos.
@@ -109,23 +634,24 @@ class MessageStorageService:
             - MessageModel (objeto ORM)
         """
         try:
-            db_message = MessageModel(
-                message_id=message.data.message_id,
-                session_id=message.data.session_id,
-                content=message.data.content,
-                timestamp=message.data.timestamp,
-                sender=message.data.sender,
-                word_count=message.data.metadata.word_count,
-                character_count=message.data.metadata.character_count,
-                processed_at=message.data.metadata.processed_at
-            )
+            if self._duplicate_message(message.data.message_id):
+                raise DatabaseException(f"Error de integridad: mensaje con ID '{message.data.message_id}' ya existe")
+            row = self._message_to_row(message.data)
+            db_message = MessageModel(**row)
             self.db.add(db_message)
+            self.db.execute(*self._session_stats_increment([row]))
             self.db.commit()
+            self._invalidate_pages([row])
+            self._remember_ids([row["message_id"]])
             self.db.refresh(db_message)
             return db_message
-            
+
+        except DatabaseException:
+            raise
+
         except IntegrityError as e:
             self.db.rollback()  
+            self._remember_ids([message.data.message_id])
             raise DatabaseException(f"Error de integridad: mensaje con ID '{message.data.message_id}' ya existe")
             
         except SQLAlchemyError as e:
@@ -136,10 +662,174 @@ class MessageStorageService:
             self.db.rollback()
             raise DatabaseException(f"Error inesperado al almacenar el mensaje: {str(e)}")
 
+    @staticmethod
+    def _existing_ids_query(message_ids: List[str]):
+        """ IDs que ya existen en messages o en el almacenamiento en frío (archived_message_ids) """
+        return union_all(
+            select(MessageModel.message_id).where(MessageModel.message_id.in_(message_ids)),
+            select(ArchivedMessageIdModel.message_id).where(ArchivedMessageIdModel.message_id.in_(message_ids)),
+        )
+
+    def _existing_message_ids(self, message_ids: List[str], use_filter: bool = True) -> set:
+        """ Devuelve los IDs que ya existen en la base de datos.
+            Con filtro Bloom (y use_filter) solo se consultan los IDs que el filtro no descarta. """
+        candidates, saved = self._filter_candidates(message_ids) if use_filter else (message_ids, 0)
+        existing = set()
+        for start in range(0, len(candidates), self._lookup_chunk_size):
+            chunk = candidates[start:start + self._lookup_chunk_size]
+            existing.update(self.db.execute(self._existing_ids_query(chunk)).scalars())
+        if use_filter and self.id_filter is not None:
+            self.id_filter.record_lookup(len(candidates), len(existing), saved)
+        return existing
+
+    def _plan_batch(self, accepted: List[BatchItemResultSchema], existing: set) -> List[dict]:
+        """ Marca como rechazados los IDs existentes o repetidos y devuelve las filas a insertar """
+        rows = []
+        for result in accepted:
+            if result.message_id in existing:
+                reject_conflict(result, "reject")
+                continue
+            existing.add(result.message_id)
+            result.created = True
+            rows.append(self._message_to_row(result.data))
+        return rows
+
+    def save_batch(self, results: List[BatchItemResultSchema]) -> List[BatchItemResultSchema]:
+        """ Almacena los mensajes aceptados de un lote con un único INSERT masivo y un solo commit.
+            Los IDs que ya existen (en la base de datos o repetidos en el lote) se marcan como rechazados.
+            Lanza DatabaseException en caso de errores.
+            Entrada:
+            - Lista de BatchItemResultSchema (salida de MessageProcessingService.process_batch)
+            Salida:
+            - La misma lista con el estado final de cada mensaje
+        """
+        accepted = [result for result in results if result.status == "accepted"]
+        if not accepted:
+            return results
+        try:
+            existing = self._existing_message_ids(list({result.message_id for result in accepted}))
+            try:
+                self._insert_batch(self._plan_batch(accepted, existing))
+            except IntegrityError:
+                if self.id_filter is None:
+                    raise
+                # el filtro Bloom descartó un ID guardado por otro proceso: se repite la comprobación sin filtro
+                self.db.rollback()
+                pending = [result for result in accepted if result.status == "accepted"]
+                existing = self._existing_message_ids([result.message_id for result in pending], use_filter=False)
+                self._remember_ids(existing)
+                self._insert_batch(self._plan_batch(pending, existing))
+            return results
+
+        except IntegrityError as e:
+            self.db.rollback()
+            raise DatabaseException("Error de integridad: uno o más mensajes del lote ya existen")
+
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+
+    @staticmethod
+    def _split_upserted(accepted: List[BatchItemResultSchema], rows: List[dict], inserted: set):
+        """ Separa los mensajes insertados (la primera aparición de cada ID insertado, created=True) de los
+            que chocaron con un message_id existente. Devuelve (filas insertadas, [(resultado, fila)]) """
+        created, conflicts, seen = [], [], set()
+        for result, row in zip(accepted, rows):
+            if row["message_id"] in inserted and row["message_id"] not in seen:
+                seen.add(row["message_id"])
+                result.created = True
+                created.append(row)
+            else:
+                conflicts.append((result, row))
+        return created, conflicts
+
+    @staticmethod
+    def _replace_statement(row: dict):
+        """ UPDATE del mensaje guardado con el mismo ID, sesión y remitente; devuelve su ID si existía """
+        return (
+            update(MessageModel)
+            .where(MessageModel.message_id == row["message_id"], MessageModel.session_id == row["session_id"],
+                   MessageModel.sender == row["sender"])
+            .values(content=row["content"], timestamp=row["timestamp"], word_count=row["word_count"],
+                    character_count=row["character_count"], processed_at=row["processed_at"])
+            .returning(MessageModel.message_id)
+        )
+
+    def _insert_new_rows(self, rows: List[dict]) -> Tuple[set, set]:
+        """ INSERT ... ON CONFLICT DO NOTHING de las filas; devuelve (IDs insertados, IDs archivados).
+            Un ID archivado hace fallar el INSERT (trigger): se excluyen los archivados y se repite. """
+        try:
+            return set(self.db.execute(_INSERT_NEW_STATEMENT, rows).scalars()), set()
+        except IntegrityError:
+            self.db.rollback()
+            archived = set(self.db.execute(
+                select(ArchivedMessageIdModel.message_id)
+                .where(ArchivedMessageIdModel.message_id.in_({row["message_id"] for row in rows}))
+            ).scalars())
+            rows = [row for row in rows if row["message_id"] not in archived]
+            return set(self.db.execute(_INSERT_NEW_STATEMENT, rows).scalars()) if rows else set(), archived
+
+    def upsert_batch(self, results: List[BatchItemResultSchema], policy: str) -> List[BatchItemResultSchema]:
+        """ Ingesta idempotente de los mensajes aceptados de un lote, con INSERT ... ON CONFLICT DO NOTHING,
+            el UPSERT de session_stats (y los UPDATE de "replace") en un solo commit. Los message_id existentes
+            (o repetidos en el lote) se resuelven según policy (CONFLICT_POLICIES); cada mensaje aceptado indica
+            en created si se creó.
+            Lanza DatabaseException en caso de errores.
+        """
+        accepted = [result for result in results if result.status == "accepted"]
+        if not accepted:
+            return results
+        rows = [self._message_to_row(result.data) for result in accepted]
+        try:
+            inserted, archived = self._insert_new_rows(rows)
+            created, conflicts = self._split_upserted(accepted, rows, inserted)
+            replaced = []
+            for result, row in conflicts:
+                if (policy == "replace" and row["message_id"] not in archived
+                        and self.db.execute(self._replace_statement(row)).first() is not None):
+                    result.created = False
+                    replaced.append(row)
+                else:
+                    reject_conflict(result, policy)
+            if created:
+                self.db.execute(*self._session_stats_increment(created))
+            if replaced:
+                self.db.execute(*self._session_stats_increment(replaced, counted=False))
+            self.db.commit()
+
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+
+        self._invalidate_pages(created + replaced)
+        self._remember_ids(row["message_id"] for row in rows)
+        return results
+
+    def upsert_message(self, message: MessageResponseSchema, policy: str) -> bool:
+        """ Ingesta idempotente de un mensaje procesado (ver upsert_batch). Si el ID es nuevo son dos sentencias en
+            una transacción: el INSERT ... ON CONFLICT y el UPSERT de session_stats.
+            Devuelve si el mensaje se creó. Lanza DatabaseException si se rechaza.
+        """
+        result = BatchItemResultSchema(message_id=message.data.message_id, status="accepted", data=message.data)
+        self.upsert_batch([result], policy)
+        if result.status == "rejected":
+            raise DatabaseException(f"Error de integridad: {result.error.message}")
+        return result.created
+
+    def _insert_batch(self, rows: List[dict]) -> None:
+        if rows:
+            self.db.execute(insert(MessageModel), rows)
+            self.db.execute(*self._session_stats_increment(rows))
+            self.db.commit()
+            self._invalidate_pages(rows)
+            self._remember_ids(row["message_id"] for row in rows)
+
 class MessageRetrievalService:
-    """Servicio para recuperar mensajes de la base de datos según filtros"""
-    def __init__(self, db: Session):
+    """Servicio para recuperar mensajes de la base de datos según filtros.
+    Con un almacén en frío (archive) las páginas incluyen también los mensajes archivados de la sesión."""
+    def __init__(self, db: Session, archive: Optional[SegmentStore] = None):
         self.db = db
+        self.archive = archive
 
     def _convert_model_to_schema(self, model: MessageModel) -> MessageResponseSchema:
         """ Convierte un objeto ORM MessageModel a MessageResponseSchema """
@@ -161,27 +851,503 @@ class MessageRetrievalService:
             data=data
         )
 
+    # orden estable de las páginas; coincide con los índices compuestos de MessageModel
+    _page_order = (MessageModel.timestamp, MessageModel.message_id)
+
+    @staticmethod
+    def _session_filters(session_id: str, sender: Optional[str], cursor: Optional[str] = None) -> list:
+        """ Condiciones de filtrado por sesión, opcionalmente por remitente y posición del cursor """
+        filters = [MessageModel.session_id == session_id]
+        if sender:
+            filters.append(MessageModel.sender == sender)
+        if cursor:
+            timestamp, message_id = decode_cursor(cursor)
+            filters.append(tuple_(MessageModel.timestamp, MessageModel.message_id) > tuple_(timestamp, message_id))
+        return filters
+
+    @staticmethod
+    def _trim_page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+        """ Recorta las filas (limit + 1) a la página y calcula el cursor de la siguiente, si existe.
+            Acepta objetos ORM o filas de MESSAGE_COLUMNS (ambos exponen timestamp y message_id). """
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1].timestamp, rows[-1].message_id)
+        return rows, None
+
+    def _build_page(self, db_messages: list, limit: int) -> Tuple[List[MessageResponseSchema], Optional[str]]:
+        """ Convierte las filas (limit + 1) en la página y el cursor de la siguiente, si existe """
+        db_messages, next_cursor = self._trim_page(db_messages, limit)
+        return [self._convert_model_to_schema(msg) for msg in db_messages], next_cursor
+
+    @staticmethod
+    def _archive_blocks_query(session_id: str, sender: Optional[str], cursor: Optional[str]):
+        """ Bloques archivados de la sesión que pueden contener mensajes posteriores al cursor, por su primer
+            timestamp: (first_timestamp, segmento, offset, longitud, crc32) """
+        query = select(
+            ArchiveBlockModel.first_timestamp, ArchiveBlockModel.segment, ArchiveBlockModel.offset,
+            ArchiveBlockModel.length, ArchiveBlockModel.crc32
+        ).where(ArchiveBlockModel.session_id == session_id)
+        if sender:
+            query = query.where(ArchiveBlockModel.sender == sender)
+        if cursor:
+            query = query.where(ArchiveBlockModel.last_timestamp >= decode_cursor(cursor)[0])
+        return query.order_by(ArchiveBlockModel.first_timestamp, ArchiveBlockModel.id)
+
+    @staticmethod
+    def _filter_cold_rows(rows: List[ArchivedRow], sender: Optional[str], cursor: Optional[str]) -> List[ArchivedRow]:
+        """ Filas archivadas del remitente y posteriores al cursor, en el orden de las páginas """
+        position = decode_cursor(cursor) if cursor else None
+        rows = [
+            row for row in rows
+            if (not sender or row.sender == sender) and (position is None or page_key(row) > position)
+        ]
+        rows.sort(key=page_key)
+        return rows
+
+    def _read_cold_blocks(
+        self, blocks: list, sender: Optional[str], cursor: Optional[str], limit: Optional[int]
+    ) -> List[ArchivedRow]:
+        """ Lee los bloques (ordenados por first_timestamp) solo hasta tener las limit primeras filas posteriores
+            al cursor: las filas anteriores al primer timestamp del siguiente bloque ya no pueden cambiar de
+            posición. Sin limit lee todos. """
+        rows = []
+        for first_timestamp, *block in blocks:
+            if limit is not None and sum(row.timestamp < first_timestamp for row in rows) >= limit:
+                break
+            rows.extend(self._filter_cold_rows(self.archive.read(*block), sender, cursor))
+        rows.sort(key=page_key)
+        return rows if limit is None else rows[:limit]
+
+    def _cold_rows(
+        self, session_id: str, sender: Optional[str], cursor: Optional[str], limit: Optional[int] = None
+    ) -> List[ArchivedRow]:
+        """ Mensajes archivados de la sesión (vacío sin almacén en frío o si la sesión no tiene bloques);
+            con limit, solo los limit primeros posteriores al cursor """
+        if self.archive is None:
+            return []
+        blocks = self.db.execute(self._archive_blocks_query(session_id, sender, cursor)).all()
+        if not blocks:
+            return []
+        return self._read_cold_blocks(blocks, sender, cursor, limit)
+
+    @staticmethod
+    def _merge_page(hot: list, cold: List[ArchivedRow], offset: int, limit: int) -> list:
+        """ Página (limit + 1 filas desde offset) de la unión ordenada de las filas de messages (leídas desde
+            el principio, offset + limit + 1) y las archivadas """
+        return list(islice(heapq.merge(cold, hot, key=page_key), offset, offset + limit + 1))
+
+    def _page_rows_query(self, filters: list, limit: int, offset: int):
+        """ Consulta de la página (limit + 1 filas) que lee solo las columnas de MESSAGE_COLUMNS """
+        return (
+            select(*MESSAGE_COLUMNS)
+            .where(*filters)
+            .order_by(*self._page_order)
+            .offset(offset)
+            .limit(limit + 1)
+        )
+
+    def get_session_page(
+        self,
+        session_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        sender: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[MessageResponseSchema], Optional[str]]:
+        """ Recupera una página de mensajes ordenada por (timestamp, message_id).
+            Con cursor la consulta es un rango sobre el índice compuesto, sin recorrer las páginas anteriores.
+            Lanza InvalidCursorException si el cursor no es válido y DatabaseException en caso de errores.
+            Salida:
+            - (mensajes, next_cursor) donde next_cursor es None en la última página
+        """
+        filters = self._session_filters(session_id, sender, cursor)
+        try:
+            query = self.db.query(MessageModel).filter(*filters).order_by(*self._page_order)
+
+            cold = self._cold_rows(session_id, sender, cursor, offset + limit + 1)
+            if cold:
+                db_messages = self._merge_page(query.limit(offset + limit + 1).all(), cold, offset, limit)
+            else:
+                db_messages = query.offset(offset).limit(limit + 1).all()
+
+            return self._build_page(db_messages, limit)
+
+        except Exception as e:
+            raise DatabaseException(f"Error al recuperar mensajes de la sesión: {str(e)}")
+
+    def get_session_page_rows(
+        self,
+        session_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        sender: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[list, Optional[str]]:
+        """ Igual que get_session_page, pero devuelve filas de MESSAGE_COLUMNS (tuplas) sin objetos ORM
+            ni esquemas Pydantic, para codificarlas directamente con encode_messages_page.
+            Lanza InvalidCursorException si el cursor no es válido y DatabaseException en caso de errores.
+        """
+        filters = self._session_filters(session_id, sender, cursor)
+        try:
+            cold = self._cold_rows(session_id, sender, cursor, offset + limit + 1)
+            if cold:
+                hot = self.db.execute(self._page_rows_query(filters, offset + limit, 0)).all()
+                rows = self._merge_page(hot, cold, offset, limit)
+            else:
+                rows = self.db.execute(self._page_rows_query(filters, limit, offset)).all()
+            return self._trim_page(rows, limit)
+
+        except Exception as e:
+            raise DatabaseException(f"Error al recuperar mensajes de la sesión: {str(e)}")
+
+    @staticmethod
+    def _session_version_query(session_id: str, sender: Optional[str]):
+        """ Total y versión de la sesión desde session_stats (búsqueda por clave primaria) """
+        query = select(
+            func.coalesce(func.sum(SessionStatsModel.message_count), 0),
+            func.coalesce(func.sum(SessionStatsModel.version), 0)
+        ).where(SessionStatsModel.session_id == session_id)
+        if sender:
+            query = query.where(SessionStatsModel.sender == sender)
+        return query
+
+    def get_session_version(self, session_id: str, sender: Optional[str] = None) -> Tuple[int, int]:
+        """ (total, versión) de la sesión (y remitente); la versión aumenta con cada escritura.
+            Lanza DatabaseException en caso de errores."""
+        try:
+            total, version = self.db.execute(self._session_version_query(session_id, sender)).one()
+            return total, version
+        except Exception as e:
+            raise DatabaseException(f"Error al recuperar la versión de la sesión: {str(e)}")
+
+    @staticmethod
+    def _session_total_query(session_id: str, sender: Optional[str]):
+        """ Total de mensajes de la sesión desde session_stats (búsqueda por clave primaria) """
+        query = select(func.coalesce(func.sum(SessionStatsModel.message_count), 0)).where(
+            SessionStatsModel.session_id == session_id
+        )
+        if sender:
+            query = query.where(SessionStatsModel.sender == sender)
+        return query
+
+    def get_session_total(self, session_id: str, sender: Optional[str] = None) -> int:
+        """ Número total de mensajes de la sesión (y remitente), sin COUNT(*) sobre messages.
+            Lanza DatabaseException en caso de errores."""
+        try:
+            return self.db.execute(self._session_total_query(session_id, sender)).scalar_one()
+        except Exception as e:
+            raise DatabaseException(f"Error al recuperar el total de la sesión: {str(e)}")
+
     def get_messages_by_session(
         self, 
         session_id: str, 
         limit: int = 100, 
         offset: int = 0, 
-        sender: Optional[str] = None
+        sender: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> List[MessageResponseSchema]:
         """ Recupera mensajes de la base de datos filtrando por session_id, opcionalmente por sender.
             Lanza DatabaseException en caso de errores."""
+        messages, _ = self.get_session_page(session_id, limit, offset, sender, cursor)
+        return messages
+
+class MessageExportService:
+    """
+    Servicio para exportar todos los mensajes de una sesión como NDJSON en streaming.
+    Usa su propia sesión de base de datos porque el generador se consume después de que
+    FastAPI cierra las dependencias de la petición. Con un almacén en frío (archive) intercala
+    los mensajes archivados en su posición.
+    """
+    def __init__(
+        self, session_factory: Callable[[], Session], batch_size: int = 500, archive: Optional[SegmentStore] = None
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.archive = archive
+
+    def _export_query(self, session_id: str, sender: Optional[str]):
+        return (
+            select(*MESSAGE_COLUMNS)
+            .where(*MessageRetrievalService._session_filters(session_id, sender))
+            .order_by(*MessageRetrievalService._page_order)
+            .execution_options(yield_per=self.batch_size)
+        )
+
+    def iter_session_ndjson(self, session_id: str, sender: Optional[str] = None) -> Iterator[bytes]:
+        """ Genera bloques de bytes NDJSON (una línea por mensaje) leyendo la sesión por lotes.
+            La memoria usada depende de batch_size y no del tamaño de la sesión. """
+        with self.session_factory() as db:
+            cold = MessageRetrievalService(db, self.archive)._cold_rows(session_id, sender, None)
+            result = db.execute(self._export_query(session_id, sender))
+            position = 0
+            for rows in result.partitions():
+                rows, position = interleave_rows(cold, position, rows)
+                yield encode_ndjson_rows(rows)
+            for start in range(position, len(cold), self.batch_size):
+                yield encode_ndjson_rows(cold[start:start + self.batch_size])
+
+class AsyncMessageExportService(MessageExportService):
+    """Versión asíncrona de MessageExportService (modo DATABASE_ASYNC)"""
+    def __init__(
+        self, session_factory: async_sessionmaker, batch_size: int = 500, archive: Optional[SegmentStore] = None
+    ):
+        super().__init__(session_factory, batch_size, archive)
+
+    async def iter_session_ndjson(self, session_id: str, sender: Optional[str] = None) -> AsyncIterator[bytes]:
+        """ Genera bloques de bytes NDJSON leyendo la sesión por lotes con un cursor en streaming """
+        async with self.session_factory() as db:
+            cold = await AsyncMessageRetrievalService(db, self.archive)._cold_rows(session_id, sender, None)
+            result = await db.stream(self._export_query(session_id, sender))
+            position = 0
+            async for rows in result.partitions():
+                rows, position = interleave_rows(cold, position, rows)
+                yield encode_ndjson_rows(rows)
+            for start in range(position, len(cold), self.batch_size):
+                yield encode_ndjson_rows(cold[start:start + self.batch_size])
+
+class AsyncMessageStorageService(MessageStorageService):
+    """
+    Versión asíncrona de MessageStorageService sobre una AsyncSession (modo DATABASE_ASYNC).
+    """
+    def __init__(
+        self,
+        db: AsyncSession,
+        page_cache: Optional[SessionPageCache] = None,
+        id_filter: Optional[MessageIdFilter] = None,
+    ):
+        self.db = db
+        self.page_cache = page_cache
+        self.id_filter = id_filter
+
+    async def _duplicate_message(self, message_id: str) -> bool:
+        if self.id_filter is None or message_id not in self.id_filter.candidates([message_id]):
+            return False
+        found = (await self.db.execute(self._existing_ids_query([message_id]))).first() is not None
+        self.id_filter.record_lookup(1, int(found), saved=int(found))
+        return found
+
+    async def save_message(self, message: MessageResponseSchema) -> MessageModel:
+        """ Almacena el mensaje procesado en la base de datos.
+            Lanza DatabaseException en caso de errores.
+        """
         try:
-            query = self.db.query(MessageModel).filter(
-                MessageModel.session_id == session_id
-            )
-            
-            if sender:
-                query = query.filter(MessageModel.sender == sender)
-            
-            db_messages = query.offset(offset).limit(limit).all()
+            if await self._duplicate_message(message.data.message_id):
+                raise DatabaseException(f"Error de integridad: mensaje con ID '{message.data.message_id}' ya existe")
+            row = self._message_to_row(message.data)
+            db_message = MessageModel(**row)
+            self.db.add(db_message)
+            await self.db.execute(*self._session_stats_increment([row]))
+            await self.db.commit()
+            self._invalidate_pages([row])
+            self._remember_ids([row["message_id"]])
+            await self.db.refresh(db_message)
+            return db_message
+
+        except DatabaseException:
+            raise
+
+        except IntegrityError as e:
+            await self.db.rollback()
+            self._remember_ids([message.data.message_id])
+            raise DatabaseException(f"Error de integridad: mensaje con ID '{message.data.message_id}' ya existe")
+
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+
+        except Exception as e:
+            await self.db.rollback()
+            raise DatabaseException(f"Error inesperado al almacenar el mensaje: {str(e)}")
+
+    async def _existing_message_ids(self, message_ids: List[str], use_filter: bool = True) -> set:
+        """ Devuelve los IDs que ya existen en la base de datos """
+        candidates, saved = self._filter_candidates(message_ids) if use_filter else (message_ids, 0)
+        existing = set()
+        for start in range(0, len(candidates), self._lookup_chunk_size):
+            chunk = candidates[start:start + self._lookup_chunk_size]
+            result = await self.db.execute(self._existing_ids_query(chunk))
+            existing.update(result.scalars())
+        if use_filter and self.id_filter is not None:
+            self.id_filter.record_lookup(len(candidates), len(existing), saved)
+        return existing
+
+    async def save_batch(self, results: List[BatchItemResultSchema]) -> List[BatchItemResultSchema]:
+        """ Almacena los mensajes aceptados de un lote con un único INSERT masivo y un solo commit """
+        accepted = [result for result in results if result.status == "accepted"]
+        if not accepted:
+            return results
+        try:
+            existing = await self._existing_message_ids(list({result.message_id for result in accepted}))
+            try:
+                await self._insert_batch(self._plan_batch(accepted, existing))
+            except IntegrityError:
+                if self.id_filter is None:
+                    raise
+                # el filtro Bloom descartó un ID guardado por otro proceso: se repite la comprobación sin filtro
+                await self.db.rollback()
+                pending = [result for result in accepted if result.status == "accepted"]
+                existing = await self._existing_message_ids(
+                    [result.message_id for result in pending], use_filter=False
+                )
+                self._remember_ids(existing)
+                await self._insert_batch(self._plan_batch(pending, existing))
+            return results
+
+        except IntegrityError as e:
+            await self.db.rollback()
+            raise DatabaseException("Error de integridad: uno o más mensajes del lote ya existen")
+
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+
+    async def _insert_new_rows(self, rows: List[dict]) -> Tuple[set, set]:
+        try:
+            return set((await self.db.execute(_INSERT_NEW_STATEMENT, rows)).scalars()), set()
+        except IntegrityError:
+            await self.db.rollback()
+            archived = set((await self.db.execute(
+                select(ArchivedMessageIdModel.message_id)
+                .where(ArchivedMessageIdModel.message_id.in_({row["message_id"] for row in rows}))
+            )).scalars())
+            rows = [row for row in rows if row["message_id"] not in archived]
+            if not rows:
+                return set(), archived
+            return set((await self.db.execute(_INSERT_NEW_STATEMENT, rows)).scalars()), archived
+
+    async def upsert_batch(self, results: List[BatchItemResultSchema], policy: str) -> List[BatchItemResultSchema]:
+        """ Ingesta idempotente de los mensajes aceptados de un lote (ver MessageStorageService.upsert_batch) """
+        accepted = [result for result in results if result.status == "accepted"]
+        if not accepted:
+            return results
+        rows = [self._message_to_row(result.data) for result in accepted]
+        try:
+            inserted, archived = await self._insert_new_rows(rows)
+            created, conflicts = self._split_upserted(accepted, rows, inserted)
+            replaced = []
+            for result, row in conflicts:
+                if (policy == "replace" and row["message_id"] not in archived
+                        and (await self.db.execute(self._replace_statement(row))).first() is not None):
+                    result.created = False
+                    replaced.append(row)
+                else:
+                    reject_conflict(result, policy)
+            if created:
+                await self.db.execute(*self._session_stats_increment(created))
+            if replaced:
+                await self.db.execute(*self._session_stats_increment(replaced, counted=False))
+            await self.db.commit()
+
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+
+        self._invalidate_pages(created + replaced)
+        self._remember_ids(row["message_id"] for row in rows)
+        return results
+
+    async def upsert_message(self, message: MessageResponseSchema, policy: str) -> bool:
+        """ Ingesta idempotente de un mensaje procesado; devuelve si se creó """
+        result = BatchItemResultSchema(message_id=message.data.message_id, status="accepted", data=message.data)
+        await self.upsert_batch([result], policy)
+        if result.status == "rejected":
+            raise DatabaseException(f"Error de integridad: {result.error.message}")
+        return result.created
+
+    async def _insert_batch(self, rows: List[dict]) -> None:
+        if rows:
+            await self.db.execute(insert(MessageModel), rows)
+            await self.db.execute(*self._session_stats_increment(rows))
+            await self.db.commit()
+            self._invalidate_pages(rows)
+            self._remember_ids(row["message_id"] for row in rows)
+
+class AsyncMessageRetrievalService(MessageRetrievalService):
+    """Versión asíncrona de MessageRetrievalService sobre una AsyncSession (modo DATABASE_ASYNC)"""
+    def __init__(self, db: AsyncSession, archive: Optional[SegmentStore] = None):
+        self.db = db
+        self.archive = archive
+
+    async def _cold_rows(
+        self, session_id: str, sender: Optional[str], cursor: Optional[str], limit: Optional[int] = None
+    ) -> List[ArchivedRow]:
+        """ Mensajes archivados de la sesión; los bloques se leen fuera del bucle de eventos """
+        if self.archive is None:
+            return []
+        blocks = (await self.db.execute(self._archive_blocks_query(session_id, sender, cursor))).all()
+        if not blocks:
+            return []
+        return await asyncio.to_thread(self._read_cold_blocks, blocks, sender, cursor, limit)
+
+    async def get_session_page(
+        self,
+        session_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        sender: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[MessageResponseSchema], Optional[str]]:
+        """ Recupera una página de mensajes ordenada por (timestamp, message_id) y el cursor siguiente """
+        filters = self._session_filters(session_id, sender, cursor)
+        try:
+            cold = await self._cold_rows(session_id, sender, cursor, offset + limit + 1)
+            query = select(MessageModel).where(*filters).order_by(*self._page_order)
+            if cold:
+                result = await self.db.execute(query.limit(offset + limit + 1))
+                return self._build_page(self._merge_page(list(result.scalars()), cold, offset, limit), limit)
+            result = await self.db.execute(query.offset(offset).limit(limit + 1))
+            return self._build_page(list(result.scalars()), limit)
 
-            return [self._convert_model_to_schema(msg) for msg in db_messages]
-            
         except Exception as e:
             raise DatabaseException(f"Error al recuperar mensajes de la sesión: {str(e)}")
 
+    async def get_session_page_rows(
+        self,
+        session_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        sender: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[list, Optional[str]]:
+        """ Recupera una página como filas de MESSAGE_COLUMNS y el cursor siguiente """
+        filters = self._session_filters(session_id, sender, cursor)
+        try:
+            cold = await self._cold_rows(session_id, sender, cursor, offset + limit + 1)
+            if cold:
+                result = await self.db.execute(self._page_rows_query(filters, offset + limit, 0))
+                return self._trim_page(self._merge_page(result.all(), cold, offset, limit), limit)
+            result = await self.db.execute(self._page_rows_query(filters, limit, offset))
+            return self._trim_page(result.all(), limit)
+
+        except Exception as e:
+            raise DatabaseException(f"Error al recuperar mensajes de la sesión: {str(e)}")
+
+    async def get_session_version(self, session_id: str, sender: Optional[str] = None) -> Tuple[int, int]:
+        """ (total, versión) de la sesión (y remitente) desde session_stats """
+        try:
+            result = await self.db.execute(self._session_version_query(session_id, sender))
+            total, version = result.one()
+            return total, version
+        except Exception as e:
+            raise DatabaseException(f"Error al recuperar la versión de la sesión: {str(e)}")
+
+    async def get_session_total(self, session_id: str, sender: Optional[str] = None) -> int:
+        """ Número total de mensajes de la sesión (y remitente) desde session_stats """
+        try:
+            result = await self.db.execute(self._session_total_query(session_id, sender))
+            return result.scalar_one()
+        except Exception as e:
+            raise DatabaseException(f"Error al recuperar el total de la sesión: {str(e)}")
+
+    async def get_messages_by_session(
+        self,
+        session_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        sender: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> List[MessageResponseSchema]:
+        """ Recupera mensajes de la base de datos filtrando por session_id, opcionalmente por sender.
+            Lanza DatabaseException en caso de errores."""
+        messages, _ = await self.get_session_page(session_id, limit, offset, sender, cursor)
+        return messages
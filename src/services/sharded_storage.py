@@ -0,0 +1,251 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from core.cache import SessionPageCache
+from core.database import ShardSet
+from core.exceptions import DatabaseException
+from models.message_model import MessageModel
+from models.message_registry_model import MessageRegistryModel
+from schemas.message_schema import BatchItemResultSchema, MessageResponseSchema
+from services.message_service import MessageStorageService, reject_conflict, reject_result
+
+# antigüedad mínima de una reserva sin mensaje para considerarla huérfana y reclamar su message_id
+ORPHAN_CLAIM_AGE = timedelta(seconds=60)
+# reserva de IDs: devuelve solo los insertados (los existentes se omiten); sentencia fija, compilada una vez
+_CLAIM_STATEMENT = (
+    sqlite_insert(MessageRegistryModel)
+    .on_conflict_do_nothing(index_elements=[MessageRegistryModel.message_id])
+    .returning(MessageRegistryModel.message_id)
+)
+
+
+class ShardedMessageStorageService(MessageStorageService):
+    """
+    Servicio de almacenamiento con los mensajes repartidos por session_id entre varios archivos SQLite.
+    Cada mensaje se guarda en dos pasos:
+    1. Reserva su message_id en message_registry, en el shard de shard_index(message_id). Un ID ya
+       reservado es un duplicado.
+    2. Inserta el mensaje y actualiza session_stats en el shard de su sesión, en una transacción.
+    Si el segundo paso falla se libera la reserva. Las escrituras de sesiones en shards distintos no
+    comparten el lock de escritura de SQLite.
+    Un lote se confirma por shard: si falla un shard, solo se rechazan sus mensajes.
+    """
+    def __init__(self, shards: ShardSet, page_cache: Optional[SessionPageCache] = None):
+        super().__init__(None, page_cache)
+        self.shards = shards
+
+    def _group_by_shard(self, rows: List[dict], key: str) -> Dict[int, List[dict]]:
+        groups = defaultdict(list)
+        for row in rows:
+            groups[self.shards.shard_for(row[key])].append(row)
+        return groups
+
+    def _claim_message_ids(self, rows: List[dict]) -> set:
+        """ Reserva los message_id de las filas; devuelve los que quedaron reservados (el resto ya existían) """
+        claimed = set()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for shard, shard_rows in self._group_by_shard(rows, "message_id").items():
+            with self.shards.session_factories[shard]() as db:
+                params = [{"message_id": row["message_id"], "session_id": row["session_id"], "claimed_at": now}
+                          for row in shard_rows]
+                claimed.update(db.execute(_CLAIM_STATEMENT, params).scalars().all())
+                db.commit()
+        conflicts = [row for row in rows if row["message_id"] not in claimed]
+        if conflicts:
+            claimed.update(self._reclaim_orphans(conflicts, now))
+        return claimed
+
+    def _reclaim_orphans(self, rows: List[dict], now: datetime) -> set:
+        """ Reclama los IDs reservados hace más de ORPHAN_CLAIM_AGE cuyo mensaje no existe en su shard
+            (el proceso terminó entre la reserva y el commit del mensaje) """
+        reclaimed = set()
+        for shard, shard_rows in self._group_by_shard(rows, "message_id").items():
+            with self.shards.session_factories[shard]() as db:
+                registered = db.execute(
+                    select(MessageRegistryModel.message_id, MessageRegistryModel.session_id)
+                    .where(MessageRegistryModel.message_id.in_([row["message_id"] for row in shard_rows]))
+                    .where(MessageRegistryModel.claimed_at < now - ORPHAN_CLAIM_AGE)
+                ).all()
+                for message_id, session_id in registered:
+                    if self._message_exists(session_id, message_id):
+                        continue
+                    row = next(row for row in shard_rows if row["message_id"] == message_id)
+                    result = db.execute(
+                        update(MessageRegistryModel)
+                        .where(MessageRegistryModel.message_id == message_id,
+                               MessageRegistryModel.session_id == session_id,
+                               MessageRegistryModel.claimed_at < now - ORPHAN_CLAIM_AGE)
+                        .values(session_id=row["session_id"], claimed_at=now)
+                    )
+                    if result.rowcount:
+                        reclaimed.add(message_id)
+                db.commit()
+        return reclaimed
+
+    def _registered_sessions(self, message_ids: List[str]) -> Dict[str, str]:
+        """ Sesión de cada message_id reservado en message_registry """
+        owners = {}
+        for shard, shard_rows in self._group_by_shard([{"message_id": m} for m in message_ids], "message_id").items():
+            with self.shards.session_factories[shard]() as db:
+                owners.update(db.execute(
+                    select(MessageRegistryModel.message_id, MessageRegistryModel.session_id)
+                    .where(MessageRegistryModel.message_id.in_([row["message_id"] for row in shard_rows]))
+                ).all())
+        return owners
+
+    def _message_exists(self, session_id: str, message_id: str) -> bool:
+        """ Si el mensaje está guardado en el shard de su sesión (en messages o archivado) """
+        with self.shards.session_factory_for(session_id)() as db:
+            return db.execute(self._existing_ids_query([message_id])).first() is not None
+
+    def _release_message_ids(self, rows: List[dict]) -> None:
+        """ Libera las reservas de mensajes que no llegaron a guardarse """
+        for shard, shard_rows in self._group_by_shard(rows, "message_id").items():
+            with self.shards.session_factories[shard]() as db:
+                db.execute(delete(MessageRegistryModel).where(
+                    MessageRegistryModel.message_id.in_([row["message_id"] for row in shard_rows])
+                ))
+                db.commit()
+
+    def _insert_rows(self, shard: int, rows: List[dict]) -> None:
+        """ Inserta los mensajes de un shard y sus contadores de session_stats en una transacción """
+        with self.shards.session_factories[shard]() as db:
+            try:
+                db.execute(insert(MessageModel), rows)
+                db.execute(*self._session_stats_increment(rows))
+                db.commit()
+            except SQLAlchemyError:
+                db.rollback()
+                self._release_message_ids(rows)
+                raise
+        self._invalidate_pages(rows)
+
+    def save_message(self, message: MessageResponseSchema) -> MessageModel:
+        """ Almacena el mensaje procesado en el shard de su sesión.
+            Lanza DatabaseException en caso de errores.
+            Entrada:
+            - MessageResponseSchema
+            Salida:
+            - MessageModel (objeto ORM sin sesión)
+        """
+        row = self._message_to_row(message.data)
+        try:
+            if not self._claim_message_ids([row]):
+                raise DatabaseException(f"Error de integridad: mensaje con ID '{row['message_id']}' ya existe")
+            self._insert_rows(self.shards.shard_for(row["session_id"]), [row])
+        except IntegrityError:
+            raise DatabaseException(f"Error de integridad: mensaje con ID '{row['message_id']}' ya existe")
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+        return MessageModel(**row)
+
+    def save_batch(self, results: List[BatchItemResultSchema]) -> List[BatchItemResultSchema]:
+        """ Almacena los mensajes aceptados de un lote con un INSERT masivo y un commit por shard.
+            Los IDs que ya existen (en cualquier shard o repetidos en el lote) se marcan como rechazados,
+            y también los mensajes de un shard cuya transacción falla (DATABASE_ERROR).
+            Lanza DatabaseException si no se pueden reservar los IDs.
+        """
+        accepted = [result for result in results if result.status == "accepted"]
+        if not accepted:
+            return results
+        rows = self._plan_batch(accepted, set())
+        try:
+            claimed = self._claim_message_ids(rows)
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+
+        by_id = {result.message_id: result for result in accepted if result.status == "accepted"}
+        for row in rows:
+            if row["message_id"] not in claimed:
+                reject_result(by_id[row["message_id"]], "DUPLICATE_MESSAGE_ID",
+                        f"El mensaje con ID '{row['message_id']}' ya existe")
+        rows = [row for row in rows if row["message_id"] in claimed]
+
+        for shard, shard_rows in self._group_by_shard(rows, "session_id").items():
+            try:
+                self._insert_rows(shard, shard_rows)
+            except SQLAlchemyError as e:
+                for row in shard_rows:
+                    reject_result(by_id[row["message_id"]], "DATABASE_ERROR", f"Error de base de datos: {str(e)}")
+        return results
+
+    def _replace_conflicts(self, conflicts: List[BatchItemResultSchema]) -> None:
+        """ Reemplaza los mensajes existentes de la misma sesión y remitente, con un commit por shard """
+        owners = self._registered_sessions([result.message_id for result in conflicts])
+        by_shard = defaultdict(list)
+        for result in conflicts:
+            row = self._message_to_row(result.data)
+            if owners.get(row["message_id"]) == row["session_id"]:
+                by_shard[self.shards.shard_for(row["session_id"])].append((result, row))
+            else:
+                reject_conflict(result, "replace")
+        for shard, pairs in by_shard.items():
+            replaced, missing = [], []
+            with self.shards.session_factories[shard]() as db:
+                try:
+                    for result, row in pairs:
+                        found = db.execute(self._replace_statement(row)).first() is not None
+                        (replaced if found else missing).append((result, row))
+                    if replaced:
+                        db.execute(*self._session_stats_increment([row for _, row in replaced], counted=False))
+                    db.commit()
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    for result, _ in pairs:
+                        reject_result(result, "DATABASE_ERROR", f"Error de base de datos: {str(e)}")
+                    continue
+            for result, _ in replaced:
+                result.created = False
+            for result, _ in missing:
+                reject_conflict(result, "replace")
+            self._invalidate_pages([row for _, row in replaced])
+
+    def upsert_batch(self, results: List[BatchItemResultSchema], policy: str) -> List[BatchItemResultSchema]:
+        """ Ingesta idempotente de los mensajes aceptados de un lote: los IDs que no se pueden reservar ya
+            existen y se resuelven según policy (con "replace", en el shard de la sesión a la que pertenecen).
+            Lanza DatabaseException si no se pueden reservar los IDs.
+        """
+        accepted = [result for result in results if result.status == "accepted"]
+        if not accepted:
+            return results
+        first, repeated = {}, []
+        for result in accepted:
+            if result.message_id in first:
+                repeated.append(result)
+            else:
+                first[result.message_id] = result
+        rows = [self._message_to_row(result.data) for result in first.values()]
+        try:
+            claimed = self._claim_message_ids(rows)
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error de base de datos: {str(e)}")
+
+        for shard, shard_rows in self._group_by_shard(
+            [row for row in rows if row["message_id"] in claimed], "session_id"
+        ).items():
+            try:
+                self._insert_rows(shard, shard_rows)
+            except SQLAlchemyError as e:
+                for row in shard_rows:
+                    reject_result(first[row["message_id"]], "DATABASE_ERROR", f"Error de base de datos: {str(e)}")
+            else:
+                for row in shard_rows:
+                    first[row["message_id"]].created = True
+
+        conflicts = [result for result in first.values() if result.message_id not in claimed]
+        for result in repeated:
+            if first[result.message_id].status == "rejected":
+                reject_result(result, first[result.message_id].error.code, first[result.message_id].error.message)
+            else:
+                conflicts.append(result)
+        if policy == "replace":
+            self._replace_conflicts(conflicts)
+        else:
+            for result in conflicts:
+                reject_conflict(result, policy)
+        return results
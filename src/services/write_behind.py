@@ -0,0 +1,315 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+
+from core.bloom import MessageIdFilter
+from core.cache import SessionPageCache
+from core.exceptions import DatabaseException
+from models.message_model import MessageModel
+from schemas.message_schema import MessageResponseSchema
+from services.message_service import MessageStorageService
+
+logger = logging.getLogger(__name__)
+
+# modos de confirmación (WRITE_BEHIND_ACK)
+# - "commit": la petición responde cuando su lote está confirmado en la base de datos
+# - "enqueue": la petición responde al encolar; los mensajes en cola se pierden si el proceso muere
+ACK_MODES = ("commit", "enqueue")
+
+# espera máxima (segundos) de una petición en modo "commit" por el commit de su lote
+DEFAULT_ACK_TIMEOUT = 30.0
+
+# marca de fin de la cola
+_STOP = object()
+
+
+def _duplicate_error(message_id: str) -> DatabaseException:
+    return DatabaseException(f"Error de integridad: mensaje con ID '{message_id}' ya existe")
+
+
+@dataclass
+class _PendingWrite:
+    """ Mensaje en cola junto con el Future que se resuelve al confirmarse su lote """
+    row: dict
+    future: Future = field(default_factory=Future)
+
+
+class WriteBehindWriter:
+    """
+    Escritor en segundo plano con group commit.
+    - Las peticiones encolan la fila del mensaje; un único hilo escritor la inserta.
+    - El escritor agrupa hasta batch_size mensajes o los que lleguen en flush_interval_ms,
+      y los guarda con un INSERT masivo, el UPSERT de session_stats y un solo commit.
+    - close() deja de aceptar mensajes y vacía la cola antes de terminar.
+    """
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[float] = None,
+        ack_mode: Optional[str] = None,
+        max_queue_size: Optional[int] = None,
+        ack_timeout: Optional[float] = None,
+        page_cache: Optional[SessionPageCache] = None,
+        id_filter: Optional[MessageIdFilter] = None,
+    ):
+        self.session_factory = session_factory
+        self.page_cache = page_cache
+        self.id_filter = id_filter
+        self.batch_size = batch_size or int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 100))
+        if flush_interval_ms is None:
+            flush_interval_ms = float(os.getenv("WRITE_BEHIND_FLUSH_MS", 10))
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.ack_mode = ack_mode or os.getenv("WRITE_BEHIND_ACK", "commit")
+        if self.ack_mode not in ACK_MODES:
+            raise ValueError(f"Modo de confirmación desconocido: '{self.ack_mode}'")
+        self.ack_timeout = ack_timeout or float(os.getenv("WRITE_BEHIND_ACK_TIMEOUT", DEFAULT_ACK_TIMEOUT))
+        # cola acotada: si el escritor no da abasto las peticiones esperan (contrapresión)
+        self._queue = queue.Queue(maxsize=max_queue_size or int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", 10000)))
+        self._closed = False
+        # submit() y close() comprueban _closed y encolan bajo el mismo lock: nada entra tras el cierre
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.enqueued_count = 0
+        self.committed_count = 0
+        self.failed_count = 0
+        self.batch_count = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: dict) -> Future:
+        """ Encola una fila de MessageModel; el Future se resuelve con el message_id tras el commit """
+        pending = _PendingWrite(row)
+        with self._submit_lock:
+            if self._closed:
+                raise DatabaseException("El escritor en segundo plano está detenido")
+            self._queue.put(pending)
+        with self._stats_lock:
+            self.enqueued_count += 1
+        return pending.future
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """ Deja de aceptar mensajes y espera a que se guarden todos los encolados """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return
+        # mensajes que quedaron tras la marca de fin (p. ej. si el hilo terminó antes de tiempo)
+        leftover = self._drain_nowait(len(self._queue.queue))
+        if leftover:
+            self._flush(leftover)
+
+    def stats(self) -> dict:
+        """ Contadores del escritor """
+        return {
+            "ack_mode": self.ack_mode,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000.0,
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued_count,
+            "committed": self.committed_count,
+            "failed": self.failed_count,
+            "batches": self.batch_count,
+        }
+
+    def _drain_nowait(self, limit: int) -> List[_PendingWrite]:
+        items = []
+        while len(items) < limit:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                items.append(item)
+        return items
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch, stop = [item], False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: List[_PendingWrite]) -> None:
+        """ Guarda un lote en una sola transacción y resuelve el Future de cada mensaje """
+        with self.session_factory() as db:
+            storage = MessageStorageService(db, self.page_cache, self.id_filter)
+            pending = []
+            try:
+                seen = storage._existing_message_ids(list({p.row["message_id"] for p in batch}))
+                for p in batch:
+                    if p.row["message_id"] in seen:
+                        self._fail(p, _duplicate_error(p.row["message_id"]))
+                        continue
+                    seen.add(p.row["message_id"])
+                    pending.append(p)
+                if pending:
+                    rows = [p.row for p in pending]
+                    db.execute(insert(MessageModel), rows)
+                    db.execute(*storage._session_stats_increment(rows))
+                    db.commit()
+            except IntegrityError:
+                # otro proceso insertó alguno de los IDs entre la comprobación y el INSERT:
+                # se reintenta mensaje a mensaje para no rechazar el lote completo
+                db.rollback()
+                try:
+                    for p in pending:
+                        self._flush_one(db, storage, p)
+                except Exception as e:
+                    self._fail_unresolved(pending, DatabaseException(
+                        f"Error inesperado al almacenar el mensaje: {str(e)}"
+                    ))
+                return
+            except SQLAlchemyError as e:
+                db.rollback()
+                self._fail_unresolved(batch, DatabaseException(f"Error de base de datos: {str(e)}"))
+                return
+            except Exception as e:
+                # el hilo escritor no debe morir: se rechaza el lote y se sigue con la cola
+                db.rollback()
+                self._fail_unresolved(batch, DatabaseException(f"Error inesperado al almacenar el mensaje: {str(e)}"))
+                return
+            if pending:
+                self._after_commit(storage, [p.row for p in pending])
+                self._succeed(pending)
+
+    @staticmethod
+    def _after_commit(storage: MessageStorageService, rows: List[dict]) -> None:
+        """ Invalida las páginas en caché y registra los IDs en el filtro tras el commit.
+            Es best-effort: los mensajes ya están guardados y un fallo aquí no debe rechazarlos. """
+        for step in (lambda: storage._invalidate_pages(rows),
+                     lambda: storage._remember_ids(row["message_id"] for row in rows)):
+            try:
+                step()
+            except Exception:
+                logger.exception("Error tras confirmar %d mensajes del escritor en segundo plano", len(rows))
+
+    def _flush_one(self, db: Session, storage: MessageStorageService, pending: _PendingWrite) -> None:
+        try:
+            db.execute(insert(MessageModel), [pending.row])
+            db.execute(*storage._session_stats_increment([pending.row]))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            try:
+                storage._remember_ids([pending.row["message_id"]])
+            except Exception:
+                logger.exception("Error al registrar el ID duplicado '%s' en el filtro", pending.row["message_id"])
+            self._fail(pending, _duplicate_error(pending.row["message_id"]))
+        except SQLAlchemyError as e:
+            db.rollback()
+            self._fail(pending, DatabaseException(f"Error de base de datos: {str(e)}"))
+        except Exception as e:
+            db.rollback()
+            self._fail(pending, DatabaseException(f"Error inesperado al almacenar el mensaje: {str(e)}"))
+        else:
+            self._after_commit(storage, [pending.row])
+            self._succeed([pending])
+
+    def _succeed(self, pending: List[_PendingWrite]) -> None:
+        with self._stats_lock:
+            self.committed_count += len(pending)
+            self.batch_count += 1
+        for p in pending:
+            p.future.set_result(p.row["message_id"])
+
+    def _fail_unresolved(self, batch: List[_PendingWrite], error: DatabaseException) -> None:
+        for p in batch:
+            if not p.future.done():
+                self._fail(p, error)
+
+    def _fail(self, pending: _PendingWrite, error: DatabaseException) -> None:
+        with self._stats_lock:
+            self.failed_count += 1
+        if self.ack_mode == "enqueue":
+            # nadie espera el Future: el error solo puede registrarse
+            logger.warning("Mensaje '%s' descartado por el escritor: %s",
+                           pending.row["message_id"], error.detail["error"]["details"])
+        pending.future.set_exception(error)
+
+
+class WriteBehindStorageService(MessageStorageService):
+    """
+    Servicio de almacenamiento que delega los INSERT de mensajes individuales en WriteBehindWriter.
+    En modo "commit" espera a que el lote del mensaje se confirme y propaga sus errores.
+    La ingesta idempotente (upsert_message/upsert_batch) no pasa por la cola: escribe directamente con db.
+    """
+    def __init__(self, db: Session, writer: WriteBehindWriter):
+        super().__init__(db, writer.page_cache, writer.id_filter)
+        self.writer = writer
+
+    def save_message(self, message: MessageResponseSchema) -> MessageModel:
+        """ Encola el mensaje procesado para el escritor en segundo plano.
+            Lanza DatabaseException en caso de errores (solo en modo "commit").
+            Entrada:
+            - MessageResponseSchema
+            Salida:
+            - MessageModel (objeto ORM sin sesión)
+        """
+        row = self._message_to_row(message.data)
+        future = self.writer.submit(row)
+        if self.writer.ack_mode == "commit":
+            try:
+                future.result(timeout=self.writer.ack_timeout)
+            except FutureTimeoutError:
+                raise DatabaseException(
+                    f"El escritor en segundo plano no confirmó el mensaje en {self.writer.ack_timeout:g} s"
+                )
+        return MessageModel(**row)
+
+
+# escritor del proceso (WRITE_BEHIND_ENABLED=true); se crea al arrancar la app
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+_writer: Optional[WriteBehindWriter] = None
+
+
+def start_write_behind(
+    session_factory: sessionmaker,
+    page_cache: Optional[SessionPageCache] = None,
+    id_filter: Optional[MessageIdFilter] = None,
+) -> WriteBehindWriter:
+    """ Crea el escritor del proceso si no existe """
+    global _writer
+    if _writer is None:
+        _writer = WriteBehindWriter(session_factory, page_cache=page_cache, id_filter=id_filter)
+    return _writer
+
+
+def stop_write_behind(timeout: Optional[float] = None) -> None:
+    """ Vacía la cola y detiene el escritor del proceso """
+    global _writer
+    if _writer is not None:
+        _writer.close(timeout)
+        _writer = None
+
+
+def get_write_behind_writer() -> Optional[WriteBehindWriter]:
+    """ Obtiene el escritor del proceso, o None si el modo write-behind está desactivado """
+    return _writer
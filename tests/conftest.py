@@ -1,14 +1,32 @@
 import pytest
 import os
 import tempfile
+import pytest_asyncio
+from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
 from fastapi.testclient import TestClient
+from slowapi.errors import RateLimitExceeded
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 from unittest.mock import patch
+
+# la app lee DATABASE_URL al importarse: el motor global no debe tocar data/messages.db
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+# contadores de rate limit en memoria del proceso de tests (sin archivo compartido entre ejecuciones)
+os.environ.setdefault("RATE_LIMIT_STORAGE_URI", "memory://")
+# clave de administración: registra /admin/profile en la app de pruebas
+os.environ.setdefault("ADMIN_API_KEY", "test-admin-key-123")
+
 from models.message_model import MessageModel
 from main import app
-from core.database import Base, get_db
+from core.cache import SessionPageCache, get_page_cache
+from core.database import Base, get_db, get_async_db, get_session_factory, get_async_session_factory
+from core.exceptions import CustomValidationException, custom_rate_limit_exceeded_handler
+from controllers import async_message_controller
+from dependencies.services import get_message_processing_service
+from services.message_service import MessageProcessingService
 
 # bd de pruebas
 @pytest.fixture(scope="function")
@@ -35,18 +53,62 @@ def test_db(test_engine):
         session.close()
 
 @pytest.fixture(scope="function")
-def client(test_db):
+def client(test_db, test_engine):
     """Cliente de prueba de FastAPI que usa la BD de test"""
     def override_get_db():
         yield test_db 
 
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    # el servicio compartido se construye en el arranque, antes de que los tests parcheen CORPUS_FILE_PATH
+    app.dependency_overrides[get_message_processing_service] = lambda: MessageProcessingService()
+    # caché de páginas propia de cada test (las sesiones de distintos tests comparten IDs)
+    page_cache = SessionPageCache()
+    app.dependency_overrides[get_page_cache] = lambda: page_cache
 
     with TestClient(app) as test_client:
         yield test_client
 
     app.dependency_overrides.clear()
 
+# bd asíncrona de pruebas (mismo archivo que test_engine)
+def async_url(engine):
+    return str(engine.url).replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+@pytest_asyncio.fixture(scope="function")
+async def async_test_db(test_engine):
+    """Crea una sesión asíncrona sobre la base de datos de pruebas"""
+    engine = create_async_engine(async_url(test_engine))
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+@pytest.fixture(scope="function")
+def async_client(test_engine):
+    """Cliente de prueba con los endpoints asíncronos (modo DATABASE_ASYNC)"""
+    # NullPool: las conexiones se crean dentro del event loop del TestClient
+    engine = create_async_engine(async_url(test_engine), poolclass=NullPool)
+    AsyncTestingSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.state.limiter = async_message_controller.limiter
+    async_app.add_exception_handler(RateLimitExceeded, custom_rate_limit_exceeded_handler)
+    async_app.add_exception_handler(RequestValidationError, CustomValidationException)
+    async_app.include_router(async_message_controller.router)
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    async_app.dependency_overrides[get_async_session_factory] = lambda: AsyncTestingSessionLocal
+    page_cache = SessionPageCache()
+    async_app.dependency_overrides[get_page_cache] = lambda: page_cache
+
+    with TestClient(async_app) as test_client:
+        yield test_client
+
 # test de api key
 @pytest.fixture(scope="session")
 def test_api_key():
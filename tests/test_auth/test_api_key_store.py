@@ -0,0 +1,108 @@
+import json
+import os
+import pytest
+from fastapi import Request
+from sqlalchemy.orm import sessionmaker
+from core.api_keys import ApiKeyStore, DatabaseKeySource, FileKeySource, hash_api_key
+from core.auth import get_client_id, verify_api_key
+from core.exceptions import UnauthorizedException
+from core.rate_limit import get_rate_limit_key, limiter
+from models.api_key_model import ApiKeyModel
+
+
+def write_keys(path, entries):
+    path.write_text(json.dumps({"keys": entries}))
+    # mtime distinto aunque la escritura caiga en el mismo instante
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def keys_file(tmp_path):
+    path = tmp_path / "api_keys.json"
+    write_keys(path, [
+        {"client_id": "acme", "key_sha256": hash_api_key("acme-key").hex()},
+        {"client_id": "beta", "key": "beta-key"},
+        {"client_id": "revocado", "key": "old-key", "active": False},
+    ])
+    return path
+
+
+class TestApiKeyStore:
+
+    def test_lookup_file_keys(self, keys_file):
+        """Las claves se buscan por su digest y devuelven el cliente"""
+        store = ApiKeyStore(FileKeySource(str(keys_file)))
+        assert store.lookup("acme-key") == "acme"
+        assert store.lookup("beta-key") == "beta"
+        assert store.lookup("old-key") is None
+        assert store.lookup("desconocida") is None
+        assert store.stats()["keys"] == 2
+        assert store.stats()["loads"] == 1
+
+    def test_reload_on_change(self, keys_file):
+        """El archivo solo se relee cuando cambia"""
+        store = ApiKeyStore(FileKeySource(str(keys_file)), reload_interval=0)
+        assert store.lookup("acme-key") == "acme"
+        store.lookup("acme-key")
+        assert store.stats()["reloads"] == 0
+
+        write_keys(keys_file, [{"client_id": "gamma", "key": "gamma-key"}])
+        assert store.lookup("gamma-key") == "gamma"
+        assert store.lookup("acme-key") is None
+        assert store.stats()["reloads"] == 1
+
+    def test_invalid_reload_keeps_keys(self, keys_file):
+        """Un archivo inválido no invalida las claves ya cargadas"""
+        store = ApiKeyStore(FileKeySource(str(keys_file)), reload_interval=0)
+        assert store.lookup("acme-key") == "acme"
+        keys_file.write_text("{no es json")
+        assert store.lookup("acme-key") == "acme"
+
+    def test_database_source(self, test_engine):
+        """Las claves se cargan de la tabla api_keys y se recargan al cambiar"""
+        SessionLocal = sessionmaker(bind=test_engine)
+        with SessionLocal() as db:
+            db.add(ApiKeyModel(key_sha256=hash_api_key("db-key").hex(), client_id="db-client"))
+            db.commit()
+        store = ApiKeyStore(DatabaseKeySource(SessionLocal), reload_interval=0)
+        assert store.lookup("db-key") == "db-client"
+
+        with SessionLocal() as db:
+            db.get(ApiKeyModel, hash_api_key("db-key").hex()).active = False
+            db.commit()
+        assert store.lookup("db-key") is None
+
+
+class TestVerifyApiKeyWithStore:
+
+    def test_store_replaces_single_key(self, keys_file, monkeypatch, test_api_key):
+        """Con API_KEYS_SOURCE se usan las claves del almacén en lugar de API_KEY"""
+        monkeypatch.setenv("API_KEYS_SOURCE", str(keys_file))
+        assert get_client_id("beta-key") == "beta"
+        with pytest.raises(UnauthorizedException):
+            verify_api_key(test_api_key)
+
+    def test_client_id_in_request_state(self, test_api_key):
+        """El cliente de la clave queda en request.state y define la clave del rate limit"""
+        request = Request({"type": "http", "headers": [], "client": ("10.0.0.1", 1234)})
+        verify_api_key(test_api_key, request)
+        assert request.state.client_id == "default"
+        # con la API key única el límite sigue siendo por IP
+        assert get_rate_limit_key(request) == "10.0.0.1"
+
+        request.state.client_id = "acme"
+        assert get_rate_limit_key(request) == "client:acme"
+
+    def test_endpoint_rate_limit_per_client(self, client, keys_file, monkeypatch, mock_corpus_file, sample_message_data):
+        """El endpoint acepta las claves del almacén y limita por cliente"""
+        monkeypatch.setenv("API_KEYS_SOURCE", str(keys_file))
+        limiter.reset()
+        response = client.post("/api/messages/", json={**sample_message_data, "message_id": "msg-acme-001",
+                                                       "timestamp": "2025-01-01T00:00:00Z"},
+                               headers={"X-API-Key": "acme-key"})
+        assert response.status_code == 200
+        assert any("client:acme" in key for key in limiter._storage.storage)
+
+        response = client.get("/api/messages/session_test_001", headers={"X-API-Key": "old-key"})
+        assert response.status_code == 401
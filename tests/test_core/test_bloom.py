@@ -0,0 +1,70 @@
+import pytest
+from datetime import datetime
+from sqlalchemy.orm import sessionmaker
+
+from core.bloom import BloomFilter, MessageIdFilter, build_message_id_filter
+from models.archive_model import ArchivedMessageIdModel
+from models.message_model import MessageModel
+
+
+class TestBloomFilter:
+
+    def test_no_false_negatives(self):
+        """Todos los elementos añadidos están en el filtro"""
+        bloom = BloomFilter(capacity=5_000, fp_rate=0.01)
+        bloom.add_many(f"msg-{i}" for i in range(5_000))
+        assert bloom.count == 5_000
+        assert all(f"msg-{i}" in bloom for i in range(5_000))
+
+    def test_false_positive_rate_near_target(self):
+        """Con la capacidad prevista la tasa de falsos positivos se acerca a fp_rate"""
+        bloom = BloomFilter(capacity=10_000, fp_rate=0.01)
+        bloom.add_many(f"msg-{i}" for i in range(10_000))
+        false_positives = sum(f"otro-{i}" in bloom for i in range(20_000))
+        assert false_positives / 20_000 < 0.02
+        assert bloom.estimated_fp_rate() == pytest.approx(0.01, rel=0.2)
+
+    def test_sizing_and_memory_budget(self):
+        """Bits y hashes según capacity y fp_rate; max_bytes limita la memoria"""
+        bloom = BloomFilter(capacity=1_000_000, fp_rate=0.01)
+        assert bloom.nbytes == pytest.approx(1_198_132, rel=0.001)
+        assert bloom.hashes == 7
+        capped = BloomFilter(capacity=1_000_000, fp_rate=0.01, max_bytes=100_000)
+        assert capped.nbytes == 100_000
+        capped.add_many(f"msg-{i}" for i in range(100_000))
+        assert capped.estimated_fp_rate() > 0.01
+
+    def test_invalid_fp_rate(self):
+        with pytest.raises(ValueError):
+            BloomFilter(capacity=10, fp_rate=1.5)
+
+
+class TestMessageIdFilter:
+
+    def test_counters(self):
+        """candidates() cuenta los IDs descartados; record_lookup() el resultado de la consulta"""
+        id_filter = MessageIdFilter(capacity=1_000)
+        id_filter.add_many(["a", "b"])
+        assert id_filter.candidates(["a", "b", "c", "d"]) == ["a", "b"]
+        id_filter.record_lookup(2, 1, saved=1)
+        stats = id_filter.stats()
+        assert stats["definitely_new"] == 2
+        assert stats["duplicates"] == 1
+        assert stats["false_positives"] == 1
+        assert stats["round_trips_saved"] == 1
+        assert stats["items"] == 2
+
+    def test_build_from_database(self, test_engine):
+        """El filtro se construye con los IDs de messages y del almacenamiento en frío"""
+        session_factory = sessionmaker(bind=test_engine)
+        with session_factory() as db:
+            for i in range(3):
+                db.add(MessageModel(message_id=f"hot-{i}", session_id="s", content="x", timestamp=datetime.now(),
+                                    sender="user", word_count=1, character_count=1, processed_at=datetime.now()))
+            db.add(ArchivedMessageIdModel(message_id="cold-0"))
+            db.commit()
+
+        id_filter = build_message_id_filter(session_factory, capacity=100, fp_rate=0.001)
+        assert id_filter.count == 4
+        assert all(message_id in id_filter for message_id in ("hot-0", "hot-1", "hot-2", "cold-0"))
+        assert id_filter.capacity == 100
@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import patch
+from core.cache import ENTRY_OVERHEAD, SessionPageCache
+
+
+class TestSessionPageCache:
+
+    def test_hit_and_miss_counters(self):
+        """Un valor guardado se devuelve hasta que se invalida su sesión"""
+        cache = SessionPageCache(max_bytes=10_000, ttl=60)
+        assert cache.get(("s1", None, None, 0, 100)) is None
+
+        cache.set(("s1", None, None, 0, 100), "s1", b"pagina")
+        assert cache.get(("s1", None, None, 0, 100)) == b"pagina"
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+        assert stats["size_bytes"] == len(b"pagina") + ENTRY_OVERHEAD
+
+    def test_invalidate_session_only_removes_its_pages(self):
+        """La invalidación elimina todas las páginas de la sesión y solo esas"""
+        cache = SessionPageCache(max_bytes=10_000, ttl=60)
+        cache.set(("s1", None, None, 0, 100), "s1", b"a")
+        cache.set(("s1", "user", None, 0, 100), "s1", b"b")
+        cache.set(("s2", None, None, 0, 100), "s2", b"c")
+
+        assert cache.invalidate_session("s1") == 2
+        assert cache.get(("s1", None, None, 0, 100)) is None
+        assert cache.get(("s1", "user", None, 0, 100)) is None
+        assert cache.get(("s2", None, None, 0, 100)) == b"c"
+        assert cache.stats()["size_bytes"] == 1 + ENTRY_OVERHEAD
+
+    def test_stale_token_is_not_cached(self):
+        """Una página leída antes de una escritura concurrente no se guarda"""
+        cache = SessionPageCache(max_bytes=10_000, ttl=60)
+        token = cache.token("s1")
+        cache.invalidate_session("s1")
+
+        assert cache.set(("s1",), "s1", b"antigua", token) is False
+        assert cache.get(("s1",)) is None
+        assert cache.set(("s1",), "s1", b"nueva", cache.token("s1")) is True
+
+    def test_stale_entry_is_discarded(self):
+        """get() con is_fresh descarta la entrada que ya no corresponde a la versión vigente"""
+        cache = SessionPageCache(max_bytes=10_000, ttl=60)
+        cache.set(("s1",), "s1", ('"v1"', b"pagina"), size=6)
+
+        assert cache.get(("s1",), lambda value: value[0] == '"v1"') == ('"v1"', b"pagina")
+        assert cache.get(("s1",), lambda value: value[0] == '"v2"') is None
+        assert cache.get(("s1",)) is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["stale"], stats["entries"], stats["size_bytes"]) == (1, 1, 0, 0)
+
+    def test_lru_eviction_respects_budget(self):
+        """Al superar el presupuesto se desaloja la entrada usada hace más tiempo"""
+        value = b"x" * 100
+        cache = SessionPageCache(max_bytes=3 * (len(value) + ENTRY_OVERHEAD), ttl=60)
+        for key in ("a", "b", "c"):
+            cache.set(key, key, value)
+        cache.get("a")  # "b" pasa a ser la menos reciente
+        cache.set("d", "d", value)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == cache.get("c") == cache.get("d") == value
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["size_bytes"] <= stats["max_bytes"]
+
+    def test_oversized_value_is_not_cached(self):
+        """Un valor mayor que el presupuesto completo no se guarda"""
+        cache = SessionPageCache(max_bytes=1000, ttl=60)
+        assert cache.set("a", "s1", b"x" * 1000) is False
+        assert cache.stats()["entries"] == 0
+
+    def test_ttl_expiration(self):
+        """Las entradas vencidas cuentan como fallo y se eliminan"""
+        cache = SessionPageCache(max_bytes=10_000, ttl=5)
+        with patch("core.cache.time.monotonic", return_value=100.0):
+            cache.set("a", "s1", b"valor")
+        with patch("core.cache.time.monotonic", return_value=104.0):
+            assert cache.get("a") == b"valor"
+        with patch("core.cache.time.monotonic", return_value=105.0):
+            assert cache.get("a") is None
+
+        stats = cache.stats()
+        assert stats["expirations"] == 1
+        assert stats["entries"] == 0
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import pytest
+from unittest.mock import patch
+from core.corpus import CorpusStore, get_corpus_store, reload_corpus
+
+
+def write_corpus(path, words):
+    with open(path, 'w') as f:
+        json.dump({"banned_words": words}, f)
+
+
+class TestCorpusStore:
+
+    def test_loads_once_and_serves_from_memory(self, tmp_path):
+        """El corpus se lee una sola vez mientras el archivo no cambie"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["Scam", "fraude"])
+        store = CorpusStore(str(path), reload_interval=3600)
+
+        first = store.get()
+        for _ in range(100):
+            assert store.get() is first
+
+        assert first.words == ("scam", "fraude")
+        assert store.load_count == 1
+        assert store.reload_count == 0
+        assert store.check_count == 1
+
+    def test_reloads_when_file_changes(self, tmp_path):
+        """Se recarga cuando cambia el contenido del archivo"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        store = CorpusStore(str(path), reload_interval=0)
+        old = store.get()
+
+        write_corpus(path, ["scam", "robo", "estafa"])
+        new = store.get()
+
+        assert new is not old
+        assert new.words == ("scam", "robo", "estafa")
+        # el snapshot anterior no se modifica (peticiones en curso)
+        assert old.words == ("scam",)
+        assert store.reload_count == 1
+
+    def test_same_content_keeps_snapshot(self, tmp_path):
+        """Un cambio de mtime sin cambio de contenido no recompila el corpus"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        store = CorpusStore(str(path), reload_interval=0)
+        snapshot = store.get()
+
+        matcher = snapshot.compiled("matcher", lambda words: object())
+        os.utime(path, ns=(snapshot.mtime_ns + 10**9, snapshot.mtime_ns + 10**9))
+        touched = store.get()
+        assert touched.words is snapshot.words
+        assert touched.compiled("matcher", lambda words: object()) is matcher
+        assert touched.mtime_ns == snapshot.mtime_ns + 10**9
+        assert store.reload_count == 0
+
+    def test_same_content_updates_stat(self, tmp_path):
+        """Tras un touch se guarda el mtime nuevo: las comprobaciones siguientes no vuelven a calcular el hash"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        store = CorpusStore(str(path), reload_interval=0)
+        snapshot = store.get()
+        os.utime(path, ns=(snapshot.mtime_ns + 10**9, snapshot.mtime_ns + 10**9))
+
+        with patch("core.corpus.hashlib.sha256", wraps=hashlib.sha256) as sha256:
+            for _ in range(10):
+                store.get()
+        assert sha256.call_count == 1
+
+    def test_invalid_file_keeps_previous_snapshot(self, tmp_path):
+        """Si el archivo queda inválido se sigue sirviendo el último corpus válido"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        store = CorpusStore(str(path), reload_interval=0)
+        snapshot = store.get()
+
+        path.write_text("{ invalid json ")
+        assert store.get() is snapshot
+
+    def test_first_load_errors_propagate(self, tmp_path):
+        """En la primera carga los errores se propagan"""
+        store = CorpusStore(str(tmp_path / "no_existe.json"))
+        with pytest.raises(FileNotFoundError):
+            store.get()
+
+    def test_explicit_reload_hook(self, tmp_path):
+        """reload_corpus fuerza la relectura aunque no haya vencido el intervalo"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        store = get_corpus_store(str(path))
+        store.reload_interval = 3600
+        store.get()
+
+        write_corpus(path, ["robo"])
+        reload_corpus(str(path))
+
+        assert store.get().words == ("robo",)
+        assert store.stats()["reloads"] == 1
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import random
+import struct
+import pytest
+from unittest.mock import patch
+from core.corpus import CorpusStore, normalize_words
+from core.corpus_artifact import (
+    ARTIFACT_VERSION, CorpusArtifact, artifact_path_for, compile_corpus
+)
+from services.message_service import BKTreeMatcher, LinearMatcher, MappedBKTreeMatcher, MessageProcessingService
+
+
+def write_corpus(path, words):
+    with open(path, 'w') as f:
+        json.dump({"banned_words": words}, f)
+
+
+def random_words(rng, count, alphabet="abcdeilmnorstuáéñ"):
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 10))) for _ in range(count)]
+
+
+class TestCorpusArtifact:
+
+    def test_round_trip(self, tmp_path):
+        """El artefacto contiene las palabras normalizadas y el hash del JSON de origen"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["Scam", "fraude", "SCAM", "discriminación", ""])
+        stats = compile_corpus(str(path))
+
+        assert stats["path"] == str(tmp_path / "corpus.bin") == artifact_path_for(str(path))
+        artifact = CorpusArtifact(stats["path"])
+        assert tuple(artifact.words) == normalize_words(json.loads(path.read_text()))
+        assert artifact.words[-2] == "discriminación"
+        assert artifact.source_digest == hashlib.sha256(path.read_bytes()).hexdigest()
+        # la palabra vacía no entra en el índice
+        assert artifact.node_count == stats["nodes"] == 3
+        artifact.close()
+
+    def test_mapped_matcher_same_result_as_linear_loop(self, tmp_path):
+        """El BK-tree leído del mmap devuelve lo mismo que el construido en memoria y el recorrido lineal"""
+        rng = random.Random(11)
+        corpus = list(dict.fromkeys(random_words(rng, 300)))
+        path = tmp_path / "corpus.json"
+        write_corpus(path, corpus)
+        artifact = CorpusArtifact(compile_corpus(str(path))["path"])
+        mapped = MappedBKTreeMatcher(artifact, 80)
+        linear = LinearMatcher(corpus, 80)
+        in_memory = BKTreeMatcher(corpus, 80)
+
+        for _ in range(300):
+            tokens = random_words(rng, rng.randint(1, 8))
+            assert mapped.find(tokens) == in_memory.find(tokens) == linear.find(tokens)
+
+    def test_empty_corpus(self, tmp_path):
+        """Un artefacto de un corpus vacío nunca detecta palabras"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, [])
+        artifact = CorpusArtifact(compile_corpus(str(path))["path"])
+        assert len(artifact.words) == 0
+        assert MappedBKTreeMatcher(artifact, 80).find(["scam"]) is None
+
+    def test_rejects_other_version_and_truncated_files(self, tmp_path):
+        """Un artefacto de otra versión del formato o truncado no se mapea"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam", "fraude"])
+        artifact_path = compile_corpus(str(path))["path"]
+        data = bytearray(open(artifact_path, 'rb').read())
+
+        other_version = tmp_path / "other.bin"
+        other_version.write_bytes(data[:8] + struct.pack("<I", ARTIFACT_VERSION + 1) + data[12:])
+        with pytest.raises(ValueError, match="Versión"):
+            CorpusArtifact(str(other_version))
+
+        truncated = tmp_path / "truncated.bin"
+        truncated.write_bytes(data[:-3])
+        with pytest.raises(ValueError, match="truncado"):
+            CorpusArtifact(str(truncated))
+
+
+class TestCorpusStoreWithArtifact:
+
+    def test_uses_artifact_when_present(self, tmp_path):
+        """Con artefacto las palabras se leen del mmap; el snapshot es equivalente al del JSON"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["Scam", "fraude"])
+        from_json = CorpusStore(str(path), reload_interval=3600).get()
+        compile_corpus(str(path))
+
+        store = CorpusStore(str(path), reload_interval=3600)
+        snapshot = store.get()
+        assert snapshot.artifact is not None
+        assert tuple(snapshot.words) == from_json.words == ("scam", "fraude")
+        assert snapshot.digest == from_json.digest
+        assert store.stats()["source"] == "artifact"
+
+    def test_falls_back_to_json_without_artifact(self, tmp_path):
+        """Sin artefacto, o con artifact_path="", se usa el JSON"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        assert CorpusStore(str(path)).get().artifact is None
+
+        compile_corpus(str(path))
+        store = CorpusStore(str(path), artifact_path="")
+        assert store.get().artifact is None
+        assert store.stats()["source"] == "json"
+
+    def test_stale_artifact_is_ignored(self, tmp_path):
+        """Un artefacto compilado de otra versión del JSON se ignora"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        compile_corpus(str(path))
+        write_corpus(path, ["scam", "robo"])
+
+        snapshot = CorpusStore(str(path)).get()
+        assert snapshot.artifact is None
+        assert snapshot.words == ("scam", "robo")
+
+    def test_stale_artifact_is_not_remapped_on_every_check(self, tmp_path):
+        """Tras un touch del JSON el artefacto obsoleto se comprueba una vez, no en cada acceso"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        compile_corpus(str(path))
+        write_corpus(path, ["scam", "robo"])
+        store = CorpusStore(str(path), reload_interval=0)
+        snapshot = store.get()
+        os.utime(path, ns=(snapshot.mtime_ns + 10**9, snapshot.mtime_ns + 10**9))
+
+        with patch("core.corpus.CorpusArtifact", wraps=CorpusArtifact) as mapped:
+            for _ in range(10):
+                assert store.get().words == ("scam", "robo")
+        assert mapped.call_count == 1
+
+    def test_invalid_artifact_is_ignored(self, tmp_path):
+        """Un archivo que no es un artefacto válido no impide cargar el corpus"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        (tmp_path / "corpus.bin").write_bytes(b"no es un artefacto")
+
+        snapshot = CorpusStore(str(path)).get()
+        assert snapshot.artifact is None
+        assert snapshot.words == ("scam",)
+
+    def test_switches_to_artifact_when_compiled(self, tmp_path):
+        """Al compilar (o recompilar) el artefacto el store pasa a usarlo en la siguiente comprobación"""
+        path = tmp_path / "corpus.json"
+        write_corpus(path, ["scam"])
+        store = CorpusStore(str(path), reload_interval=0)
+        assert store.get().artifact is None
+
+        compile_corpus(str(path))
+        snapshot = store.get()
+        assert snapshot.artifact is not None
+        assert store.get() is snapshot
+
+        write_corpus(path, ["robo"])
+        compile_corpus(str(path))
+        new = store.get()
+        assert new is not snapshot and new.artifact is not None
+        assert tuple(new.words) == ("robo",)
+        # el snapshot anterior sigue leyendo el artefacto que tenía mapeado
+        assert tuple(snapshot.words) == ("scam",)
+
+    def test_service_uses_mapped_matcher(self, mock_corpus_file):
+        """El servicio usa el índice del artefacto junto a CORPUS_FILE_PATH"""
+        artifact_path = compile_corpus(mock_corpus_file)["path"]
+        try:
+            service = MessageProcessingService()
+            service.reload_corpus()
+            assert isinstance(service._get_matcher(), MappedBKTreeMatcher)
+            assert service._contains_banned_words("Es una estafa!") == "estafa"
+            assert service._contains_banned_words("Hola mundo") is None
+        finally:
+            os.unlink(artifact_path)
@@ -0,0 +1,109 @@
+import os
+import pytest
+from unittest.mock import patch
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+from core.database import ShardSet, create_db_engine, get_database_url, get_pragma_profile, init_db, shard_index, shard_urls
+from models import session_stats_model  # noqa: F401 (registra la tabla)
+
+
+def pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+class TestDatabaseEngineFactory:
+
+    def test_database_url_from_environment(self):
+        """DATABASE_URL define la base de datos usada"""
+        with patch.dict(os.environ, {"DATABASE_URL": "sqlite:///otra.db"}):
+            assert get_database_url() == "sqlite:///otra.db"
+
+    def test_performance_profile_pragmas(self, tmp_path):
+        """El perfil performance activa WAL y synchronous=NORMAL en cada conexión"""
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'perf.db'}", profile="performance")
+
+        assert pragma(engine, "journal_mode") == "wal"
+        assert pragma(engine, "synchronous") == 1  # NORMAL
+        assert pragma(engine, "busy_timeout") == 5000
+        assert pragma(engine, "temp_store") == 2  # MEMORY
+        engine.dispose()
+
+    def test_default_profile_keeps_sqlite_defaults(self, tmp_path):
+        """El perfil default no modifica el journal de SQLite"""
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'default.db'}", profile="default")
+        assert pragma(engine, "journal_mode") == "delete"
+        engine.dispose()
+
+    def test_creates_parent_directory(self, tmp_path):
+        """Se crea el directorio del archivo SQLite si no existe"""
+        db_path = tmp_path / "nueva" / "carpeta" / "messages.db"
+        engine = create_db_engine(f"sqlite:///{db_path}")
+        with engine.connect():
+            pass
+        assert db_path.exists()
+        engine.dispose()
+
+    def test_pool_settings_from_environment(self, tmp_path):
+        """DB_POOL_SIZE y DB_MAX_OVERFLOW configuran el pool"""
+        with patch.dict(os.environ, {"DB_POOL_SIZE": "3", "DB_MAX_OVERFLOW": "7"}):
+            engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+        assert engine.pool.size() == 3
+        assert engine.pool._max_overflow == 7
+        engine.dispose()
+
+    def test_memory_database_uses_static_pool(self):
+        """Una base en memoria comparte una única conexión"""
+        engine = create_db_engine("sqlite:///:memory:")
+        assert isinstance(engine.pool, StaticPool)
+
+    def test_unknown_profile(self):
+        """Un perfil desconocido es un error de configuración"""
+        with patch.dict(os.environ, {"SQLITE_PRAGMA_PROFILE": "turbo"}):
+            with pytest.raises(ValueError):
+                get_pragma_profile()
+
+    def test_init_db_adds_missing_columns(self, tmp_path):
+        """init_db añade columnas nuevas de los modelos a tablas creadas con versiones anteriores"""
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE session_stats (session_id VARCHAR NOT NULL, sender VARCHAR NOT NULL, "
+                "message_count INTEGER NOT NULL, PRIMARY KEY (session_id, sender))"
+            ))
+            conn.execute(text("INSERT INTO session_stats VALUES ('s1', 'user', 4)"))
+
+        init_db(engine)
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT message_count, version FROM session_stats")).one() == (4, 0)
+        engine.dispose()
+
+
+class TestDatabaseShards:
+
+    def test_shard_urls_from_database_url(self):
+        """Los archivos de los shards se derivan de DATABASE_URL"""
+        with patch.dict(os.environ, {"DATABASE_URL": "sqlite:///./data/messages.db"}):
+            os.environ.pop("DATABASE_SHARD_URL", None)
+            assert shard_urls(2) == ["sqlite:///./data/messages_shard0.db", "sqlite:///./data/messages_shard1.db"]
+
+    def test_shard_urls_template(self):
+        """DATABASE_SHARD_URL define la URL de cada shard con {shard}"""
+        with patch.dict(os.environ, {"DATABASE_SHARD_URL": "sqlite:////srv/db/part-{shard}.db"}):
+            assert shard_urls(3)[2] == "sqlite:////srv/db/part-2.db"
+
+    def test_shard_index_is_stable(self):
+        """El shard de una clave es estable y los valores se reparten entre todos los shards"""
+        assert shard_index("session-abc", 8) == shard_index("session-abc", 8)
+        assert {shard_index(f"session-{n}", 8) for n in range(200)} == set(range(8))
+
+    def test_memory_shards_are_independent(self):
+        """Con una base en memoria cada shard es una base distinta"""
+        shards = ShardSet(shard_urls(2, "sqlite:///:memory:"))
+        shards.init()
+        with shards.engines[0].begin() as conn:
+            conn.execute(text("INSERT INTO session_stats (session_id, sender, message_count, version) "
+                              "VALUES ('s', 'user', 1, 1)"))
+        with shards.engines[1].connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM session_stats")).scalar() == 0
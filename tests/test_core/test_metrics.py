@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import pytest
+from core.metrics import MetricsRegistry, merge_snapshots, record_stage, render_snapshots, stage_timer
+from core import metrics
+from core.cache import SessionPageCache, get_page_cache
+from core.corpus import CorpusStore
+
+
+def sample(text: str, line: str) -> float:
+    """Valor de una línea de la exposición de texto"""
+    for row in text.splitlines():
+        if row.startswith(line + " "):
+            return float(row.rsplit(" ", 1)[1])
+    return 0.0
+
+
+class TestMetricsRegistry:
+
+    def test_counter_and_histogram_render(self):
+        """Contadores e histogramas se exportan con el formato de Prometheus"""
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Peticiones", ("status",))
+        latency = registry.histogram("latency_seconds", "Latencia", ("stage",), buckets=(0.01, 0.1))
+        requests.inc("200")
+        requests.inc("200", amount=2)
+        latency.observe(0.005, "auth")
+        latency.observe(0.05, "auth")
+        latency.observe(5, "auth")
+
+        text = registry.render()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{status="200"} 3' in text
+        assert 'latency_seconds_bucket{stage="auth",le="0.01"} 1' in text
+        assert 'latency_seconds_bucket{stage="auth",le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{stage="auth",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{stage="auth"} 3' in text
+        assert sample(text, 'latency_seconds_sum{stage="auth"}') == pytest.approx(5.055)
+
+    def test_threads_record_without_losing_values(self):
+        """Cada hilo registra en su shard y el snapshot suma todos"""
+        registry = MetricsRegistry()
+        counter = registry.counter("hits_total", "Hits")
+
+        def hit():
+            for _ in range(10000):
+                counter.inc()
+
+        threads = [threading.Thread(target=hit) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert "hits_total 80000" in registry.render()
+
+    def test_merge_snapshots_drops_dead_gauges(self):
+        """Con varios procesos se suman los valores; los gauges de procesos terminados se descartan"""
+        registry = MetricsRegistry()
+        registry.counter("hits_total", "Hits").inc(amount=2)
+        registry.gauge("in_flight", "En curso").inc(amount=3)
+        own = registry.snapshot()
+        dead = {**own, "pid": 2 ** 22 + 1}  # pid fuera del rango habitual: proceso inexistente
+
+        text = render_snapshots([own, dead])
+        assert "hits_total 4" in text
+        assert "in_flight 3" in text
+        assert len(merge_snapshots([own, dead])) == 2
+
+    def test_snapshots_in_metrics_dir(self, tmp_path, monkeypatch):
+        """Con METRICS_DIR /metrics agrega los snapshots volcados por otros workers"""
+        monkeypatch.setenv("METRICS_DIR", str(tmp_path))
+        other = metrics.registry.snapshot()
+        other["pid"] = os.getppid()
+        for metric in other["metrics"]:
+            if metric["name"] == "api_errors_total":
+                metric["samples"] = [[["TEST_CODE"], [5]]]
+        (tmp_path / f"metrics-{other['pid']}.json").write_text(json.dumps(other))
+        metrics.write_snapshot(str(tmp_path))
+
+        assert 'api_errors_total{code="TEST_CODE"} 5' in metrics.render_metrics()
+
+
+class TestComponentStats:
+
+    def test_page_cache_counters(self):
+        """Los aciertos, fallos y desalojos de la caché de páginas se exportan como gauges"""
+        cache = SessionPageCache(max_bytes=10_000, ttl=60)
+        metrics.monitor_page_cache(lambda: cache)
+        try:
+            cache.get("pagina")
+            cache.set("pagina", "s1", b"contenido")
+            cache.get("pagina")
+            cache.get("pagina")
+            text = metrics.registry.render()
+        finally:
+            metrics.monitor_page_cache(get_page_cache)
+        assert sample(text, "api_page_cache_hits") == 2
+        assert sample(text, "api_page_cache_misses") == 1
+        assert sample(text, "api_page_cache_evictions") == 0
+
+    def test_disabled_page_cache_has_no_samples(self):
+        """Sin caché de páginas los gauges no tienen muestras"""
+        metrics.monitor_page_cache(lambda: None)
+        try:
+            text = metrics.registry.render()
+        finally:
+            metrics.monitor_page_cache(get_page_cache)
+        assert "# TYPE api_page_cache_hits gauge" in text
+        assert "\napi_page_cache_hits " not in text
+
+
+    def test_corpus_counters(self, tmp_path):
+        """Las cargas, recargas y el origen del corpus se exportan como gauges"""
+        path = tmp_path / "corpus.json"
+        path.write_text(json.dumps({"banned_words": ["scam"]}))
+        store = CorpusStore(str(path), reload_interval=0)
+        metrics.monitor_corpus(store.stats)
+        store.get()
+        path.write_text(json.dumps({"banned_words": ["scam", "robo"]}))
+        store.get()
+        store.get()
+        text = metrics.registry.render()
+        assert sample(text, "api_corpus_loads") == 1
+        assert sample(text, "api_corpus_reloads") == 1
+        assert sample(text, 'api_corpus_source{source="json"}') == 1
+
+
+class TestStageTimer:
+
+    def test_stage_outside_request_observed_directly(self):
+        """Fuera de una petición (p. ej. el escritor write-behind) la etapa se observa al momento"""
+        before = sample(metrics.registry.render(), 'api_request_stage_seconds_count{stage="db_commit"}')
+        with stage_timer("db_commit"):
+            pass
+        after = sample(metrics.registry.render(), 'api_request_stage_seconds_count{stage="db_commit"}')
+        assert after == before + 1
+
+    def test_stage_inside_request_accumulated(self):
+        """Dentro de una petición las etapas se acumulan y se observan una sola vez"""
+        timer = metrics.RequestTimer()
+        token = metrics.request_timer.set(timer)
+        try:
+            record_stage("db_query", 0.25)
+            record_stage("db_query", 0.5)
+        finally:
+            metrics.request_timer.reset(token)
+        assert timer.stages == {"db_query": 0.75}
@@ -0,0 +1,79 @@
+import threading
+import time
+from core.profiler import ProfileSession, frame_label
+
+
+def busy_loop(stop: threading.Event):
+    total = 0
+    while not stop.is_set():
+        total += sum(range(1000))
+    return total
+
+
+class TestProfileSession:
+
+    def test_samples_busy_thread(self):
+        """La función que ocupa la CPU aparece con muestras propias y en las pilas colapsadas"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,))
+        worker.start()
+        try:
+            session = ProfileSession(seconds=0.3, interval=0.001)
+            session.start()
+            assert session.wait(5)
+        finally:
+            stop.set()
+            worker.join()
+        label = "test_profiler:busy_loop"
+        top = {row["function"]: row for row in session.top_functions()}
+        assert top[label]["self_samples"] > 0
+        assert top[label]["total_samples"] >= top[label]["self_samples"]
+        assert any(stack.endswith(label) for stack in session.stacks)
+        assert dict(session.by_module())["test_profiler"] > 0
+
+    def test_idle_threads_skipped(self):
+        """Los hilos en espera no cuentan como muestras salvo con include_idle"""
+        stop = threading.Event()
+        waiter = threading.Thread(target=stop.wait)
+        waiter.start()
+        try:
+            session = ProfileSession(seconds=0.1, interval=0.005)
+            session.start()
+            session.wait(5)
+            idle = ProfileSession(seconds=0.1, interval=0.005, include_idle=True)
+            idle.start()
+            idle.wait(5)
+        finally:
+            stop.set()
+            waiter.join()
+        assert session.idle_samples > 0
+        assert not any(stack.endswith("threading:Event.wait;threading:Condition.wait") for stack in session.stacks)
+        assert any(stack.endswith("threading:Condition.wait") for stack in idle.stacks)
+
+    def test_stops_after_requests(self):
+        """Con requests la sesión termina al contar esas peticiones, antes de seconds"""
+        session = ProfileSession(seconds=30, requests=2, interval=0.005)
+        session.start()
+        session.request_finished()
+        assert session.running
+        session.request_finished()
+        assert session.wait(5)
+        assert session.requests_seen == 2
+        assert session.elapsed < 30
+
+    def test_collapsed_format(self):
+        """Formato colapsado: raíz;...;hoja seguido del número de muestras"""
+        session = ProfileSession(seconds=0)
+        session.stacks.update({"a:main;b:handler;c:ratio": 3, "a:main;b:handler": 1})
+        session.samples = 4
+        assert session.collapsed() == "a:main;b:handler;c:ratio 3\na:main;b:handler 1\n"
+        top = session.top_functions()
+        assert top[0] == {"function": "c:ratio", "self_samples": 3, "total_samples": 3,
+                          "self_pct": 75.0, "total_pct": 75.0}
+        assert {"function": "a:main", "self_samples": 0, "total_samples": 4,
+                "self_pct": 0.0, "total_pct": 100.0} in top
+
+    def test_frame_label(self):
+        assert frame_label(TestProfileSession.test_frame_label.__code__) == (
+            "test_profiler:TestProfileSession.test_frame_label"
+        )
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import threading
+import pytest
+from unittest.mock import patch
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+from core.rate_limit import BUCKET_SLOTS, SharedMemoryStorage, limiter
+
+
+def _hammer(path, key, hits):
+    storage = SharedMemoryStorage(f"sharedmem://{path}")
+    for _ in range(hits):
+        storage.incr(key, 60)
+
+
+def _hit_and_exit(path, key, hits):
+    _hammer(path, key, hits)
+    os._exit(0)
+
+
+class TestSharedMemoryStorage:
+
+    def test_storage_scheme(self, tmp_path):
+        """El esquema sharedmem:// crea el almacenamiento compartido"""
+        storage = storage_from_string(f"sharedmem://{tmp_path / 'rl.bin'}?slots=64")
+        assert isinstance(storage, SharedMemoryStorage)
+        assert storage.slots == 64
+
+    def test_counters_and_expiry(self, tmp_path):
+        """incr/get/clear con expiración de las claves"""
+        storage = SharedMemoryStorage(f"sharedmem://{tmp_path / 'rl.bin'}")
+        with patch("core.rate_limit.time.time", return_value=1000.0):
+            assert storage.incr("ip-1", 60) == 1
+            assert storage.incr("ip-1", 60, amount=2) == 3
+            assert storage.get("ip-1") == 3
+            assert storage.get_expiry("ip-1") == 1060.0
+            assert storage.decr("ip-1") == 2
+        with patch("core.rate_limit.time.time", return_value=1060.0):
+            assert storage.get("ip-1") == 0
+            assert storage.incr("ip-1", 60) == 1
+
+        storage.clear("ip-1")
+        assert storage.get("ip-1") == 0
+
+    def test_sliding_window_strategy(self, tmp_path):
+        """La estrategia sliding-window-counter de limits funciona sobre el almacenamiento"""
+        limiter_strategy = SlidingWindowCounterRateLimiter(SharedMemoryStorage(f"sharedmem://{tmp_path / 'rl.bin'}"))
+        item = parse("5/minute")
+        assert [limiter_strategy.hit(item, "ip-1") for _ in range(7)] == [True] * 5 + [False] * 2
+        assert limiter_strategy.hit(item, "ip-2")
+
+    def test_memory_is_bounded(self, tmp_path):
+        """Con más claves que slots se desalojan entradas y el archivo no crece"""
+        path = tmp_path / "rl.bin"
+        storage = SharedMemoryStorage(f"sharedmem://{path}?slots={2 * BUCKET_SLOTS}")
+        storage.incr("inicial", 60)
+        size = os.path.getsize(path)
+
+        for i in range(1000):
+            storage.incr(f"ip-{i}", 60)
+
+        assert os.path.getsize(path) == size
+        assert storage.stats()["evictions"] > 0
+        assert storage.incr("ip-999", 60) == 2  # la clave más reciente sigue en la tabla
+        assert storage.reset() <= 2 * BUCKET_SLOTS
+
+    def test_shared_between_processes(self, tmp_path):
+        """Los contadores son comunes a todos los procesos que usan el mismo archivo"""
+        path = tmp_path / "rl.bin"
+        storage = SharedMemoryStorage(f"sharedmem://{path}")
+        storage.incr("ip-compartida", 60, amount=0)
+
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=_hammer, args=(path, "ip-compartida", 200)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert all(worker.exitcode == 0 for worker in workers)
+        assert storage.get("ip-compartida") == 800
+
+    def test_counters_do_not_survive_restart(self, tmp_path):
+        """Una tabla que ya no usa ningún proceso vivo (ejecución anterior) se reinicia al abrirla"""
+        path = tmp_path / "rl.bin"
+        worker = multiprocessing.get_context("fork").Process(target=_hit_and_exit, args=(path, "ip-1", 5))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+
+        storage = SharedMemoryStorage(f"sharedmem://{path}")
+        assert storage.get("ip-1") == 0
+        storage.incr("ip-1", 60)
+        # una segunda instancia del mismo proceso no la reinicia
+        assert SharedMemoryStorage(f"sharedmem://{path}").get("ip-1") == 1
+
+    def test_stats_are_exact_under_concurrency(self, tmp_path):
+        """Las comprobaciones de hilos en buckets distintos no se pierden en stats()"""
+        storage = SharedMemoryStorage(f"sharedmem://{tmp_path / 'rl.bin'}")
+        threads = [threading.Thread(target=lambda i=i: [storage.incr(f"ip-{i}-{n}", 60) for n in range(500)])
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert storage.stats()["checks"] == 8 * 500
+
+    def test_default_path_is_in_app_data(self):
+        """Sin ruta en la URI la tabla vive en data/ de la app, no en el directorio temporal del sistema"""
+        assert SharedMemoryStorage("sharedmem://").path == os.path.join("data", "ratelimit.bin")
+
+    def test_single_app_limiter(self):
+        """La app y los routers comparten la misma instancia de Limiter"""
+        from main import app
+        from controllers import message_controller, async_message_controller
+        assert app.state.limiter is limiter
+        assert message_controller.limiter is limiter
+        assert async_message_controller.limiter is limiter
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from core.metrics import MetricsRoute, RequestTimer, stage_timer, record_stage
+from core.timing import ServerTimingMiddleware, server_timing_header
+
+
+def build_app() -> FastAPI:
+    router = APIRouter(route_class=MetricsRoute)
+
+    @router.get("/sync")
+    def sync_endpoint():
+        # endpoint síncrono: se ejecuta en el threadpool con el contexto de la petición
+        with stage_timer("banned_word_scan"):
+            pass
+        record_stage("db_query", 0.002)
+        return {"ok": True}
+
+    @router.get("/async")
+    async def async_endpoint():
+        record_stage("db_commit", 0.001)
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(ServerTimingMiddleware)
+    return app
+
+
+def parse_header(value: str) -> dict:
+    entries = {}
+    for entry in value.split(", "):
+        name, *params = entry.split(";")
+        entries[name] = dict(param.split("=", 1) for param in params)
+    return entries
+
+
+class TestServerTiming:
+
+    def test_header_format(self):
+        """Las etapas se listan en orden fijo con su duración en ms, más el total"""
+        timer = RequestTimer()
+        timer.stages = {"db_query": 0.0025, "banned_word_scan": 0.001}
+        assert server_timing_header(timer, 0.01) == (
+            'banned_word_scan;desc="Moderacion";dur=1.000, db_query;desc="Consulta";dur=2.500, total;dur=10.000'
+        )
+
+    def test_middleware_sync_endpoint(self):
+        """Las etapas medidas en un endpoint síncrono llegan a la cabecera"""
+        with TestClient(build_app()) as client:
+            response = client.get("/sync")
+        entries = parse_header(response.headers["server-timing"])
+        assert {"validation", "banned_word_scan", "db_query", "serialization", "total"} <= set(entries)
+        assert entries["db_query"]["dur"] == "2.000"
+
+    def test_middleware_async_endpoint(self):
+        """También en endpoints async def; cada petición tiene su propio timer"""
+        with TestClient(build_app()) as client:
+            client.get("/sync")
+            response = client.get("/async")
+        entries = parse_header(response.headers["server-timing"])
+        assert entries["db_commit"]["dur"] == "1.000"
+        assert "db_query" not in entries
+
+    def test_disabled_by_default(self, client):
+        """Sin SERVER_TIMING_ENABLED la app no añade la cabecera"""
+        response = client.get("/")
+        assert "server-timing" not in response.headers
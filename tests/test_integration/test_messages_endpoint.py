@@ -1,4 +1,17 @@
-from fastapi import status
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from controllers import message_controller
+from dependencies.services import get_message_processing_service
+from core.cache import get_page_cache
+from schemas.message_schema import MessageRequestSchema
+from services.message_service import MessageProcessingService, MessageStorageService
+from services.write_behind import WriteBehindWriter, get_write_behind_writer
 
 
 class TestMessagesEndpointIntegration:
@@ -240,4 +253,594 @@ class TestMessagesEndpointIntegration:
 
         assert response.status_code == status.HTTP_200_OK
         response_time = end_time - start_time #calcular tiempo de respuesta
-        assert response_time < 2.0 #menos de 2 segundos
\ No newline at end of file
+        assert response_time < 2.0 #menos de 2 segundos
+    def test_get_messages_cursor_pagination(self, client, auth_headers, mock_corpus_file):
+        """Test de paginación por cursor en GET /api/messages/{session_id}"""
+        for i in range(3):
+            message_data = {
+                "message_id": f"msg-cursor-{i}",
+                "session_id": "session-cursor",
+                "content": f"Mensaje {i}",
+                "timestamp": f"2023-06-15T19:0{i}:00Z",
+                "sender": "user"
+            }
+            assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+
+        first = client.get("/api/messages/session-cursor?limit=2", headers=auth_headers).json()
+        assert [m["data"]["message_id"] for m in first["messages"]] == ["msg-cursor-0", "msg-cursor-1"]
+        assert first["next_cursor"]
+
+        second = client.get(f"/api/messages/session-cursor?limit=2&cursor={first['next_cursor']}",
+                            headers=auth_headers).json()
+        assert [m["data"]["message_id"] for m in second["messages"]] == ["msg-cursor-2"]
+        assert second["next_cursor"] is None
+
+        # total es el tamaño real de la sesión, no el de la página
+        assert first["total"] == 3
+        assert first["count"] == 2
+
+        invalid = client.get("/api/messages/session-cursor?cursor=invalido", headers=auth_headers)
+        assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+        assert invalid.json()["detail"]["error"]["code"] == "INVALID_CURSOR"
+
+    def test_get_messages_fast_path_same_response(self, client, auth_headers, mock_corpus_file, monkeypatch):
+        """El GET con filas codificadas a JSON responde lo mismo que con MessagesListSchema"""
+        for i in range(3):
+            message_data = {
+                "message_id": f"msg-fast-{i}",
+                "session_id": "session-fast",
+                "content": f"Mensaje número {i} con acentos: ¿qué tal?",
+                "timestamp": f"2023-06-15T20:0{i}:00.123456Z",
+                "sender": "user"
+            }
+            assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+
+        responses = {}
+        for fast_path in (True, False):
+            monkeypatch.setattr(message_controller, "RETRIEVAL_FAST_PATH", fast_path)
+            response = client.get("/api/messages/session-fast?limit=2", headers=auth_headers)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.headers["content-type"] == "application/json"
+            responses[fast_path] = response.json()
+
+        assert responses[True] == responses[False]
+        assert responses[True]["total"] == 3
+        assert responses[True]["next_cursor"] is not None
+
+    def test_get_messages_page_cache(self, client, auth_headers, mock_corpus_file):
+        """La misma consulta se sirve desde la caché hasta que se escribe en la sesión"""
+        message_data = {
+            "message_id": "msg-cache-0",
+            "session_id": "session-cache",
+            "content": "Primer mensaje",
+            "timestamp": "2023-06-15T20:00:00Z",
+            "sender": "user"
+        }
+        assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+
+        first = client.get("/api/messages/session-cache", headers=auth_headers)
+        second = client.get("/api/messages/session-cache", headers=auth_headers)
+        assert first.headers["x-cache"] == "MISS"
+        assert second.headers["x-cache"] == "HIT"
+        assert first.content == second.content
+
+        message_data = {**message_data, "message_id": "msg-cache-1", "timestamp": "2023-06-15T20:01:00Z"}
+        assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+
+        third = client.get("/api/messages/session-cache", headers=auth_headers)
+        assert third.headers["x-cache"] == "MISS"
+        assert third.json()["total"] == 2
+
+    def test_page_cache_checks_session_version(self, client, test_db, auth_headers, mock_corpus_file):
+        """Una escritura de otro worker (sin invalidar esta caché) no deja servir la página ni el 304 obsoletos"""
+        message_data = {
+            "message_id": "msg-worker-0",
+            "session_id": "session-worker",
+            "content": "Primer mensaje",
+            "timestamp": "2023-06-15T20:00:00Z",
+            "sender": "user"
+        }
+        assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+        first = client.get("/api/messages/session-worker", headers=auth_headers)
+        assert client.get("/api/messages/session-worker", headers=auth_headers).headers["x-cache"] == "HIT"
+
+        # otro worker: mismo archivo de base de datos, su propia caché de páginas
+        other = {**message_data, "message_id": "msg-worker-1", "timestamp": "2023-06-15T20:01:00Z"}
+        processed = MessageProcessingService().process_message(MessageRequestSchema(**other))
+        MessageStorageService(test_db).save_message(processed)
+
+        stale = client.get("/api/messages/session-worker",
+                           headers={**auth_headers, "If-None-Match": first.headers["etag"]})
+        assert stale.status_code == status.HTTP_200_OK
+        assert stale.headers["x-cache"] == "MISS"
+        assert stale.json()["total"] == 2
+        assert client.app.dependency_overrides[get_page_cache]().stats()["stale"] == 1
+
+    def test_get_messages_etag_not_modified(self, client, auth_headers, mock_corpus_file, monkeypatch):
+        """Con If-None-Match vigente se responde 304 sin cuerpo; tras una escritura cambia el ETag"""
+        message_data = {
+            "message_id": "msg-etag-0",
+            "session_id": "session-etag",
+            "content": "Primer mensaje",
+            "timestamp": "2023-06-15T20:00:00Z",
+            "sender": "user"
+        }
+        assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+
+        for fast_path in (True, False):
+            monkeypatch.setattr(message_controller, "RETRIEVAL_FAST_PATH", fast_path)
+            first = client.get("/api/messages/session-etag", headers=auth_headers)
+            etag = first.headers["etag"]
+            assert first.status_code == status.HTTP_200_OK
+
+            for if_none_match in (etag, f"W/{etag}", f'"otro", {etag}', "*"):
+                response = client.get("/api/messages/session-etag",
+                                      headers={**auth_headers, "If-None-Match": if_none_match})
+                assert response.status_code == status.HTTP_304_NOT_MODIFIED
+                assert response.content == b""
+                assert response.headers["etag"] == etag
+
+        # otra página de la misma sesión tiene otro ETag
+        other = client.get("/api/messages/session-etag?limit=1", headers=auth_headers)
+        assert other.headers["etag"] != etag
+
+        message_data = {**message_data, "message_id": "msg-etag-1", "timestamp": "2023-06-15T20:01:00Z"}
+        assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+
+        response = client.get("/api/messages/session-etag", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["etag"] != etag
+        assert response.json()["total"] == 2
+
+    def test_export_session_ndjson(self, client, auth_headers, mock_corpus_file):
+        """Test de exportación NDJSON de una sesión completa"""
+        for i, sender in enumerate(["user", "system", "user"]):
+            message_data = {
+                "message_id": f"msg-export-{i}",
+                "session_id": "session-export",
+                "content": f"Mensaje {i}",
+                "timestamp": f"2023-06-15T20:0{i}:00Z",
+                "sender": sender
+            }
+            assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+
+        response = client.get("/api/messages/session-export/export", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["message_id"] for line in lines] == ["msg-export-0", "msg-export-1", "msg-export-2"]
+        assert lines[0]["metadata"]["word_count"] == 2
+
+        response = client.get("/api/messages/session-export/export?sender=system", headers=auth_headers)
+        assert [json.loads(line)["message_id"] for line in response.text.splitlines()] == ["msg-export-1"]
+
+        response = client.get("/api/messages/session-inexistente/export", headers=auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestMessagesBatchEndpointIntegration:
+    """test de integración para el endpoint /api/messages/batch"""
+
+    def test_post_batch_mixed_results(self, client, auth_headers, mock_corpus_file):
+        """Lote con mensajes aceptados, palabra prohibida e IDs duplicados"""
+        first = {
+            "message_id": "msg-batch-001",
+            "session_id": "session-batch",
+            "content": "Hola, ¿cómo puedo ayudarte hoy?",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "system"
+        }
+        response = client.post("/api/messages/", json=first, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        batch = [
+            first,
+            {**first, "message_id": "msg-batch-002", "content": "Necesito ayuda con mi cuenta", "sender": "user"},
+            {**first, "message_id": "msg-batch-003", "content": "Esto es un scam"},
+            {**first, "message_id": "msg-batch-002", "content": "Repetido dentro del lote"},
+        ]
+        response = client.post("/api/messages/batch", json=batch, headers=auth_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["accepted"] == 1
+        assert body["rejected"] == 3
+
+        results = body["results"]
+        assert [r["message_id"] for r in results] == ["msg-batch-001", "msg-batch-002", "msg-batch-003", "msg-batch-002"]
+        assert results[0]["error"]["code"] == "DUPLICATE_MESSAGE_ID"
+        assert results[1]["status"] == "accepted"
+        assert results[1]["data"]["metadata"]["word_count"] == 5
+        assert results[2]["error"]["code"] == "BANNED_WORD_DETECTED"
+        assert results[3]["error"]["code"] == "DUPLICATE_MESSAGE_ID"
+
+        stored = client.get("/api/messages/session-batch", headers=auth_headers).json()
+        assert sorted(m["data"]["message_id"] for m in stored["messages"]) == ["msg-batch-001", "msg-batch-002"]
+
+    def test_post_batch_empty(self, client, auth_headers, mock_corpus_file):
+        """Un lote vacío es un error de validación"""
+        response = client.post("/api/messages/batch", json=[], headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_post_batch_without_auth(self, client, mock_corpus_file):
+        """El endpoint de lotes requiere API key"""
+        response = client.post("/api/messages/batch", json=[])
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestIdempotentIngestIntegration:
+    """test de integración de la ingesta idempotente (?on_conflict=)"""
+
+    def test_post_replay_ignore(self, client, auth_headers, mock_corpus_file):
+        """Un reintento con on_conflict=ignore responde 200 con created=false y no duplica el mensaje"""
+        message_data = {
+            "message_id": "msg-idem-001",
+            "session_id": "session-idem",
+            "content": "Hola, ¿cómo puedo ayudarte hoy?",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "system"
+        }
+        response = client.post("/api/messages/?on_conflict=ignore", json=message_data, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["created"] is True
+        etag = client.get("/api/messages/session-idem", headers=auth_headers).headers["etag"]
+
+        response = client.post("/api/messages/?on_conflict=ignore", json=message_data, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["created"] is False
+        response = client.get("/api/messages/session-idem", headers=auth_headers)
+        assert response.json()["total"] == 1
+        assert response.headers["etag"] == etag
+
+        response = client.post("/api/messages/?on_conflict=reject", json=message_data, headers=auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_post_batch_replace(self, client, auth_headers, mock_corpus_file):
+        """on_conflict=replace actualiza los mensajes existentes; created distingue creados y reemplazados"""
+        first = {
+            "message_id": "msg-idem-101",
+            "session_id": "session-idem-batch",
+            "content": "Hola, ¿cómo puedo ayudarte hoy?",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "user"
+        }
+        client.post("/api/messages/", json=first, headers=auth_headers)
+        batch = [{**first, "content": "Contenido corregido"}, {**first, "message_id": "msg-idem-102"}]
+        response = client.post("/api/messages/batch?on_conflict=replace", json=batch, headers=auth_headers)
+
+        body = response.json()
+        assert body["accepted"] == 2
+        assert [r["created"] for r in body["results"]] == [False, True]
+        stored = client.get("/api/messages/session-idem-batch", headers=auth_headers).json()
+        assert stored["total"] == 2
+        assert stored["messages"][0]["data"]["content"] == "Contenido corregido"
+
+    def test_invalid_policy(self, client, auth_headers, mock_corpus_file):
+        """Una política desconocida es un error de validación"""
+        message_data = {
+            "message_id": "msg-idem-201",
+            "session_id": "session-idem",
+            "content": "Hola",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "user"
+        }
+        response = client.post("/api/messages/?on_conflict=merge", json=message_data, headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_invalid_default_policy_fails_at_startup(self, monkeypatch):
+        """Un INGEST_CONFLICT_POLICY inválido impide arrancar la app con un error claro (no al importar)"""
+        monkeypatch.setattr("services.message_service.DEFAULT_CONFLICT_POLICY", "merge")
+        with pytest.raises(RuntimeError, match="INGEST_CONFLICT_POLICY='merge'"):
+            with TestClient(app):
+                pass
+
+
+class TestSharedProcessingServiceIntegration:
+    """test del servicio de procesamiento compartido por el proceso"""
+
+    def test_service_built_once_at_startup(self, mock_corpus_file):
+        """El lifespan construye el servicio y precompila el corpus una sola vez"""
+        with TestClient(app):
+            service = app.state.message_processing_service
+            assert service.corpus_filter_path == mock_corpus_file
+            assert service.corpus_store.stats()["loads"] == 1
+
+            request = SimpleNamespace(app=app)
+            assert get_message_processing_service(request) is service
+            assert get_message_processing_service(request) is service
+
+    def test_service_built_lazily_without_lifespan(self, mock_corpus_file):
+        """En una app sin lifespan el servicio se construye en la primera petición y se reutiliza"""
+        request = SimpleNamespace(app=FastAPI())
+        service = get_message_processing_service(request)
+        assert isinstance(service, MessageProcessingService)
+        assert get_message_processing_service(request) is service
+
+
+class TestWriteBehindEndpointIntegration:
+    """test de integración del modo write-behind (WRITE_BEHIND_ENABLED=true)"""
+
+    def test_post_message_group_commit(self, client, test_engine, auth_headers, mock_corpus_file):
+        """Los mensajes se guardan mediante el escritor y los duplicados se rechazan"""
+        writer = WriteBehindWriter(sessionmaker(bind=test_engine), batch_size=10, flush_interval_ms=5, ack_mode="commit")
+        app.dependency_overrides[get_write_behind_writer] = lambda: writer
+        message_data = {
+            "message_id": "msg-wb-001",
+            "session_id": "session-wb",
+            "content": "Hola, ¿cómo puedo ayudarte hoy?",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "system"
+        }
+        try:
+            response = client.post("/api/messages/", json=message_data, headers=auth_headers)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.json()["data"]["message_id"] == "msg-wb-001"
+
+            response = client.post("/api/messages/", json=message_data, headers=auth_headers)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert response.json()["detail"]["error"]["code"] == "DATABASE_ERROR"
+        finally:
+            writer.close()
+
+        stored = client.get("/api/messages/session-wb", headers=auth_headers).json()
+        assert stored["total"] == 1
+
+
+class TestMetricsEndpointIntegration:
+    """test de integración del endpoint /metrics"""
+
+    @staticmethod
+    def sample(client, line: str) -> float:
+        for row in client.get("/metrics").text.splitlines():
+            if row.startswith(line + " "):
+                return float(row.rsplit(" ", 1)[1])
+        return 0.0
+
+    def test_metrics_stages_and_messages(self, client, auth_headers, mock_corpus_file):
+        """Las peticiones registran sus etapas y los mensajes aceptados o rechazados por código"""
+        accepted = 'api_messages_total{result="accepted",code=""}'
+        banned = 'api_messages_total{result="rejected",code="BANNED_WORD_DETECTED"}'
+        duplicated = 'api_messages_total{result="rejected",code="DATABASE_ERROR"}'
+        before = {line: self.sample(client, line) for line in (accepted, banned, duplicated)}
+        stage_counts = {stage: self.sample(client, f'api_request_stage_seconds_count{{stage="{stage}"}}')
+                        for stage in ("validation", "auth", "banned_word_scan", "db_commit", "db_query", "serialization")}
+
+        message_data = {
+            "message_id": "msg-metrics-001",
+            "session_id": "session-metrics",
+            "content": "Hola, ¿cómo puedo ayudarte hoy?",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "system"
+        }
+        assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+        assert client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 400
+        response = client.post("/api/messages/", json={**message_data, "message_id": "msg-metrics-002",
+                                                       "content": "Esto es un scam"}, headers=auth_headers)
+        assert response.status_code == 400
+        assert client.get("/api/messages/session-metrics", headers=auth_headers).status_code == 200
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert self.sample(client, accepted) == before[accepted] + 1
+        assert self.sample(client, banned) == before[banned] + 1
+        assert self.sample(client, duplicated) == before[duplicated] + 1
+        for stage, count in stage_counts.items():
+            assert self.sample(client, f'api_request_stage_seconds_count{{stage="{stage}"}}') > count, stage
+        assert self.sample(client, "api_requests_in_flight") == 0
+        assert self.sample(client, 'api_requests_total{method="POST",route="/api/messages/",status="400"}') >= 2
+
+
+class TestShardedMessagesEndpointIntegration:
+    """test de integración de los endpoints con los mensajes repartidos en shards (DATABASE_SHARDS)"""
+
+    @staticmethod
+    def message(message_id: str, session_id: str) -> dict:
+        return {
+            "message_id": message_id,
+            "session_id": session_id,
+            "content": "Hola, ¿cómo puedo ayudarte hoy?",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "user"
+        }
+
+    def test_sharded_post_get_export(self, client, auth_headers, mock_corpus_file, tmp_path):
+        """POST, lote, GET y exportación leen y escriben en el shard de cada sesión"""
+        from core.database import ShardSet, get_shards
+        shards = ShardSet([f"sqlite:///{tmp_path / f'shard{n}.db'}" for n in range(3)])
+        shards.init()
+        app.dependency_overrides[get_shards] = lambda: shards
+        try:
+            assert client.post("/api/messages/", json=self.message("msg-s1", "session-s1"),
+                               headers=auth_headers).status_code == 200
+            response = client.post("/api/messages/", json=self.message("msg-s1", "session-s2"), headers=auth_headers)
+            assert response.status_code == 400
+            response = client.post("/api/messages/batch", headers=auth_headers, json=[
+                self.message(f"msg-b{n}", f"session-s{n % 3}") for n in range(6)
+            ])
+            assert response.json()["accepted"] == 6
+
+            response = client.get("/api/messages/session-s1", headers=auth_headers)
+            assert response.status_code == 200
+            assert response.json()["total"] == 3
+            assert {m["data"]["message_id"] for m in response.json()["messages"]} == {"msg-s1", "msg-b1", "msg-b4"}
+            response = client.get("/api/messages/session-s0/export", headers=auth_headers)
+            assert len(response.text.splitlines()) == 2
+        finally:
+            app.dependency_overrides.pop(get_shards, None)
+            for engine in shards.engines:
+                engine.dispose()
+
+
+class TestArchivedMessagesEndpointIntegration:
+    """test de integración de los endpoints con mensajes en el almacenamiento en frío (ARCHIVE_ENABLED)"""
+
+    @pytest.fixture(autouse=True)
+    def archive_enabled(self, monkeypatch):
+        """ Antes de test_engine: el trigger de IDs archivados solo se crea con ARCHIVE_ENABLED """
+        monkeypatch.setattr("core.archive.ARCHIVE_ENABLED", True)
+
+    def test_get_and_export_archived(self, client, auth_headers, mock_corpus_file, test_engine, tmp_path):
+        """GET y exportación devuelven los mensajes archivados; su ID no puede reutilizarse"""
+        from datetime import datetime
+        from core.archive import SegmentStore, get_archive_store
+        from services.archive import MessageArchiveService
+        store = SegmentStore(str(tmp_path / "archive"))
+        app.dependency_overrides[get_archive_store] = lambda: store
+        try:
+            for day in (1, 2, 3):
+                client.post("/api/messages/", headers=auth_headers, json={
+                    "message_id": f"msg-arch-{day}",
+                    "session_id": "session-arch",
+                    "content": "Hola, ¿cómo puedo ayudarte hoy?",
+                    "timestamp": f"2023-06-0{day}T14:30:00Z",
+                    "sender": "user"
+                })
+            first = client.get("/api/messages/session-arch", headers=auth_headers)
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+            stats = MessageArchiveService(session_factory, store).archive_before(datetime(2023, 6, 3))
+            assert stats["messages"] == 2
+
+            response = client.get("/api/messages/session-arch", headers=auth_headers)
+            assert response.json() == first.json()
+            assert response.headers["etag"] == first.headers["etag"]
+            response = client.get("/api/messages/session-arch/export", headers=auth_headers)
+            assert [json.loads(line)["message_id"] for line in response.text.splitlines()] == [
+                "msg-arch-1", "msg-arch-2", "msg-arch-3"
+            ]
+            response = client.post("/api/messages/", headers=auth_headers, json={
+                "message_id": "msg-arch-1",
+                "session_id": "session-other",
+                "content": "Hola",
+                "timestamp": "2023-06-01T14:30:00Z",
+                "sender": "user"
+            })
+            assert response.status_code == 400
+        finally:
+            app.dependency_overrides.pop(get_archive_store, None)
+            store.close()
+
+
+class TestProfilerEndpointIntegration:
+    """test de integración del endpoint /admin/profile"""
+
+    admin_headers = {"X-Admin-Key": "test-admin-key-123"}
+
+    def test_profile_requires_admin_key(self, client, auth_headers):
+        """La API key de cliente no da acceso a /admin"""
+        assert client.post("/admin/profile", params={"seconds": 0.01}).status_code == 401
+        assert client.post("/admin/profile", params={"seconds": 0.01}, headers=auth_headers).status_code == 401
+
+    def test_profile_seconds(self, client):
+        """Sesión por tiempo: devuelve la tabla top, los módulos y las pilas colapsadas"""
+        response = client.post("/admin/profile", params={"seconds": 0.2, "interval_ms": 1, "include_idle": True},
+                               headers=self.admin_headers)
+        assert response.status_code == 200
+        report = response.json()
+        assert report["samples"] > 0
+        assert report["top"] and report["modules"]
+        for line in report["collapsed"].splitlines():
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0 and stack
+
+        response = client.post("/admin/profile", params={"seconds": 0.05, "format": "collapsed"},
+                               headers=self.admin_headers)
+        assert response.headers["content-type"].startswith("text/plain")
+
+    def test_profile_next_requests(self, client, auth_headers, mock_corpus_file):
+        """Sesión por peticiones: termina tras N peticiones; una segunda sesión simultánea devuelve 409"""
+        from concurrent.futures import ThreadPoolExecutor
+        import core.profiler as profiler
+        import time
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(client.post, "/admin/profile", params={"seconds": 30, "requests": 3},
+                                 headers=self.admin_headers)
+            deadline = time.monotonic() + 5
+            while not (profiler._session is not None and profiler._session.running):
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+            busy = client.post("/admin/profile", params={"seconds": 1}, headers=self.admin_headers)
+            assert busy.status_code == 409
+            assert busy.json()["detail"]["error"]["code"] == "PROFILER_BUSY"
+            for i in range(3):
+                client.post("/api/messages/", headers=auth_headers, json={
+                    "message_id": f"msg-profile-{i}",
+                    "session_id": "session-profile",
+                    "content": "Hola, ¿cómo puedo ayudarte hoy?",
+                    "timestamp": "2023-06-15T14:30:00Z",
+                    "sender": "system"
+                })
+            response = future.result(timeout=10)
+        assert response.status_code == 200
+        report = response.json()
+        assert report["requests"] == 3
+        assert report["duration_seconds"] < 30
+
+
+class TestAsyncMessagesEndpointIntegration:
+    """test de integración de los endpoints asíncronos (DATABASE_ASYNC=true)"""
+
+    def test_post_and_get_messages(self, async_client, auth_headers, mock_corpus_file):
+        """Flujo completo con endpoints async def"""
+        message_data = {
+            "message_id": "msg-async-001",
+            "session_id": "session-async",
+            "content": "Hola, ¿cómo puedo ayudarte hoy?",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "system"
+        }
+
+        response = async_client.post("/api/messages/", json=message_data, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["data"]["metadata"]["word_count"] == 5
+
+        duplicate = async_client.post("/api/messages/", json=message_data, headers=auth_headers)
+        assert duplicate.status_code == status.HTTP_400_BAD_REQUEST
+
+        batch = [{**message_data, "message_id": "msg-async-002", "sender": "user"},
+                 {**message_data, "message_id": "msg-async-003", "content": "un scam"}]
+        response = async_client.post("/api/messages/batch", json=batch, headers=auth_headers)
+        assert response.json()["accepted"] == 1
+
+        response = async_client.get("/api/messages/session-async", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(m["data"]["message_id"] for m in response.json()["messages"]) == ["msg-async-001", "msg-async-002"]
+
+        etag = response.headers["etag"]
+        response = async_client.get("/api/messages/session-async", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        response = async_client.get("/api/messages/session-async/export", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert [json.loads(line)["message_id"] for line in response.text.splitlines()] == ["msg-async-001", "msg-async-002"]
+
+        response = async_client.get("/api/messages/session-vacia", headers=auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_moderation_runs_off_the_event_loop(self, async_client, auth_headers, mock_corpus_file):
+        """La moderación (CPU) se ejecuta en el threadpool, no en el event loop"""
+        on_loop = []
+
+        class RecordingService(MessageProcessingService):
+            def _contains_banned_words(self, message):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(True)
+                except RuntimeError:
+                    on_loop.append(False)
+                return super()._contains_banned_words(message)
+
+        service = RecordingService()
+        async_client.app.dependency_overrides[get_message_processing_service] = lambda: service
+        message_data = {
+            "message_id": "msg-async-loop-001",
+            "session_id": "session-async-loop",
+            "content": "Hola",
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "user"
+        }
+        assert async_client.post("/api/messages/", json=message_data, headers=auth_headers).status_code == 200
+        batch = [{**message_data, "message_id": f"msg-async-loop-{i:03d}"} for i in range(2, 5)]
+        assert async_client.post("/api/messages/batch", json=batch, headers=auth_headers).json()["accepted"] == 3
+        assert on_loop == [False] * 4
@@ -0,0 +1,254 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from core.archive import SegmentStore
+from core.database import Base
+from core.exceptions import DatabaseException
+from models.archive_model import ArchiveBlockModel
+from models.message_model import MessageModel
+from models.session_stats_model import SessionStatsModel
+from schemas.message_schema import MessageResponseSchema, DataResponseSchema, Metadata, BatchItemResultSchema
+from services.archive import MessageArchiveService, parse_cutoff
+from services.message_service import (
+    AsyncMessageRetrievalService, MessageExportService, MessageRetrievalService, MessageStorageService
+)
+
+BASE = datetime(2024, 1, 1)
+CUTOFF = BASE + timedelta(days=10)
+
+
+@pytest.fixture(autouse=True)
+def archive_enabled(monkeypatch):
+    """ Antes de test_engine: el trigger de IDs archivados solo se crea con ARCHIVE_ENABLED """
+    monkeypatch.setattr("core.archive.ARCHIVE_ENABLED", True)
+
+
+@pytest.fixture
+def session_factory(test_engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SegmentStore(str(tmp_path / "archive"))
+    yield store
+    store.close()
+
+
+def populate(session_factory):
+    """ 3 sesiones x 20 mensajes, un mensaje por día alternando remitente """
+    rows = []
+    for session in range(3):
+        for day in range(20):
+            rows.append({
+                "message_id": f"msg-{session}-{day:02d}",
+                "session_id": f"session-{session}",
+                "content": f"mensaje {day}",
+                "timestamp": BASE + timedelta(days=day, minutes=session),
+                "sender": "user" if day % 2 else "system",
+                "word_count": 2,
+                "character_count": 10,
+                "processed_at": BASE + timedelta(days=day, seconds=1),
+            })
+    with session_factory() as db:
+        db.execute(insert(MessageModel), rows)
+        db.execute(*MessageStorageService._session_stats_increment(rows))
+        db.commit()
+
+
+def all_pages(service: MessageRetrievalService, session_id: str, sender=None, limit=3) -> list:
+    """ Recorre la sesión con cursor; devuelve los message_id de cada página """
+    pages, cursor = [], None
+    while True:
+        rows, cursor = service.get_session_page_rows(session_id, limit=limit, sender=sender, cursor=cursor)
+        pages.append([row.message_id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def hot_count(session_factory) -> int:
+    with session_factory() as db:
+        return db.execute(select(func.count()).select_from(MessageModel)).scalar_one()
+
+
+class TestMessageArchive:
+
+    def test_archive_moves_old_messages(self, session_factory, store):
+        """Los mensajes anteriores al corte salen de messages y quedan en bloques por sesión y remitente"""
+        populate(session_factory)
+        stats = MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+
+        assert stats["messages"] == 30
+        assert stats["sessions"] == 3
+        assert stats["blocks"] == 6
+        assert hot_count(session_factory) == 30
+        with session_factory() as db:
+            blocks = db.execute(select(ArchiveBlockModel)).scalars().all()
+            assert {block.sender for block in blocks} == {"user", "system"}
+            assert all(block.last_timestamp < CUTOFF for block in blocks)
+        # sin mensajes anteriores al corte no se escribe nada
+        assert MessageArchiveService(session_factory, store).archive_before(CUTOFF)["messages"] == 0
+
+    @pytest.mark.parametrize("sender", [None, "user"])
+    def test_retrieval_transparent(self, session_factory, store, sender):
+        """Las páginas (cursor y offset) son las mismas antes y después de archivar"""
+        populate(session_factory)
+        with session_factory() as db:
+            service = MessageRetrievalService(db, store)
+            before = all_pages(service, "session-1", sender)
+            offset_before = service.get_session_page_rows("session-1", limit=4, offset=8, sender=sender)
+
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+
+        with session_factory() as db:
+            service = MessageRetrievalService(db, store)
+            assert all_pages(service, "session-1", sender) == before
+            rows, cursor = service.get_session_page_rows("session-1", limit=4, offset=8, sender=sender)
+            assert [row.message_id for row in rows] == [row.message_id for row in offset_before[0]]
+            assert cursor == offset_before[1]
+            messages, _ = service.get_session_page("session-1", limit=100, sender=sender)
+            assert [m.data.message_id for m in messages] == [m for page in before for m in page]
+            # sin almacén en frío solo se ven los mensajes de messages
+            rows, _ = MessageRetrievalService(db).get_session_page_rows("session-1", limit=100, sender=sender)
+            assert all(row.timestamp >= CUTOFF for row in rows)
+
+    @pytest.mark.asyncio
+    async def test_async_retrieval(self, session_factory, store, async_test_db):
+        """El servicio asíncrono también lee los mensajes archivados"""
+        populate(session_factory)
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+        service = AsyncMessageRetrievalService(async_test_db, store)
+        rows, cursor = await service.get_session_page_rows("session-0", limit=12)
+        assert [row.message_id for row in rows] == [f"msg-0-{day:02d}" for day in range(12)]
+        messages, _ = await service.get_session_page("session-0", limit=5, cursor=cursor)
+        assert [m.data.message_id for m in messages] == [f"msg-0-{day:02d}" for day in range(12, 17)]
+
+    def test_late_message_interleaved(self, session_factory, store):
+        """Un mensaje con timestamp anterior a los archivados se intercala en su posición"""
+        populate(session_factory)
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+        with session_factory() as db:
+            db.execute(insert(MessageModel), [{
+                "message_id": "msg-late", "session_id": "session-0", "content": "tarde",
+                "timestamp": BASE + timedelta(days=2, hours=12), "sender": "user",
+                "word_count": 1, "character_count": 5, "processed_at": BASE,
+            }])
+            db.commit()
+            rows, _ = MessageRetrievalService(db, store).get_session_page_rows("session-0", limit=5)
+        assert [row.message_id for row in rows] == ["msg-0-00", "msg-0-01", "msg-0-02", "msg-late", "msg-0-03"]
+
+    def test_export_includes_archived(self, session_factory, store):
+        """La exportación NDJSON es la misma antes y después de archivar"""
+        populate(session_factory)
+        export = MessageExportService(session_factory, batch_size=7, archive=store)
+        before = b"".join(export.iter_session_ndjson("session-2"))
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+        assert b"".join(export.iter_session_ndjson("session-2")) == before
+        assert len(before.splitlines()) == 20
+
+    def test_archived_ids_stay_unique(self, session_factory, store):
+        """Un message_id archivado no puede volver a guardarse (individual y en lote)"""
+        populate(session_factory)
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+        data = DataResponseSchema(
+            message_id="msg-0-00", session_id="session-9", content="otra vez", timestamp=BASE, sender="user",
+            metadata=Metadata(word_count=2, character_count=8, processed_at=BASE)
+        )
+        with session_factory() as db:
+            with pytest.raises(DatabaseException):
+                MessageStorageService(db).save_message(MessageResponseSchema(status="success", data=data))
+            results = MessageStorageService(db).save_batch(
+                [BatchItemResultSchema(message_id="msg-0-00", status="accepted", data=data)]
+            )
+        assert results[0].error.code == "DUPLICATE_MESSAGE_ID"
+
+    def test_upsert_archived_ids(self, session_factory, store):
+        """Ingesta idempotente: un ID archivado se acepta sin crearse (ignore) y no se reemplaza (replace)"""
+        populate(session_factory)
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+
+        def results():
+            return [
+                BatchItemResultSchema(message_id=message_id, status="accepted", data=DataResponseSchema(
+                    message_id=message_id, session_id="session-0", content="otra vez", timestamp=BASE,
+                    sender="system", metadata=Metadata(word_count=2, character_count=8, processed_at=BASE)
+                ))
+                for message_id in ("msg-0-00", "msg-new")
+            ]
+        with session_factory() as db:
+            ignored = MessageStorageService(db).upsert_batch(results(), "ignore")
+            assert [(r.status, r.created) for r in ignored] == [("accepted", False), ("accepted", True)]
+            replaced = MessageStorageService(db).upsert_batch(results(), "replace")
+            assert [r.status for r in replaced] == ["rejected", "accepted"]
+        assert hot_count(session_factory) == 31
+
+    def test_stats_kept_and_rebuilt(self, session_factory, store):
+        """session_stats no cambia al archivar y rebuild_session_stats cuenta los mensajes archivados"""
+        populate(session_factory)
+        with session_factory() as db:
+            before = MessageRetrievalService(db).get_session_version("session-1")
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+        with session_factory() as db:
+            assert MessageRetrievalService(db).get_session_version("session-1") == before
+            MessageStorageService.rebuild_session_stats(db)
+            assert MessageRetrievalService(db).get_session_total("session-1") == 20
+            assert MessageRetrievalService(db).get_session_total("session-1", "user") == 10
+
+    def test_page_reads_only_covering_blocks(self, session_factory, store):
+        """Una página lee los bloques que la cubren según su primer timestamp, no todos los de la sesión"""
+        populate(session_factory)
+        MessageArchiveService(session_factory, store, block_messages=2).archive_before(CUTOFF)
+        with session_factory() as db:
+            assert db.execute(select(func.count()).select_from(ArchiveBlockModel)).scalar_one() == 18
+            service = MessageRetrievalService(db, store)
+            store._read_block.cache_clear()
+            rows, cursor = service.get_session_page_rows("session-0", limit=2)
+            assert [row.message_id for row in rows] == ["msg-0-00", "msg-0-01"]
+            assert store._read_block.cache_info().misses == 2
+            rows, _ = service.get_session_page_rows("session-0", limit=3, cursor=cursor)
+            assert [row.message_id for row in rows] == ["msg-0-02", "msg-0-03", "msg-0-04"]
+            assert store._read_block.cache_info().misses == 4
+
+    def test_trigger_only_with_archive_enabled(self, tmp_path, monkeypatch):
+        """Sin ARCHIVE_ENABLED no se crea el trigger que consulta archived_message_ids en cada inserción"""
+        monkeypatch.setattr("core.archive.ARCHIVE_ENABLED", False)
+        engine = create_engine(f"sqlite:///{tmp_path / 'sin-archivo.db'}")
+        Base.metadata.create_all(engine)
+        with engine.connect() as connection:
+            triggers = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars()
+            assert "trg_messages_archived_id" not in set(triggers)
+        engine.dispose()
+
+    def test_damaged_block(self, session_factory, store):
+        """Un bloque dañado produce un error de base de datos en lugar de datos incorrectos"""
+        populate(session_factory)
+        MessageArchiveService(session_factory, store).archive_before(CUTOFF)
+        store.close()
+        with session_factory() as db:
+            block = db.execute(select(ArchiveBlockModel).limit(1)).scalar_one()
+            with open(f"{store.directory}/{block.segment}", "r+b") as f:
+                f.seek(block.offset)
+                f.write(b"\x00")
+            store = SegmentStore(store.directory)
+            with pytest.raises(DatabaseException):
+                MessageRetrievalService(db, store).get_session_page_rows(block.session_id, sender=block.sender)
+
+    def test_segments_roll_over(self, session_factory, tmp_path):
+        """Al superar el tamaño máximo se empieza un segmento nuevo; los anteriores no se modifican"""
+        populate(session_factory)
+        store = SegmentStore(str(tmp_path / "small"), segment_max_bytes=100)
+        MessageArchiveService(session_factory, store, prefix="shard0", batch_sessions=1).archive_before(CUTOFF)
+        store.close()
+        with session_factory() as db:
+            segments = set(db.execute(select(ArchiveBlockModel.segment)).scalars())
+            assert len(segments) > 1 and all(segment.startswith("shard0") for segment in segments)
+            rows, _ = MessageRetrievalService(db, store).get_session_page_rows("session-0", limit=100)
+        assert len(rows) == 20
+
+    def test_parse_cutoff(self):
+        class Args:
+            cutoff = "2025-01-01T02:00:00+02:00"
+            older_than_days = None
+        assert parse_cutoff(Args) == datetime(2025, 1, 1)
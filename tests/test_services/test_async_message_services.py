@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime, timezone
+from services.message_service import AsyncMessageStorageService, AsyncMessageRetrievalService
+from schemas.message_schema import MessageResponseSchema, DataResponseSchema, Metadata, BatchItemResultSchema
+from core.exceptions import DatabaseException
+
+
+def make_message(message_id, session_id="session_async", sender="user"):
+    return MessageResponseSchema(
+        status="success",
+        data=DataResponseSchema(
+            message_id=message_id,
+            session_id=session_id,
+            content="Mensaje asíncrono",
+            timestamp=datetime(2025, 9, 15, 10, 0, 0),
+            sender=sender,
+            metadata=Metadata(word_count=2, character_count=17, processed_at=datetime.now(timezone.utc))
+        )
+    )
+
+
+class TestAsyncMessageServices:
+
+    @pytest.mark.asyncio
+    async def test_save_and_retrieve(self, async_test_db):
+        """Guardado y recuperación con AsyncSession"""
+        storage_service = AsyncMessageStorageService(async_test_db)
+        retrieval_service = AsyncMessageRetrievalService(async_test_db)
+
+        saved = await storage_service.save_message(make_message("async_001"))
+        await storage_service.save_message(make_message("async_002", sender="system"))
+
+        assert saved.message_id == "async_001"
+        result = await retrieval_service.get_messages_by_session("session_async")
+        assert sorted(m.data.message_id for m in result) == ["async_001", "async_002"]
+
+        only_system = await retrieval_service.get_messages_by_session("session_async", sender="system")
+        assert [m.data.message_id for m in only_system] == ["async_002"]
+
+    @pytest.mark.asyncio
+    async def test_save_duplicate_raises(self, async_test_db):
+        """Un ID duplicado lanza DatabaseException y hace rollback"""
+        storage_service = AsyncMessageStorageService(async_test_db)
+        await storage_service.save_message(make_message("async_dup"))
+
+        with pytest.raises(DatabaseException) as exc_info:
+            await storage_service.save_message(make_message("async_dup"))
+        assert "ya existe" in str(exc_info.value)
+
+    @pytest.mark.asyncio
+    async def test_save_batch(self, async_test_db):
+        """Guardado por lote asíncrono con duplicados"""
+        storage_service = AsyncMessageStorageService(async_test_db)
+        results = [
+            BatchItemResultSchema(message_id=m.data.message_id, status="accepted", data=m.data)
+            for m in [make_message("async_b1"), make_message("async_b2"), make_message("async_b1")]
+        ]
+
+        results = await storage_service.save_batch(results)
+
+        assert [r.status for r in results] == ["accepted", "accepted", "rejected"]
+        stored = await AsyncMessageRetrievalService(async_test_db).get_messages_by_session("session_async")
+        assert len(stored) == 2
+
+    @pytest.mark.asyncio
+    async def test_upsert(self, async_test_db):
+        """Ingesta idempotente asíncrona: created indica si el mensaje se creó"""
+        storage_service = AsyncMessageStorageService(async_test_db)
+
+        assert await storage_service.upsert_message(make_message("async_u1"), "ignore") is True
+        assert await storage_service.upsert_message(make_message("async_u1"), "ignore") is False
+        with pytest.raises(DatabaseException):
+            await storage_service.upsert_message(make_message("async_u1", sender="system"), "replace")
+        results = await storage_service.upsert_batch([
+            BatchItemResultSchema(message_id=m.data.message_id, status="accepted", data=m.data)
+            for m in [make_message("async_u1"), make_message("async_u2")]
+        ], "replace")
+        assert [r.created for r in results] == [False, True]
+        stored = await AsyncMessageRetrievalService(async_test_db).get_messages_by_session("session_async")
+        assert len(stored) == 2
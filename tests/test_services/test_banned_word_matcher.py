@@ -0,0 +1,74 @@
+import os
+import random
+import string
+import pytest
+from unittest.mock import patch
+from services.message_service import (
+    MATCHER_ENGINES, BannedWordMatcher, LinearMatcher, LengthBucketMatcher, BKTreeMatcher, MessageProcessingService
+)
+
+INDEXED_ENGINES = [LengthBucketMatcher, BKTreeMatcher]
+
+
+def random_words(rng, count, alphabet="abcdeilmnorstu"):
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 10))) for _ in range(count)]
+
+
+class TestBannedWordMatchers:
+
+    @pytest.mark.parametrize("engine", INDEXED_ENGINES)
+    def test_same_result_as_linear_loop(self, engine):
+        """Los motores indexados devuelven la misma palabra que el recorrido lineal"""
+        rng = random.Random(7)
+        corpus = list(dict.fromkeys(random_words(rng, 300)))
+        linear = LinearMatcher(corpus, 80)
+        indexed = engine(corpus, 80)
+
+        for _ in range(300):
+            tokens = random_words(rng, rng.randint(1, 8))
+            assert indexed.find(tokens) == linear.find(tokens)
+
+    @pytest.mark.parametrize("engine", INDEXED_ENGINES)
+    def test_returns_first_word_in_corpus_order(self, engine):
+        """Con varias coincidencias para un token se devuelve la primera del corpus"""
+        corpus = ["scamm", "otra", "scam"]
+        matcher = engine(corpus, 80)
+        assert matcher.find(["scam"]) == LinearMatcher(corpus, 80).find(["scam"]) == "scamm"
+
+    @pytest.mark.parametrize("engine", INDEXED_ENGINES)
+    def test_fuzzy_and_no_match(self, engine):
+        """Detecta variaciones con typos y no marca palabras distintas"""
+        matcher = engine(["scam", "fraude", "estafa", "robo"], 80)
+        assert matcher.find(["esto", "es", "un", "scaam"]) == "scam"
+        assert matcher.find(["fraued", "bancario"]) == "fraude"
+        assert matcher.find(["hola", "mundo"]) is None
+        assert matcher.find([]) is None
+
+    @pytest.mark.parametrize("engine", list(MATCHER_ENGINES))
+    def test_empty_corpus(self, engine):
+        """Un corpus vacío nunca detecta palabras"""
+        assert MATCHER_ENGINES[engine]([], 80).find(["scam"]) is None
+
+    def test_engine_without_match_token_fails_at_construction(self):
+        """Un motor que no implementa _match_token_uncached falla al construirse, no en el primer mensaje"""
+        class IncompleteMatcher(BannedWordMatcher):
+            pass
+
+        with pytest.raises(TypeError):
+            IncompleteMatcher(["scam"], 80)
+        with pytest.raises(TypeError):
+            BannedWordMatcher(["scam"], 80)
+
+    def test_service_uses_configured_engine(self, mock_corpus_file):
+        """El servicio usa el motor indicado en BANNED_WORD_MATCHER"""
+        for name in MATCHER_ENGINES:
+            with patch.dict(os.environ, {"BANNED_WORD_MATCHER": name}):
+                service = MessageProcessingService()
+            assert isinstance(service._get_matcher(), MATCHER_ENGINES[name])
+            assert service._contains_banned_words("Es una estafa!") == "estafa"
+
+    def test_service_unknown_engine(self):
+        """Un motor desconocido falla al construir el servicio"""
+        with patch.dict(os.environ, {"BANNED_WORD_MATCHER": "desconocido"}):
+            with pytest.raises(ValueError):
+                MessageProcessingService()
@@ -172,3 +172,23 @@ class TestMessageProcessingService:
     
     
 
+    def test_process_batch_mixed(self, mock_corpus_file):
+        """Test de procesamiento por lote: los rechazados no interrumpen el lote"""
+        service = MessageProcessingService()
+
+        from schemas.message_schema import MessageRequestSchema
+        from datetime import datetime
+
+        messages = [
+            MessageRequestSchema(message_id=f"batch_{i}", session_id="session_batch",
+                                 content=content, timestamp=datetime.now(), sender="user")
+            for i, content in enumerate(["Mensaje normal", "Es una estafa", "Otro mensaje normal"])
+        ]
+
+        results = service.process_batch(messages)
+
+        assert [r.status for r in results] == ["accepted", "rejected", "accepted"]
+        assert results[0].data.metadata.word_count == 2
+        assert results[1].data is None
+        assert results[1].error.code == "BANNED_WORD_DETECTED"
+        assert "estafa" in results[1].error.message
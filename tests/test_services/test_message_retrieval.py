@@ -1,9 +1,12 @@
+import json
 import pytest
+from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 from services.message_service import MessageRetrievalService
 from models.message_model import MessageModel
-from schemas.message_schema import MessageResponseSchema
-from core.exceptions import DatabaseException
+from services.message_service import MessageStorageService, MessageExportService, encode_messages_page
+from schemas.message_schema import MessageResponseSchema, MessagesListSchema, DataResponseSchema, Metadata
+from core.exceptions import DatabaseException, InvalidCursorException
 from unittest.mock import Mock, patch
 
 class TestMessageRetrievalService:
@@ -219,4 +222,104 @@ class TestMessageRetrievalService:
         assert message.data.metadata.word_count > 0
         assert message.data.metadata.character_count > 0
         assert message.data.metadata.processed_at is not None
-    
+
+    def test_get_session_page_cursor_pagination(self, test_db, sample_messages):
+        """Test de paginación por cursor ordenada por (timestamp, message_id)"""
+        retrieval_service = MessageRetrievalService(test_db)
+
+        page1, cursor1 = retrieval_service.get_session_page("session_001", limit=2)
+        assert [m.data.message_id for m in page1] == ["msg_001", "msg_002"]
+        assert cursor1 is not None
+
+        page2, cursor2 = retrieval_service.get_session_page("session_001", limit=2, cursor=cursor1)
+        assert [m.data.message_id for m in page2] == ["msg_003"]
+        assert cursor2 is None  # última página
+
+    def test_get_session_page_cursor_with_sender_and_ties(self, test_db, sample_messages):
+        """Test de cursor con filtro por sender y timestamps repetidos"""
+        same_time = datetime(2025, 9, 15, 10, 0, 0)
+        for message_id in ["msg_010", "msg_011"]:
+            test_db.add(MessageModel(message_id=message_id, session_id="session_001", content="empate",
+                                     timestamp=same_time, sender="user", word_count=1,
+                                     character_count=6, processed_at=same_time))
+        test_db.commit()
+        retrieval_service = MessageRetrievalService(test_db)
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = retrieval_service.get_session_page("session_001", limit=1, sender="user", cursor=cursor)
+            seen.extend(m.data.message_id for m in page)
+            if cursor is None:
+                break
+
+        assert seen == ["msg_001", "msg_010", "msg_011", "msg_003"]
+
+    def test_get_session_page_invalid_cursor(self, test_db):
+        """Test de cursor inválido"""
+        retrieval_service = MessageRetrievalService(test_db)
+
+        with pytest.raises(InvalidCursorException):
+            retrieval_service.get_session_page("session_001", cursor="no-es-un-cursor")
+
+    def test_get_session_total(self, test_db, sample_messages):
+        """Test del total de mensajes por sesión desde session_stats"""
+        MessageStorageService.rebuild_session_stats(test_db)
+        retrieval_service = MessageRetrievalService(test_db)
+
+        assert retrieval_service.get_session_total("session_001") == 3
+        assert retrieval_service.get_session_total("session_001", sender="user") == 2
+        assert retrieval_service.get_session_total("session_002", sender="system") == 0
+        assert retrieval_service.get_session_total("session_999") == 0
+
+    def test_get_session_version_changes_on_write(self, test_db):
+        """Test de la versión de la sesión: aumenta con cada escritura"""
+        storage_service = MessageStorageService(test_db)
+        retrieval_service = MessageRetrievalService(test_db)
+        assert retrieval_service.get_session_version("session_version") == (0, 0)
+
+        def message(message_id, sender):
+            return MessageResponseSchema(status="success", data=DataResponseSchema(
+                message_id=message_id, session_id="session_version", content="Mensaje",
+                timestamp=datetime(2025, 9, 15, 10, 0, 0), sender=sender,
+                metadata=Metadata(word_count=1, character_count=7, processed_at=datetime(2025, 9, 15, 10, 0, 1))
+            ))
+
+        storage_service.save_message(message("version_001", "user"))
+        first = retrieval_service.get_session_version("session_version")
+        storage_service.save_message(message("version_002", "system"))
+        second = retrieval_service.get_session_version("session_version")
+
+        assert first[0] == 1 and second[0] == 2
+        assert second[1] > first[1]
+        # la versión filtrada por remitente no cambia con escrituras del otro remitente
+        assert retrieval_service.get_session_version("session_version", sender="user") == (1, 1)
+
+    def test_get_session_page_rows_same_json_as_schemas(self, test_db, sample_messages):
+        """La página en filas codificada a JSON es idéntica a MessagesListSchema serializado"""
+        retrieval_service = MessageRetrievalService(test_db)
+
+        rows, rows_cursor = retrieval_service.get_session_page_rows("session_001", limit=2)
+        messages, schema_cursor = retrieval_service.get_session_page("session_001", limit=2)
+
+        assert rows_cursor == schema_cursor
+        expected = MessagesListSchema(messages=messages, total=3, count=2, next_cursor=schema_cursor)
+        assert json.loads(encode_messages_page(rows, 3, rows_cursor)) == expected.model_dump(mode="json")
+
+        rows, rows_cursor = retrieval_service.get_session_page_rows("session_001", limit=2, cursor=rows_cursor)
+        assert [row.message_id for row in rows] == ["msg_003"]
+        assert rows_cursor is None
+
+    def test_export_session_ndjson(self, test_engine, test_db, sample_messages):
+        """Test de exportación NDJSON por lotes con el mismo formato que la API"""
+        export_service = MessageExportService(sessionmaker(bind=test_engine), batch_size=2)
+
+        chunks = list(export_service.iter_session_ndjson("session_001"))
+        lines = [json.loads(line) for line in b"".join(chunks).splitlines()]
+
+        assert len(chunks) == 2  # 3 mensajes en lotes de 2
+        assert [line["message_id"] for line in lines] == ["msg_001", "msg_002", "msg_003"]
+        converted = MessageRetrievalService(test_db)._convert_model_to_schema(sample_messages[0])
+        assert lines[0] == converted.data.model_dump(mode="json")
+
+        only_system = b"".join(export_service.iter_session_ndjson("session_001", sender="system"))
+        assert [json.loads(line)["message_id"] for line in only_system.splitlines()] == ["msg_002"]
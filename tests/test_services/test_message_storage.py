@@ -1,11 +1,15 @@
 import pytest
 from datetime import datetime, timezone
 from unittest.mock import Mock
+from sqlalchemy import event
 from sqlalchemy.exc import SQLAlchemyError
 
 from services.message_service import MessageStorageService
 from models.message_model import MessageModel
-from schemas.message_schema import MessageResponseSchema, DataResponseSchema, Metadata
+from models.session_stats_model import SessionStatsModel
+from schemas.message_schema import MessageResponseSchema, DataResponseSchema, Metadata, BatchItemResultSchema
+from core.bloom import MessageIdFilter
+from core.cache import SessionPageCache
 from core.exceptions import DatabaseException
 
 class TestMessageStorageService:
@@ -212,4 +216,200 @@ class TestMessageStorageService:
         
         # restaurar métodos originales
         test_db.commit = original_commit
-        test_db.rollback = original_rollback
\ No newline at end of file
+        test_db.rollback = original_rollback
+    def test_save_batch_bulk_insert_and_duplicates(self, test_db):
+        """Test de guardado por lote: un solo commit y duplicados marcados como rechazados"""
+        storage_service = MessageStorageService(test_db)
+
+        def accepted(message_id):
+            return BatchItemResultSchema(
+                message_id=message_id,
+                status="accepted",
+                data=DataResponseSchema(
+                    message_id=message_id,
+                    session_id="session_batch",
+                    content="Mensaje de lote",
+                    timestamp=datetime.now(timezone.utc),
+                    sender="user",
+                    metadata=Metadata(word_count=3, character_count=15, processed_at=datetime.now(timezone.utc))
+                )
+            )
+
+        storage_service.save_batch([accepted("batch_001")])
+
+        original_commit = test_db.commit
+        test_db.commit = Mock(side_effect=original_commit)
+        results = storage_service.save_batch([accepted("batch_001"), accepted("batch_002"), accepted("batch_002")])
+        test_db.commit.assert_called_once()
+        test_db.commit = original_commit
+
+        assert [r.status for r in results] == ["rejected", "accepted", "rejected"]
+        assert results[0].error.code == "DUPLICATE_MESSAGE_ID"
+        assert results[2].error.code == "DUPLICATE_MESSAGE_ID"
+        assert test_db.query(MessageModel).count() == 2
+
+    def test_save_updates_session_stats(self, test_db):
+        """Test de contadores por sesión y remitente actualizados en la misma transacción"""
+        storage_service = MessageStorageService(test_db)
+
+        def message(message_id, sender):
+            return MessageResponseSchema(status="success", data=DataResponseSchema(
+                message_id=message_id, session_id="session_stats", content="Mensaje",
+                timestamp=datetime.now(timezone.utc), sender=sender,
+                metadata=Metadata(word_count=1, character_count=7, processed_at=datetime.now(timezone.utc))
+            ))
+
+        storage_service.save_message(message("stats_001", "user"))
+        storage_service.save_message(message("stats_002", "system"))
+        with pytest.raises(DatabaseException):
+            storage_service.save_message(message("stats_001", "user"))  # duplicado: no cuenta
+        storage_service.save_batch([
+            BatchItemResultSchema(message_id=m.data.message_id, status="accepted", data=m.data)
+            for m in [message("stats_003", "user"), message("stats_002", "user")]
+        ])
+
+        counts = {row.sender: row.message_count for row in test_db.query(SessionStatsModel).all()}
+        assert counts == {"user": 2, "system": 1}
+
+    def test_rebuild_session_stats(self, test_db):
+        """Test de reconstrucción de contadores a partir de la tabla messages"""
+        for i, sender in enumerate(["user", "user", "system"]):
+            test_db.add(MessageModel(message_id=f"rebuild_{i}", session_id="session_rebuild", content="x",
+                                     timestamp=datetime.now(), sender=sender, word_count=1,
+                                     character_count=1, processed_at=datetime.now()))
+        test_db.commit()
+
+        assert MessageStorageService.rebuild_session_stats(test_db) == 2
+        counts = {row.sender: row.message_count for row in test_db.query(SessionStatsModel).all()}
+        assert counts == {"user": 2, "system": 1}
+
+    def test_save_invalidates_page_cache(self, test_db):
+        """Test de invalidación de las páginas en caché de la sesión escrita"""
+        page_cache = SessionPageCache(max_bytes=10_000, ttl=60)
+        storage_service = MessageStorageService(test_db, page_cache)
+
+        def message(message_id, session_id):
+            return MessageResponseSchema(status="success", data=DataResponseSchema(
+                message_id=message_id, session_id=session_id, content="Mensaje",
+                timestamp=datetime.now(timezone.utc), sender="user",
+                metadata=Metadata(word_count=1, character_count=7, processed_at=datetime.now(timezone.utc))
+            ))
+
+        for session_id in ("session_a", "session_b"):
+            page_cache.set((session_id, None, None, 0, 100), session_id, b"pagina")
+
+        storage_service.save_message(message("cache_001", "session_a"))
+        assert page_cache.get(("session_a", None, None, 0, 100)) is None
+        assert page_cache.get(("session_b", None, None, 0, 100)) == b"pagina"
+
+        storage_service.save_batch([
+            BatchItemResultSchema(message_id="cache_002", status="accepted", data=message("cache_002", "session_b").data)
+        ])
+        assert page_cache.get(("session_b", None, None, 0, 100)) is None
+        assert page_cache.stats()["invalidations"] == 2
+
+    def test_id_filter_skips_duplicate_lookups(self, test_db):
+        """Con filtro Bloom los IDs nuevos no se consultan y los duplicados se rechazan sin INSERT"""
+        id_filter = MessageIdFilter(capacity=1_000)
+        storage_service = MessageStorageService(test_db, id_filter=id_filter)
+        statements = []
+        event.listen(test_db.bind, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        def accepted(message_id):
+            return BatchItemResultSchema(message_id=message_id, status="accepted", data=DataResponseSchema(
+                message_id=message_id, session_id="session_bloom", content="Mensaje",
+                timestamp=datetime.now(timezone.utc), sender="user",
+                metadata=Metadata(word_count=1, character_count=7, processed_at=datetime.now(timezone.utc))
+            ))
+
+        storage_service.save_batch([accepted("bloom_001"), accepted("bloom_002")])
+        assert not [s for s in statements if s.startswith("SELECT")]
+        assert id_filter.stats()["definitely_new"] == 2
+
+        statements.clear()
+        test_db.rollback = Mock(side_effect=test_db.rollback)
+        with pytest.raises(DatabaseException):
+            storage_service.save_message(MessageResponseSchema(status="success", data=accepted("bloom_001").data))
+        assert not [s for s in statements if s.startswith("INSERT")]
+        test_db.rollback.assert_not_called()
+        assert id_filter.stats()["duplicates"] == 1
+        assert id_filter.stats()["round_trips_saved"] == 2  # la consulta del lote y el INSERT fallido
+
+    def test_id_filter_ids_saved_by_other_process(self, test_db):
+        """Un ID que no está en el filtro (guardado por otro proceso) se rechaza igualmente"""
+        id_filter = MessageIdFilter(capacity=1_000)
+        storage_service = MessageStorageService(test_db, id_filter=id_filter)
+        test_db.add(MessageModel(message_id="other_001", session_id="session_other", content="x",
+                                 timestamp=datetime.now(), sender="user", word_count=1,
+                                 character_count=1, processed_at=datetime.now()))
+        test_db.commit()
+
+        def accepted(message_id):
+            return BatchItemResultSchema(message_id=message_id, status="accepted", data=DataResponseSchema(
+                message_id=message_id, session_id="session_other", content="Mensaje",
+                timestamp=datetime.now(timezone.utc), sender="user",
+                metadata=Metadata(word_count=1, character_count=7, processed_at=datetime.now(timezone.utc))
+            ))
+
+        results = storage_service.save_batch([accepted("other_001"), accepted("other_002")])
+        assert [r.status for r in results] == ["rejected", "accepted"]
+        assert results[0].error.code == "DUPLICATE_MESSAGE_ID"
+        assert test_db.query(MessageModel).count() == 2
+        assert "other_001" in id_filter and "other_002" in id_filter
+
+    def test_upsert_policies(self, test_db):
+        """Ingesta idempotente: ignore conserva el guardado, replace lo actualiza (misma sesión y remitente)
+        y reject lo rechaza; created indica si cada mensaje se creó"""
+        storage_service = MessageStorageService(test_db)
+
+        def accepted(message_id, content, session_id="session_upsert"):
+            return BatchItemResultSchema(message_id=message_id, status="accepted", data=DataResponseSchema(
+                message_id=message_id, session_id=session_id, content=content,
+                timestamp=datetime.now(timezone.utc), sender="user",
+                metadata=Metadata(word_count=1, character_count=len(content), processed_at=datetime.now(timezone.utc))
+            ))
+
+        results = storage_service.upsert_batch([accepted("up_001", "uno"), accepted("up_002", "dos")], "ignore")
+        assert [r.created for r in results] == [True, True]
+        stats = test_db.query(SessionStatsModel).one()
+        assert (stats.message_count, stats.version) == (2, 1)
+
+        results = storage_service.upsert_batch([accepted("up_001", "otro"), accepted("up_003", "tres")], "ignore")
+        assert [(r.status, r.created) for r in results] == [("accepted", False), ("accepted", True)]
+        assert test_db.get(MessageModel, "up_001").content == "uno"
+
+        results = storage_service.upsert_batch([
+            accepted("up_001", "reemplazado"),
+            accepted("up_002", "otra sesión", session_id="session_other"),
+        ], "replace")
+        assert [(r.status, r.created) for r in results] == [("accepted", False), ("rejected", None)]
+        assert results[1].error.code == "DUPLICATE_MESSAGE_ID"
+        test_db.expire_all()
+        assert test_db.get(MessageModel, "up_001").content == "reemplazado"
+        stats = test_db.query(SessionStatsModel).one()
+        assert (stats.message_count, stats.version) == (3, 3)  # el reemplazo cambia la versión (ETag)
+
+        results = storage_service.upsert_batch([accepted("up_003", "tres"), accepted("up_004", "cuatro"),
+                                                accepted("up_004", "cuatro")], "reject")
+        assert [r.status for r in results] == ["rejected", "accepted", "rejected"]
+        assert test_db.query(MessageModel).count() == 4
+
+    def test_upsert_message_single_statement(self, test_db):
+        """Un mensaje nuevo se guarda con el INSERT y el UPSERT de contadores, sin consultas ni refresh"""
+        storage_service = MessageStorageService(test_db)
+        statements = []
+        event.listen(test_db.bind, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+        message = MessageResponseSchema(status="success", data=DataResponseSchema(
+            message_id="single_001", session_id="session_single", content="Mensaje",
+            timestamp=datetime.now(timezone.utc), sender="user",
+            metadata=Metadata(word_count=1, character_count=7, processed_at=datetime.now(timezone.utc))
+        ))
+
+        assert storage_service.upsert_message(message, "ignore") is True
+        assert statements == ["INSERT", "INSERT"]
+        assert storage_service.upsert_message(message, "ignore") is False
+        with pytest.raises(DatabaseException):
+            storage_service.upsert_message(message, "reject")
+        assert test_db.query(SessionStatsModel).one().message_count == 1
@@ -0,0 +1,155 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.database import ShardSet
+from core.exceptions import DatabaseException
+from models.message_model import MessageModel
+from models.message_registry_model import MessageRegistryModel
+from models.session_stats_model import SessionStatsModel
+from schemas.message_schema import MessageResponseSchema, DataResponseSchema, Metadata, BatchItemResultSchema
+from services.message_service import MessageRetrievalService
+from services.sharded_storage import ShardedMessageStorageService
+
+
+@pytest.fixture
+def shard_set(tmp_path):
+    shards = ShardSet([f"sqlite:///{tmp_path / f'messages_shard{n}.db'}" for n in range(4)])
+    shards.init()
+    yield shards
+    for engine in shards.engines:
+        engine.dispose()
+
+
+def make_data(message_id: str, session_id: str) -> DataResponseSchema:
+    return DataResponseSchema(
+        message_id=message_id,
+        session_id=session_id,
+        content="Mensaje de prueba",
+        timestamp=datetime.now(timezone.utc),
+        sender="user",
+        metadata=Metadata(word_count=3, character_count=17, processed_at=datetime.now(timezone.utc))
+    )
+
+
+def count(shards: ShardSet, shard: int, model) -> int:
+    with shards.session_factories[shard]() as db:
+        return db.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+class TestShardedMessageStorageService:
+
+    def test_messages_stored_in_session_shard(self, shard_set):
+        """Cada mensaje se guarda en el shard de su sesión, con sus contadores de session_stats"""
+        storage = ShardedMessageStorageService(shard_set)
+        sessions = [f"session-{n}" for n in range(20)]
+        for n, session_id in enumerate(sessions):
+            storage.save_message(MessageResponseSchema(status="success", data=make_data(f"msg-{n}", session_id)))
+
+        assert sum(count(shard_set, shard, MessageModel) for shard in range(4)) == 20
+        assert len({shard_set.shard_for(session_id) for session_id in sessions}) > 1
+        for session_id in sessions:
+            with shard_set.session_factory_for(session_id)() as db:
+                retrieval = MessageRetrievalService(db)
+                assert retrieval.get_session_version(session_id) == (1, 1)
+                assert len(retrieval.get_messages_by_session(session_id)) == 1
+
+    def test_duplicate_message_id_across_shards(self, shard_set):
+        """Un message_id repetido se rechaza aunque su sesión esté en otro shard"""
+        storage = ShardedMessageStorageService(shard_set)
+        storage.save_message(MessageResponseSchema(status="success", data=make_data("msg-dup", "session-a")))
+        other = next(f"session-{n}" for n in range(100)
+                     if shard_set.shard_for(f"session-{n}") != shard_set.shard_for("session-a"))
+
+        with pytest.raises(DatabaseException) as exc_info:
+            storage.save_message(MessageResponseSchema(status="success", data=make_data("msg-dup", other)))
+        assert "ya existe" in exc_info.value.detail["error"]["details"]
+        assert sum(count(shard_set, shard, MessageModel) for shard in range(4)) == 1
+
+    def test_save_batch(self, shard_set):
+        """El lote rechaza los IDs existentes y repetidos y guarda el resto en el shard de cada sesión"""
+        storage = ShardedMessageStorageService(shard_set)
+        storage.save_message(MessageResponseSchema(status="success", data=make_data("msg-old", "session-x")))
+        ids = ["msg-old", "msg-1", "msg-1", "msg-2", "msg-3"]
+        results = [
+            BatchItemResultSchema(message_id=message_id, status="accepted",
+                                  data=make_data(message_id, f"session-{n}"))
+            for n, message_id in enumerate(ids)
+        ]
+
+        results = storage.save_batch(results)
+
+        assert [result.status for result in results] == ["rejected", "accepted", "rejected", "accepted", "accepted"]
+        assert results[0].error.code == "DUPLICATE_MESSAGE_ID"
+        assert results[2].error.code == "DUPLICATE_MESSAGE_ID"
+        assert sum(count(shard_set, shard, MessageModel) for shard in range(4)) == 4
+        assert sum(count(shard_set, shard, MessageRegistryModel) for shard in range(4)) == 4
+
+    def test_upsert_batch(self, shard_set):
+        """Ingesta idempotente con shards: ignore acepta los existentes sin crearlos y replace actualiza el
+        mensaje en el shard de su sesión"""
+        storage = ShardedMessageStorageService(shard_set)
+
+        def results(*pairs, content="Mensaje de prueba"):
+            items = []
+            for message_id, session_id in pairs:
+                data = make_data(message_id, session_id)
+                data.content = content
+                items.append(BatchItemResultSchema(message_id=message_id, status="accepted", data=data))
+            return items
+
+        first = storage.upsert_batch(results(("msg-u1", "session-a"), ("msg-u2", "session-b")), "ignore")
+        assert [r.created for r in first] == [True, True]
+        again = storage.upsert_batch(results(("msg-u1", "session-a"), ("msg-u3", "session-c"),
+                                             ("msg-u3", "session-c")), "ignore")
+        assert [(r.status, r.created) for r in again] == [("accepted", False), ("accepted", True), ("accepted", False)]
+
+        replaced = storage.upsert_batch(results(("msg-u1", "session-a"), ("msg-u2", "session-x"),
+                                                content="Nuevo contenido"), "replace")
+        assert [(r.status, r.created) for r in replaced] == [("accepted", False), ("rejected", None)]
+        with shard_set.session_factory_for("session-a")() as db:
+            assert db.get(MessageModel, "msg-u1").content == "Nuevo contenido"
+            assert MessageRetrievalService(db).get_session_version("session-a") == (1, 2)
+        assert sum(count(shard_set, shard, MessageModel) for shard in range(4)) == 3
+
+    def test_failed_insert_releases_claim(self, shard_set, monkeypatch):
+        """Si falla el INSERT en el shard de la sesión se libera la reserva del message_id"""
+        storage = ShardedMessageStorageService(shard_set)
+
+        def failing_increment(rows):
+            raise SQLAlchemyError("disco lleno")
+        monkeypatch.setattr(storage, "_session_stats_increment", failing_increment)
+
+        with pytest.raises(DatabaseException):
+            storage.save_message(MessageResponseSchema(status="success", data=make_data("msg-fail", "session-f")))
+        assert sum(count(shard_set, shard, MessageRegistryModel) for shard in range(4)) == 0
+
+        monkeypatch.undo()
+        storage.save_message(MessageResponseSchema(status="success", data=make_data("msg-fail", "session-f")))
+
+    def test_orphan_claim_reclaimed(self, shard_set):
+        """Una reserva antigua sin mensaje (caída entre los dos commits) no bloquea el message_id"""
+        storage = ShardedMessageStorageService(shard_set)
+        stale = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=5)
+        with shard_set.session_factories[shard_set.shard_for("msg-orphan")]() as db:
+            db.add(MessageRegistryModel(message_id="msg-orphan", session_id="session-old", claimed_at=stale))
+            db.commit()
+
+        storage.save_message(MessageResponseSchema(status="success", data=make_data("msg-orphan", "session-new")))
+
+        with shard_set.session_factory_for("session-new")() as db:
+            assert MessageRetrievalService(db).get_session_total("session-new") == 1
+        with shard_set.session_factories[shard_set.shard_for("msg-orphan")]() as db:
+            assert db.get(MessageRegistryModel, "msg-orphan").session_id == "session-new"
+
+    def test_recent_claim_not_reclaimed(self, shard_set):
+        """Una reserva reciente puede ser de una escritura en curso: el ID se considera existente"""
+        storage = ShardedMessageStorageService(shard_set)
+        with shard_set.session_factories[shard_set.shard_for("msg-pending")]() as db:
+            db.add(MessageRegistryModel(message_id="msg-pending", session_id="session-a",
+                                        claimed_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+            db.commit()
+
+        with pytest.raises(DatabaseException):
+            storage.save_message(MessageResponseSchema(status="success", data=make_data("msg-pending", "session-b")))
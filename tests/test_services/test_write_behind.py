@@ -0,0 +1,172 @@
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy.orm import sessionmaker
+
+from services.write_behind import WriteBehindWriter, WriteBehindStorageService
+from services.message_service import MessageStorageService
+from models.message_model import MessageModel
+from models.session_stats_model import SessionStatsModel
+from schemas.message_schema import MessageResponseSchema, DataResponseSchema, Metadata
+from core.bloom import MessageIdFilter
+from core.exceptions import DatabaseException
+
+
+def make_message(message_id, session_id="session_wb", sender="user"):
+    now = datetime.now(timezone.utc)
+    return MessageResponseSchema(status="success", data=DataResponseSchema(
+        message_id=message_id, session_id=session_id, content="Mensaje en cola",
+        timestamp=now, sender=sender,
+        metadata=Metadata(word_count=3, character_count=15, processed_at=now)
+    ))
+
+
+def make_row(message_id, **kwargs):
+    return MessageStorageService._message_to_row(make_message(message_id, **kwargs).data)
+
+
+@pytest.fixture
+def session_factory(test_engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+
+
+class TestWriteBehindWriter:
+
+    def test_group_commit(self, test_db, session_factory):
+        """Los mensajes encolados se guardan en lotes con un commit por lote"""
+        writer = WriteBehindWriter(session_factory, batch_size=50, flush_interval_ms=200, ack_mode="commit")
+        futures = [writer.submit(make_row(f"wb_{i}", sender="user" if i % 2 else "system")) for i in range(120)]
+
+        assert [future.result(timeout=5) for future in futures] == [f"wb_{i}" for i in range(120)]
+        writer.close()
+
+        assert test_db.query(MessageModel).count() == 120
+        counts = {row.sender: row.message_count for row in test_db.query(SessionStatsModel)}
+        assert counts == {"user": 60, "system": 60}
+        stats = writer.stats()
+        assert stats["committed"] == 120
+        assert stats["batches"] < 120
+
+    def test_duplicates_fail_only_their_future(self, test_db, session_factory):
+        """Un ID existente o repetido en la cola solo rechaza ese mensaje"""
+        MessageStorageService(test_db).save_message(make_message("wb_existente"))
+        writer = WriteBehindWriter(session_factory, batch_size=10, flush_interval_ms=200, ack_mode="commit")
+
+        ok = writer.submit(make_row("wb_nuevo"))
+        existing = writer.submit(make_row("wb_existente"))
+        repeated = writer.submit(make_row("wb_nuevo"))
+
+        assert ok.result(timeout=5) == "wb_nuevo"
+        for future in (existing, repeated):
+            with pytest.raises(DatabaseException) as exc_info:
+                future.result(timeout=5)
+            assert "ya existe" in exc_info.value.detail["error"]["details"]
+        writer.close()
+
+        assert test_db.query(MessageModel).count() == 2
+        assert writer.stats()["failed"] == 2
+
+    def test_post_commit_errors_do_not_fail_stored_messages(self, test_db, session_factory):
+        """Un error al invalidar la caché tras el commit no rechaza mensajes ya guardados"""
+        class BrokenCache:
+            def invalidate_session(self, session_id):
+                raise RuntimeError("caché no disponible")
+
+        writer = WriteBehindWriter(session_factory, batch_size=10, flush_interval_ms=50, ack_mode="commit",
+                                   page_cache=BrokenCache())
+        futures = [writer.submit(make_row(f"wb_post_{i}")) for i in range(3)]
+
+        assert [future.result(timeout=5) for future in futures] == [f"wb_post_{i}" for i in range(3)]
+        writer.close()
+        assert test_db.query(MessageModel).count() == 3
+        assert writer.stats()["failed"] == 0
+
+    def test_per_message_retry_remembers_ids(self, test_db, session_factory, monkeypatch):
+        """Los IDs guardados al reintentar mensaje a mensaje (IntegrityError del lote) entran en el filtro"""
+        MessageStorageService(test_db).save_message(make_message("wb_carrera"))
+        # otro proceso insertó el ID entre la comprobación y el INSERT del lote
+        monkeypatch.setattr(MessageStorageService, "_existing_message_ids", lambda self, ids, use_filter=True: set())
+        id_filter = MessageIdFilter(capacity=1_000)
+        writer = WriteBehindWriter(session_factory, batch_size=10, flush_interval_ms=200, ack_mode="commit",
+                                   id_filter=id_filter)
+
+        futures = [writer.submit(make_row(message_id)) for message_id in ("wb_retry_0", "wb_carrera", "wb_retry_1")]
+        assert futures[0].result(timeout=5) == "wb_retry_0"
+        with pytest.raises(DatabaseException):
+            futures[1].result(timeout=5)
+        assert futures[2].result(timeout=5) == "wb_retry_1"
+        writer.close()
+
+        assert all(message_id in id_filter for message_id in ("wb_retry_0", "wb_carrera", "wb_retry_1"))
+
+    def test_unexpected_retry_error_keeps_writer_alive(self, test_db, session_factory, monkeypatch):
+        """Un error inesperado al reintentar mensaje a mensaje rechaza esos mensajes sin matar al hilo escritor"""
+        MessageStorageService(test_db).save_message(make_message("wb_carrera"))
+        monkeypatch.setattr(MessageStorageService, "_existing_message_ids", lambda self, ids, use_filter=True: set())
+
+        def broken_remember_ids(self, message_ids):
+            raise RuntimeError("filtro no disponible")
+        monkeypatch.setattr(MessageStorageService, "_remember_ids", broken_remember_ids)
+        writer = WriteBehindWriter(session_factory, batch_size=10, flush_interval_ms=200, ack_mode="commit")
+
+        futures = [writer.submit(make_row(message_id)) for message_id in ("wb_retry_0", "wb_carrera")]
+        assert futures[0].result(timeout=5) == "wb_retry_0"
+        with pytest.raises(DatabaseException):
+            futures[1].result(timeout=5)
+        # el hilo sigue vivo y atiende la cola
+        monkeypatch.undo()
+        assert writer.submit(make_row("wb_despues")).result(timeout=5) == "wb_despues"
+        writer.close()
+
+    def test_close_drains_queue(self, test_db, session_factory):
+        """close() guarda los mensajes pendientes aunque no haya vencido el intervalo"""
+        writer = WriteBehindWriter(session_factory, batch_size=1000, flush_interval_ms=60000, ack_mode="enqueue")
+        for i in range(25):
+            writer.submit(make_row(f"wb_{i}"))
+
+        writer.close()
+
+        assert test_db.query(MessageModel).count() == 25
+        with pytest.raises(DatabaseException):
+            writer.submit(make_row("wb_tarde"))
+
+    def test_unknown_ack_mode(self, session_factory):
+        """Un modo de confirmación desconocido falla al construir el escritor"""
+        with pytest.raises(ValueError):
+            WriteBehindWriter(session_factory, ack_mode="desconocido")
+
+
+class TestWriteBehindStorageService:
+
+    def test_commit_mode_waits_and_raises(self, test_db, session_factory):
+        """En modo commit save_message espera al lote y propaga los duplicados"""
+        writer = WriteBehindWriter(session_factory, batch_size=10, flush_interval_ms=5, ack_mode="commit")
+        storage_service = WriteBehindStorageService(test_db, writer)
+
+        result = storage_service.save_message(make_message("wb_001"))
+        assert result.message_id == "wb_001"
+        assert test_db.query(MessageModel).filter_by(message_id="wb_001").count() == 1
+
+        with pytest.raises(DatabaseException):
+            storage_service.save_message(make_message("wb_001"))
+        writer.close()
+
+    def test_commit_mode_times_out(self, test_db, session_factory, monkeypatch):
+        """Si el lote no se confirma en ack_timeout segundos save_message lanza DatabaseException"""
+        writer = WriteBehindWriter(session_factory, ack_mode="commit", ack_timeout=0.05)
+        writer.close()
+        # escritor sin hilo: el Future nunca se resuelve
+        monkeypatch.setattr(writer, "_closed", False)
+        with pytest.raises(DatabaseException) as exc_info:
+            WriteBehindStorageService(test_db, writer).save_message(make_message("wb_sin_respuesta"))
+        assert "no confirmó" in exc_info.value.detail["error"]["details"]
+
+    def test_enqueue_mode_returns_before_commit(self, test_db, session_factory):
+        """En modo enqueue save_message responde al encolar"""
+        writer = WriteBehindWriter(session_factory, batch_size=1000, flush_interval_ms=60000, ack_mode="enqueue")
+        storage_service = WriteBehindStorageService(test_db, writer)
+
+        storage_service.save_message(make_message("wb_001"))
+        assert test_db.query(MessageModel).count() == 0
+
+        writer.close()
+        assert test_db.query(MessageModel).count() == 1